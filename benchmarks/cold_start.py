@@ -0,0 +1,117 @@
+"""
+Measures worker cold starts: import times, and compiling a stylesheet
+compared to loading it from a bundle, each in a fresh interpreter
+
+Usage: python benchmarks/cold_start.py [rules count] [repeat]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+from css_backends import HTML, build_css
+
+from chopper.bundle import save_bundle
+from chopper.css.extractor import CSSExtractor
+from chopper.extractor import Extractor
+
+SETUP = """
+import sys
+from time import perf_counter
+start = perf_counter()
+"""
+
+IMPORT_CODE = {
+    "import chopper.extractor": "import chopper.extractor",
+    "import with the CSS stack": "import chopper.extractor, chopper.css.extractor",
+}
+
+START_CODE = {
+    "compile stylesheet": """
+from chopper.css.extractor import CSSExtractor
+from chopper.extractor import Extractor
+extractor = Extractor(css_backend=sys.argv[3]).keep("//div[@id='block-3']")
+with open(sys.argv[1]) as f:
+    stylesheet = CSSExtractor.compile(f.read(), sys.argv[3])
+""",
+    "load bundle": """
+from chopper.bundle import load_bundle
+bundle = load_bundle(sys.argv[2])
+extractor, stylesheet = bundle["extractor"], bundle["css"]
+""",
+}
+
+FIRST_DOCUMENT = """
+ready = perf_counter()
+extractor.extract(sys.argv[4], stylesheet)
+"""
+
+REPORT = """
+print(ready - start, perf_counter() - start)
+"""
+
+
+def run(code, *args):
+    """
+    Returns the timings printed by code run in a fresh interpreter
+    """
+    output = subprocess.check_output(
+        [sys.executable, "-c", code] + list(args),
+        env=dict(os.environ, PYTHONPATH=os.getcwd()),
+    )
+    return [float(value) for value in output.split()]
+
+
+def main(count=2000, number=5):
+    css = build_css(count)
+    print("%d bytes of CSS, %d rules, best of %d" % (len(css), count, number))
+
+    for name, code in IMPORT_CODE.items():
+        timings = [
+            run(SETUP + code + "\nready = perf_counter()" + REPORT)
+            for _ in range(number)
+        ]
+        print("%-28s %.1fms" % (name, min(t[0] for t in timings) * 1000))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        css_path = os.path.join(tmp, "site.css")
+        bundle_path = os.path.join(tmp, "site.bundle")
+
+        with open(css_path, "w") as f:
+            f.write(css)
+
+        for backend in ("tinycss", "tinycss2"):
+            extractor = Extractor(css_backend=backend).keep("//div[@id='block-3']")
+            save_bundle(
+                bundle_path,
+                {
+                    "extractor": extractor,
+                    "css": CSSExtractor.compile(css, backend, translate=True),
+                },
+            )
+            print("%s bundle: %d bytes" % (backend, os.path.getsize(bundle_path)))
+
+            for name, code in START_CODE.items():
+                timings = [
+                    run(
+                        SETUP + code + FIRST_DOCUMENT + REPORT,
+                        css_path,
+                        bundle_path,
+                        backend,
+                        HTML,
+                    )
+                    for _ in range(number)
+                ]
+                print(
+                    "  %-26s ready %.1fms  first document %.1fms"
+                    % (
+                        name,
+                        min(t[0] for t in timings) * 1000,
+                        min(t[1] for t in timings) * 1000,
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,72 @@
+"""
+Compares the CSS backends on a large synthetic stylesheet
+
+Usage: python benchmarks/css_backends.py [rules count] [repeat]
+"""
+
+import sys
+from timeit import repeat
+
+from chopper.css.extractor import CSSExtractor
+from chopper.extractor import Extractor
+
+HTML = "<html><body>%s</body></html>" % "".join(
+    '<div id="block-%d" class="block c%d"><p><a href="#">link</a></p></div>'
+    % (i, i % 10)
+    for i in range(200)
+)
+
+
+def build_css(count):
+    """
+    Returns a stylesheet with about count rules
+    """
+    rules = []
+
+    for i in range(count):
+        rules.append(
+            "#block-%d .c%d > p, div.c%d a:hover, ul li:nth-child(%dn) "
+            "{ color: #%06x; margin: 0 %dpx; background: url(img/%d.png) no-repeat }"
+            % (i, i % 20, i % 10, i % 7 + 1, i, i % 30, i)
+        )
+
+        if i % 50 == 0:
+            rules.append("@media (min-width: %dpx) { .c%d { display: none } }" % (i, i))
+
+    return "\n".join(rules)
+
+
+def main(count=2000, number=5):
+    css = build_css(count)
+    print("%d bytes of CSS, %d rules" % (len(css), count))
+
+    for backend in ("tinycss", "tinycss2"):
+        extractor = Extractor(css_backend=backend).keep("//div[@id='block-3']")
+        compiled = CSSExtractor.compile(css, backend)
+
+        timings = {
+            "compile": min(
+                repeat(
+                    lambda: CSSExtractor.compile(css, backend), number=1, repeat=number
+                )
+            ),
+            "extract": min(
+                repeat(lambda: extractor.extract(HTML, css), number=1, repeat=number)
+            ),
+            "extract compiled": min(
+                repeat(
+                    lambda: extractor.extract(HTML, compiled), number=1, repeat=number
+                )
+            ),
+        }
+        print(
+            "%-9s %s"
+            % (
+                backend,
+                "  ".join("%s %.1fms" % (k, v * 1000) for k, v in timings.items()),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
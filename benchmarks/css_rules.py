@@ -0,0 +1,50 @@
+"""
+Compares the time to match keep rules written as Xpath expressions, as
+evaluated for every document, with the same rules written as CSS selectors,
+translated and compiled once
+
+Usage: python benchmarks/css_rules.py [blocks count] [repeat]
+"""
+
+import sys
+from timeit import repeat
+
+from lxml import html
+from parallel_css import build_html
+
+from chopper.css.selectors import SelectorRule
+
+RULES = (
+    ("id", "//*[@id='block-3']", "#block-3"),
+    ("class", "//*[contains(concat(' ', @class, ' '), ' c3 ')]", ".c3"),
+    ("tag.class", "//div[contains(concat(' ', @class, ' '), ' c3 ')]", "div.c3"),
+    (
+        "classes",
+        "//*[contains(concat(' ', @class, ' '), ' block ')"
+        " and contains(concat(' ', @class, ' '), ' c3 ')]",
+        ".block.c3",
+    ),
+    ("structure", "//div/p/a", "div > p > a"),
+)
+
+
+def main(blocks=20000, number=10):
+    tree = html.fromstring(build_html(blocks))
+    print("%d elements" % sum(1 for _ in tree.iter()))
+
+    for name, xpath, selector in RULES:
+        rule = SelectorRule(selector)
+        assert rule.select(tree) == tree.xpath(xpath)
+
+        timings = [
+            min(repeat(function, number=1, repeat=number))
+            for function in (lambda: tree.xpath(xpath), lambda: rule.select(tree))
+        ]
+        print(
+            "%-10s xpath %.1fms  css %.1fms"
+            % (name, timings[0] * 1000, timings[1] * 1000)
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
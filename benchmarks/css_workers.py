@@ -0,0 +1,38 @@
+"""
+Compares the latency of cleaning a large stylesheet against one large page
+with selectors matched by one or several threads
+
+Usage: python benchmarks/css_workers.py [rules count] [blocks count] [repeat]
+"""
+
+import os
+import sys
+from timeit import repeat
+
+from css_backends import build_css
+from parallel_css import build_html
+
+from chopper.css.extractor import CSSExtractor
+from chopper.extractor import Extractor
+
+
+def main(count=4000, blocks=300, number=3):
+    stylesheet = CSSExtractor.compile(build_css(count))
+    html = build_html(blocks)
+    print(
+        "%d bytes of HTML, %d rules, %d CPUs"
+        % (len(html), len(stylesheet.rules), os.cpu_count())
+    )
+
+    for workers in (None, 2, 4):
+        extractor = Extractor(css_workers=workers).keep("//div[@class='block c3']")
+        extractor.extract(html, stylesheet)
+
+        best = min(
+            repeat(lambda: extractor.extract(html, stylesheet), number=1, repeat=number)
+        )
+        print("%-8s %.1fms" % (workers or 1, best * 1000))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
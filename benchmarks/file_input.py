@@ -0,0 +1,49 @@
+"""
+Compares extracting pages read into Python bytes first with pages parsed
+straight from their memory mapped files: latency and peak Python memory
+
+Usage: python benchmarks/file_input.py [blocks count] [repeat]
+"""
+
+import os
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+from timeit import repeat
+
+from parallel_css import build_html
+
+from chopper.extractor import Extractor
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def main(blocks=20000, number=5):
+    extractor = Extractor.keep("//div[@id='block-3']")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "page.html"
+        path.write_text(build_html(blocks))
+        print("%d bytes of HTML" % os.path.getsize(path))
+
+        for name, function in (
+            ("read", lambda: extractor.extract(read_bytes(path))),
+            ("mmap", lambda: extractor.extract(path)),
+        ):
+            function()
+
+            tracemalloc.start()
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            best = min(repeat(function, number=1, repeat=number))
+            print("%-5s %.1fms, %.1fMB peak" % (name, best * 1000, peak / 1e6))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,59 @@
+"""
+Compares the latency of a single extract call with CSS contents parsed after
+the HTML or on a helper thread meanwhile
+
+Usage: python benchmarks/parallel_css.py [rules count] [blocks count] [repeat]
+"""
+
+import sys
+from timeit import repeat
+
+from css_backends import build_css
+
+from chopper.extractor import Extractor
+
+
+def build_html(count):
+    """
+    Returns a page with count blocks
+    """
+    return "<html><body>%s</body></html>" % "".join(
+        '<div id="block-%d" class="block c%d"><p>Some <b>text</b> %d '
+        '<a href="page-%d.html">link</a></p><ul><li>a</li><li>b</li></ul></div>'
+        % (i, i % 10, i, i)
+        for i in range(count)
+    )
+
+
+def main(count=500, blocks=300, number=5):
+    css = build_css(count)
+    html = build_html(blocks)
+    print("%d bytes of HTML, %d bytes of CSS" % (len(html), len(css)))
+
+    for backend in ("tinycss", "tinycss2"):
+        timings = {}
+
+        for parallel_css in (False, True):
+            extractor = Extractor(css_backend=backend, parallel_css=parallel_css)
+            extractor.keep("//div[@class='block c3']").discard("//ul")
+            extractor.extract(html, css)
+
+            timings["parallel" if parallel_css else "sequential"] = min(
+                repeat(
+                    lambda: extractor.extract(html, css, base_url="http://t/"),
+                    number=1,
+                    repeat=number,
+                )
+            )
+
+        print(
+            "%-9s %s"
+            % (
+                backend,
+                "  ".join("%s %.1fms" % (k, v * 1000) for k, v in timings.items()),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,79 @@
+"""
+Compares routing URLs with the extractor registry to a loop over regexes
+
+Usage: python benchmarks/registry.py [sites count] [repeat]
+"""
+
+import random
+import re
+import sys
+from timeit import repeat
+
+from chopper.registry import ExtractorRegistry
+
+
+def build_patterns(count):
+    """
+    Returns about count host and path prefix patterns
+    """
+    patterns = []
+
+    for i in range(count):
+        if i % 3 == 0:
+            patterns.append("*.site%d.com" % i)
+        elif i % 3 == 1:
+            patterns.append("www.site%d.org/section%d" % (i, i % 10))
+        else:
+            patterns.append("site%d.net" % i)
+
+    return patterns
+
+
+def pattern_regex(pattern):
+    """
+    Returns the hand-written regex equivalent of a pattern
+    """
+    host, _, path = pattern.partition("/")
+    host = re.escape(host).replace(r"\*\.", r"(?:[^/]+\.)")
+    path = "/" + re.escape(path) + "(?:/|$)" if path else "(?:/|$)"
+    return re.compile(r"https?://%s(?::\d+)?%s" % (host, path))
+
+
+def main(count=3000, number=5):
+    patterns = build_patterns(count)
+    registry = ExtractorRegistry(maxsize=count)
+    regexes = []
+
+    for pattern in patterns:
+        registry.register(pattern, pattern)
+        regexes.append((pattern_regex(pattern), pattern))
+
+    random.seed(0)
+    urls = []
+
+    for pattern in random.sample(patterns, 1000):
+        host, _, path = pattern.partition("/")
+        urls.append(
+            "https://%s/%s/article/%d.html"
+            % (host.replace("*", "news"), path or "page", random.randrange(1000))
+        )
+
+    def regex_loop():
+        for url in urls:
+            for regex, pattern in regexes:
+                if regex.match(url):
+                    break
+
+    def registry_resolve():
+        for url in urls:
+            registry.resolve(url)
+
+    for name, function in (("regex loop", regex_loop), ("registry", registry_resolve)):
+        best = min(repeat(function, number=1, repeat=number))
+        print(
+            "%-10s %d patterns: %.1fus per URL" % (name, count, best / len(urls) * 1e6)
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
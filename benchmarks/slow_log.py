@@ -0,0 +1,35 @@
+"""
+Replays the slow documents captured by a slow log with the current code
+
+Usage: python benchmarks/slow_log.py capture_dir [repeat]
+"""
+
+import os
+import sys
+from timeit import repeat
+
+from chopper.slowlog import load_capture, replay_capture
+
+
+def main(capture_dir, number=5):
+    print("%-32s %12s %12s  %s" % ("capture", "recorded(ms)", "replay(ms)", "error"))
+
+    for name in sorted(os.listdir(capture_dir)):
+        capture = load_capture(os.path.join(capture_dir, name))
+        error = ""
+
+        try:
+            replay = min(
+                repeat(lambda: replay_capture(capture), number=1, repeat=number)
+            )
+        except Exception as e:
+            replay, error = float("nan"), "%s: %s" % (type(e).__name__, e)
+
+        print(
+            "%-32s %12.1f %12.1f  %s"
+            % (name, capture["duration"] * 1000, replay * 1000, error)
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1], *(int(arg) for arg in sys.argv[2:]))
@@ -0,0 +1,266 @@
+import json
+import os
+from functools import lru_cache
+from hashlib import md5
+from pathlib import Path
+
+from .extractor import Extractor
+
+MODES = ("extract", "sanitize", "fragments")
+
+
+def shard_of(key, num_shards):
+    """
+    Returns the shard of a record key, the same on every machine and run
+
+    :param key: The record key
+    :type key: str or int
+    :param num_shards: The total number of shards
+    :type num_shards: int
+    :rtype: int
+    """
+    digest = md5(str(key).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards
+
+
+@lru_cache(maxsize=16)
+def _load_stylesheet(path):
+    """
+    Returns a stylesheet file parsed once per process, and its size
+
+    :returns: The parsed stylesheet, the stylesheet size
+    :rtype: tuple
+    """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        css = f.read()
+
+    return Extractor.css_extractor.compile(css), len(css)
+
+
+def process_record(extractor, record, mode="extract"):
+    """
+    Extracts a single record, errors are reported in the result
+
+    A record has an "id", "html" or "html_path", and optional "css" or
+    "css_path" and "base_url" keys
+
+    :param extractor: The extractor to use
+    :type extractor: Extractor
+    :param record: The record to extract
+    :type record: dict
+    :param mode: The extraction mode: extract, sanitize or fragments
+    :type mode: str
+    :returns: The result with "id", "bytes" and either "html" and "css",
+              "fragments" or "error" keys
+    :rtype: dict
+    """
+    result = {"id": record["id"]}
+
+    try:
+        html = record.get("html")
+        if html is None:
+            # Mapped by the parser rather than read, decoded as UTF-8 unless
+            # the page declares its encoding
+            html = Path(record["html_path"])
+            html_size = os.path.getsize(html)
+        else:
+            html_size = len(html)
+
+        css = record.get("css")
+        css_size = len(css or "")
+        if css is None and record.get("css_path"):
+            css, css_size = _load_stylesheet(record["css_path"])
+
+        result["bytes"] = html_size + css_size
+        base_url = record.get("base_url")
+
+        if mode == "fragments":
+            result["fragments"] = extractor.extract_fragments(html, base_url=base_url)
+        else:
+            method = extractor.sanitize if mode == "sanitize" else extractor.extract
+            cleaned = method(html, css, base_url=base_url)
+
+            if css is None:
+                result["html"] = cleaned
+            else:
+                result["html"], result["css"] = cleaned
+
+    except Exception as e:
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+
+    return result
+
+
+def _new_state():
+    """
+    Returns the state of a shard not started yet
+    """
+    return {"position": 0, "output_size": 0, "processed": 0, "errors": 0}
+
+
+def _write_atomic(path, contents):
+    """
+    Writes a file atomically: readers see either the old or the new contents
+    """
+    tmp_path = path + ".tmp"
+
+    with open(tmp_path, "w") as f:
+        f.write(contents)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+
+
+class BatchJob:
+    """
+    Extracts the records of one shard of a batch, resumable from checkpoints
+
+    Records are split in shards by a hash of their "id", so several machines
+    can each run one shard over the same input stream. Results are appended
+    to a partial JSON lines file, a checkpoint is atomically written every
+    checkpoint_every records and the output is renamed once the shard is done.
+    Running the job again resumes after the last checkpoint, the input
+    stream must yield records in the same order.
+    """
+
+    def __init__(
+        self,
+        extractor,
+        workdir,
+        shard=0,
+        num_shards=1,
+        mode="extract",
+        checkpoint_every=1000,
+    ):
+        """
+        Inits the job
+
+        :param extractor: The extractor to use
+        :type extractor: Extractor
+        :param workdir: The directory of outputs and checkpoints, may be shared
+        :type workdir: str
+        :param shard: The shard of this job, from 0 to num_shards - 1
+        :type shard: int
+        :param num_shards: The total number of shards
+        :type num_shards: int
+        :param mode: The extraction mode: extract, sanitize or fragments
+        :type mode: str
+        :param checkpoint_every: The number of records between checkpoints
+        :type checkpoint_every: int
+        """
+        assert 0 <= shard < num_shards
+        assert mode in MODES
+
+        self.extractor = extractor
+        self.workdir = workdir
+        self.shard = shard
+        self.num_shards = num_shards
+        self.mode = mode
+        self.checkpoint_every = checkpoint_every
+
+        name = os.path.join(workdir, "shard-%05d-of-%05d" % (shard, num_shards))
+        self.output_path = name + ".jsonl"
+        self.partial_path = name + ".jsonl.part"
+        self.checkpoint_path = name + ".checkpoint"
+
+    ##########
+    # Public #
+    ##########
+
+    def is_done(self):
+        """
+        Returns whether the shard is complete or not
+
+        :rtype: bool
+        """
+        return os.path.exists(self.output_path)
+
+    def run(self, records):
+        """
+        Extracts the records of the shard, skipping already checkpointed ones
+
+        :param records: Every record of the batch, in a deterministic order
+        :type records: iterable of dict
+        :returns: The shard state with position (records of the shard already
+                  done), processed (records done by this run) and errors keys
+        :rtype: dict
+        """
+        state = self._load_checkpoint()
+        state["processed"] = 0
+
+        if self.is_done():
+            return state
+
+        os.makedirs(self.workdir, exist_ok=True)
+
+        # Results of the checkpoint are missing, the shard can't be resumed
+        if self._partial_size() < state["output_size"]:
+            state = _new_state()
+
+        with open(self.partial_path, "ab") as output:
+            # Drop results written after the last checkpoint
+            output.truncate(state["output_size"])
+
+            for position, record in enumerate(self._iter_shard(records)):
+                if position < state["position"]:
+                    continue
+
+                result = process_record(self.extractor, record, self.mode)
+                result.pop("bytes", None)
+                output.write((json.dumps(result) + "\n").encode("utf-8"))
+
+                state["position"] += 1
+                state["processed"] += 1
+                state["errors"] += "error" in result
+
+                if state["position"] % self.checkpoint_every == 0:
+                    self._checkpoint(output, state)
+
+            self._checkpoint(output, state)
+
+        os.replace(self.partial_path, self.output_path)
+
+        return state
+
+    ###########
+    # Private #
+    ###########
+
+    def _iter_shard(self, records):
+        """
+        Yields the records of this shard
+        """
+        for record in records:
+            if shard_of(record["id"], self.num_shards) == self.shard:
+                yield record
+
+    def _load_checkpoint(self):
+        """
+        Returns the last checkpointed state, an empty one if there isn't any
+        """
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return _new_state()
+
+    def _partial_size(self):
+        """
+        Returns the size of the partial output, 0 if there isn't any
+        """
+        try:
+            return os.path.getsize(self.partial_path)
+        except FileNotFoundError:
+            return 0
+
+    def _checkpoint(self, output, state):
+        """
+        Makes the output durable, then records the state
+        """
+        output.flush()
+        os.fsync(output.fileno())
+
+        output.seek(0, os.SEEK_END)
+        state["output_size"] = output.tell()
+        _write_atomic(self.checkpoint_path, json.dumps(state))
@@ -0,0 +1,74 @@
+import os
+import pickle
+from tempfile import NamedTemporaryFile
+
+from . import __version__
+from .exceptions import BundleError
+
+# Bundles start with this line, followed by a line with the bundle format
+# version and the chopper version that saved them
+MAGIC = b"CHOPPER-BUNDLE\n"
+BUNDLE_VERSION = 1
+
+
+def _header():
+    """
+    Returns the header of bundles saved by this chopper version
+
+    :rtype: bytes
+    """
+    return MAGIC + b"%d %s\n" % (BUNDLE_VERSION, __version__.encode("ascii"))
+
+
+def save_bundle(path, objects):
+    """
+    Saves compiled extractors and stylesheets to a bundle file
+
+    The file is replaced atomically, workers loading the bundle while it is
+    saved get the previous one
+
+    :param path: The bundle file path
+    :type path: str or os.PathLike
+    :param objects: The extractors, stylesheets or corpora to save, by name
+    :type objects: dict
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+
+    with NamedTemporaryFile("wb", dir=directory, delete=False) as f:
+        try:
+            f.write(_header())
+            pickle.dump(dict(objects), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+
+    os.replace(f.name, path)
+
+
+def load_bundle(path):
+    """
+    Loads the objects saved to a bundle file
+
+    Bundles are pickles: only load bundles from a trusted source.
+
+    :param path: The bundle file path
+    :type path: str or os.PathLike
+    :returns: The saved objects, by name
+    :rtype: dict
+    :raises BundleError: When the file is not a bundle or was saved by
+                         another bundle format or chopper version
+    """
+    with open(path, "rb") as f:
+        if f.readline() != MAGIC:
+            raise BundleError("%s is not a chopper bundle" % os.fspath(path))
+
+        version = f.readline()
+
+        if MAGIC + version != _header():
+            raise BundleError(
+                "%s was saved by another chopper version (%s), save it again"
+                % (os.fspath(path), version.decode("ascii", "replace").strip())
+            )
+
+        return pickle.load(f)
@@ -0,0 +1,447 @@
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+
+# Xpath 1.0 tokens, names are QNames, axes or function names
+_xpath_token_re = re.compile(
+    r"""\s*(?:
+        (?P<literal>"[^"]*"|'[^']*')
+        |(?P<number>\d+(?:\.\d*)?|\.\d+)
+        |(?P<name>[A-Za-z_][\w.-]*(?::[A-Za-z_][\w.-]*)?)
+        |(?P<operator>//|::|\.\.|!=|<=|>=|[/.\[\]()@,|+\-=<>*$])
+    )""",
+    re.VERBOSE,
+)
+
+# Axes walking elements only, attributes are restricted to id and class
+_structural_axes = frozenset(
+    (
+        "ancestor",
+        "ancestor-or-self",
+        "child",
+        "descendant",
+        "descendant-or-self",
+        "following",
+        "following-sibling",
+        "parent",
+        "preceding",
+        "preceding-sibling",
+        "self",
+    )
+)
+
+# Functions only depending on the values of their arguments, or on positions
+_structural_functions = frozenset(
+    (
+        "ceiling",
+        "concat",
+        "contains",
+        "false",
+        "floor",
+        "last",
+        "normalize-space",
+        "number",
+        "position",
+        "round",
+        "starts-with",
+        "string",
+        "string-length",
+        "substring",
+        "substring-after",
+        "substring-before",
+        "sum",
+        "translate",
+        "true",
+    )
+)
+
+# Functions only depending on the existence, count or names of node-sets
+_node_set_functions = frozenset(("boolean", "count", "local-name", "name", "not"))
+
+# Functions using the context node string value when called without arguments
+_string_value_functions = frozenset(
+    ("normalize-space", "number", "string", "string-length")
+)
+
+# Node tests of other nodes than elements
+_node_types = frozenset(("comment", "node", "processing-instruction", "text"))
+
+# Kinds of Xpath values: elements, whose string values are their texts, id or
+# class attributes, and other values
+_ELEMENTS, _ATTRIBUTES, _VALUE = "elements", "attributes", "value"
+
+
+class Template:
+    """
+    Matches known for a page template, i.e. a tag, id and class skeleton
+    """
+
+    def __init__(self, signature):
+        """
+        Inits the template
+
+        :param signature: The skeleton signature of the template
+        :type signature: tuple
+        """
+        self.signature = signature
+
+        # Keep and discard elements indexes, by rules
+        self.rules = {}
+
+        # Whether a CSS selector matches the template or not, by selector
+        self.selectors = {}
+
+
+class TemplateCache:
+    """
+    Caches keep and discard matches and CSS selectors matches by page template
+
+    Pages sharing the same tag, id and class skeleton share the same matches.
+    Only rules and selectors that can't depend on anything else than this
+    skeleton are cached: Xpath expressions made of element steps, id and
+    class attributes, positional predicates and elements existence or count
+    tests, and selectors without attributes or texts. Other rules and
+    selectors are always evaluated.
+    """
+
+    # CSS selectors using attributes or texts
+    uncacheable_selector_re = re.compile(
+        r"\[|:(?:empty|lang|contains)\b", re.IGNORECASE
+    )
+
+    def __init__(self, maxsize=256):
+        """
+        Inits the cache
+
+        :param maxsize: The maximum number of templates to keep
+        :type maxsize: int
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._templates = OrderedDict()
+        self._lock = Lock()
+
+    def __getstate__(self):
+        """
+        Locks can't be pickled, saved instances get a new one
+        """
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    ##########
+    # Public #
+    ##########
+
+    def get_template(self, tree):
+        """
+        Returns the template of a tree, a new one if the template is unknown
+
+        :param tree: The tree to get the template for
+        :type tree: lxml.html.HtmlElement
+        :returns: The template and the tree nodes in document order
+        :rtype: tuple
+        """
+        nodes = list(tree.iter())
+
+        # Preorder tags with children counts describe the whole skeleton
+        signature = tuple((n.tag, n.get("id"), n.get("class"), len(n)) for n in nodes)
+        key = (len(signature), hash(signature))
+
+        with self._lock:
+            template = self._templates.get(key)
+
+            # Verify the template to avoid hash collisions
+            if template is not None and template.signature == signature:
+                self._templates.move_to_end(key)
+                self.hits += 1
+
+            else:
+                template = self._templates[key] = Template(signature)
+                self.misses += 1
+
+                if len(self._templates) > self.maxsize:
+                    self._templates.popitem(last=False)
+
+        return template, nodes
+
+    def can_cache_xpaths(self, xpaths):
+        """
+        Returns whether Xpath expressions matches can be cached or not
+
+        :param xpaths: The Xpath expressions to check
+        :type xpaths: list of str
+        :rtype: bool
+        """
+        return all(_is_structural_xpath(xpath) for xpath in xpaths)
+
+    def can_cache_selector(self, selector):
+        """
+        Returns whether a CSS selector matches can be cached or not
+
+        :param selector: The CSS selector to check
+        :type selector: str
+        :rtype: bool
+        """
+        return self.uncacheable_selector_re.search(selector) is None
+
+    def clear(self):
+        """
+        Removes every known template
+        """
+        with self._lock:
+            self._templates.clear()
+
+
+@lru_cache(maxsize=1024)
+def _is_structural_xpath(xpath):
+    """
+    Returns whether an Xpath expression only depends on the tag, id and class
+    skeleton of a tree: its steps walk elements, its attributes are id and
+    class and string values are only read from these attributes
+    """
+    tokens = _tokenize_xpath(xpath)
+    return tokens is not None and _StructuralXpathChecker(tokens).check()
+
+
+def _tokenize_xpath(xpath):
+    """
+    Returns the (kind, value) tokens of an Xpath expression, None if some
+    characters aren't Xpath tokens
+    """
+    tokens = []
+    position = 0
+
+    while position < len(xpath):
+        match = _xpath_token_re.match(xpath, position)
+
+        if match is None or match.end() == position:
+            return tokens if not xpath[position:].strip() else None
+
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        position = match.end()
+
+    return tokens
+
+
+class _StructuralXpathChecker:
+    """
+    Parses the tokens of an Xpath expression, see _is_structural_xpath
+
+    Every parsing method returns the kind of its value and raises ValueError
+    if the value depends on anything else than the skeleton. Element
+    node-sets can be tested, counted and walked, but their string values are
+    their texts: they can't be compared, computed or passed to functions.
+    """
+
+    # Binary operators by increasing precedence, see the Xpath 1.0 grammar
+    operators = (
+        ("or",),
+        ("and",),
+        ("=", "!="),
+        ("<", "<=", ">", ">="),
+        ("+", "-"),
+        ("*", "div", "mod"),
+    )
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.index = 0
+
+    def check(self):
+        """
+        Returns whether the expression only depends on the skeleton
+
+        :rtype: bool
+        """
+        try:
+            self._expr(_ELEMENTS)
+        except ValueError:
+            return False
+
+        return self.index == len(self.tokens)
+
+    def _peek(self, offset=0):
+        index = self.index + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def _next(self):
+        token = self._peek()
+        self.index += 1
+        return token
+
+    def _expect(self, value):
+        if self._next()[1] != value:
+            raise ValueError("Expected %r" % value)
+
+    def _at(self, *values):
+        kind, value = self._peek()
+        return kind in ("name", "operator") and value in values
+
+    def _expr(self, context, level=0):
+        """
+        Parses a binary operation, or an operand at the highest level
+        """
+        if level == len(self.operators):
+            return self._unary(context)
+
+        kind = self._expr(context, level + 1)
+
+        while self._at(*self.operators[level]):
+            self.index += 1
+            operands = (kind, self._expr(context, level + 1))
+
+            # Boolean operators only test the existence of node-sets
+            if level > 1 and _ELEMENTS in operands:
+                raise ValueError("Elements string value")
+
+            kind = _VALUE
+
+        return kind
+
+    def _unary(self, context):
+        if self._at("-"):
+            self.index += 1
+
+            if self._unary(context) == _ELEMENTS:
+                raise ValueError("Elements string value")
+
+            return _VALUE
+
+        kind = self._path(context)
+
+        while self._at("|"):
+            self.index += 1
+            kind = _ELEMENTS if _ELEMENTS in (kind, self._path(context)) else kind
+
+        return kind
+
+    def _path(self, context):
+        """
+        Parses a location path, or a filter expression and its steps
+        """
+        kind, value = self._peek()
+
+        if kind in ("literal", "number"):
+            self.index += 1
+            return _VALUE
+
+        if value == "(" or (
+            kind == "name" and self._peek(1)[1] == "(" and value not in _node_types
+        ):
+            context = self._filter(context)
+
+            if not self._at("/", "//"):
+                return context
+
+            self.index += 1
+
+        elif self._at("/", "//"):
+            self.index += 1
+
+            # The root string value is the text of the whole document
+            context = _ELEMENTS
+            kind, value = self._peek()
+
+            if kind != "name" and value not in ("*", "@", ".", ".."):
+                return context
+
+        return self._steps(context)
+
+    def _steps(self, context):
+        kind = self._step(context)
+
+        while self._at("/", "//"):
+            self.index += 1
+            kind = self._step(kind)
+
+        return kind
+
+    def _step(self, context):
+        kind, value = self._next()
+
+        if value == ".":
+            return context
+
+        if value == "..":
+            return _ELEMENTS
+
+        if value == "@":
+            axis = "attribute"
+        elif kind == "name" and self._at("::"):
+            axis = value
+            self.index += 1
+        else:
+            axis = "child"
+            self.index -= 1
+
+        kind, value = self._next()
+
+        if axis == "attribute" and value in ("id", "class"):
+            step = _ATTRIBUTES
+        elif (
+            axis in _structural_axes
+            and (value == "*" or kind == "name")
+            and not self._at("(")
+        ):
+            step = _ELEMENTS
+        else:
+            raise ValueError("Not an element or id and class attributes step")
+
+        while self._at("["):
+            self._predicate(step)
+
+        return step
+
+    def _predicate(self, context):
+        # Predicates test node-sets existence or positions, both structural
+        self._expect("[")
+        self._expr(context)
+        self._expect("]")
+
+    def _filter(self, context):
+        if self._at("("):
+            self.index += 1
+            kind = self._expr(context)
+            self._expect(")")
+        else:
+            kind = self._function(context)
+
+        while self._at("["):
+            self._predicate(kind)
+
+        return kind
+
+    def _function(self, context):
+        name = self._next()[1]
+        self._expect("(")
+        arguments = []
+
+        if not self._at(")"):
+            arguments.append(self._expr(context))
+
+            while self._at(","):
+                self.index += 1
+                arguments.append(self._expr(context))
+
+        self._expect(")")
+
+        if name in _node_set_functions:
+            return _VALUE
+
+        if name not in _structural_functions:
+            raise ValueError("Unknown function %s" % name)
+
+        if not arguments and name in _string_value_functions:
+            arguments.append(context)
+
+        if _ELEMENTS in arguments:
+            raise ValueError("Elements string value")
+
+        return _VALUE
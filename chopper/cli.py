@@ -0,0 +1,388 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import md5
+from time import perf_counter
+
+from .batch import MODES, BatchJob, process_record
+from .extractor import Extractor
+from .profiler import Profiler
+
+# The extractor of the current process, see _init_worker
+_worker = None
+
+
+def build_extractor(keep=(), discard=(), profiler=None):
+    """
+    Returns an Extractor for the given rules
+
+    :param keep: The Xpath expressions to keep
+    :type keep: list of str
+    :param discard: The Xpath expressions to discard
+    :type discard: list of str
+    :param profiler: The profiler recording stages durations
+    :type profiler: Profiler or None
+    :rtype: Extractor
+    """
+    extractor = Extractor(profiler=profiler)
+
+    for xpath in keep:
+        extractor.keep(xpath)
+
+    for xpath in discard:
+        extractor.discard(xpath)
+
+    return extractor
+
+
+def load_rules(args):
+    """
+    Returns the keep and discard rules from inline arguments and rules file
+
+    A rules file is a JSON object with "keep" and "discard" lists
+
+    :returns: keep rules, discard rules
+    :rtype: tuple
+    """
+    keep, discard = list(args.keep), list(args.discard)
+
+    if args.rules:
+        with open(args.rules) as f:
+            rules = json.load(f)
+
+        keep += rules.get("keep", [])
+        discard += rules.get("discard", [])
+
+    return keep, discard
+
+
+def iter_records(inputs, css_path=None, base_url=None):
+    """
+    Yields a record for every page to extract
+
+    Inputs are directories (every .html and .htm file, recursively),
+    glob patterns, files, JSON lines files ending with .jsonl or - for
+    JSON lines from the standard input. JSON lines records have an "id",
+    "html" or "html_path", and optional "css" or "css_path" and "base_url" keys
+
+    :param inputs: The inputs to read
+    :type inputs: list of str
+    :param css_path: The stylesheet of pages read from paths
+    :type css_path: str or None
+    :param base_url: The base URL of pages read from paths
+    :type base_url: str or None
+    :rtype: generator of dict
+    """
+    for source in inputs:
+        if source == "-" or source.endswith(".jsonl"):
+            yield from _iter_jsonl(source)
+            continue
+
+        if os.path.isdir(source):
+            paths = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(source)
+                for name in names
+                if name.endswith((".html", ".htm"))
+            )
+        elif os.path.exists(source):
+            paths = [source]
+        else:
+            paths = sorted(glob.glob(source, recursive=True))
+
+        for path in paths:
+            yield {
+                "id": path,
+                "html_path": path,
+                "css_path": css_path,
+                "base_url": base_url,
+            }
+
+
+def _iter_jsonl(source):
+    """
+    Yields records from a JSON lines file, or the standard input
+    """
+    f = sys.stdin if source == "-" else open(source)
+
+    try:
+        for number, line in enumerate(f):
+            if line.strip():
+                record = json.loads(line)
+                record.setdefault("id", "%s:%d" % (source, number))
+                yield record
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _init_worker(keep, discard, mode):
+    """
+    Builds the extractor of a worker process
+    """
+    global _worker
+
+    # Only stages durations are reported, rules are not timed
+    profiler = Profiler(rules=False)
+    _worker = (build_extractor(keep, discard, profiler), profiler, mode)
+
+
+def _process(record):
+    """
+    Extracts a single record in the current worker
+
+    :returns: The result record and the stages durations
+    :rtype: tuple
+    """
+    extractor, profiler, mode = _worker
+    result = process_record(extractor, record, mode)
+
+    stages = profiler.report(kind="stage")
+    profiler.reset()
+
+    return result, stages
+
+
+def _run(records, args, keep, discard):
+    """
+    Yields results in input order, with at most a few records per worker
+    in memory at once
+    """
+    initargs = (keep, discard, args.mode)
+
+    if args.workers <= 1:
+        _init_worker(*initargs)
+        yield from map(_process, records)
+        return
+
+    with ProcessPoolExecutor(
+        args.workers, initializer=_init_worker, initargs=initargs
+    ) as pool:
+        pending = deque()
+
+        for record in records:
+            pending.append(pool.submit(_process, record))
+
+            if len(pending) >= args.workers * 4:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+class OutputWriter:
+    """
+    Writes results as JSON lines, or as files in an output directory
+
+    Files are named after the result ids, ids mapping to an already used
+    name get a hash of the id appended to theirs
+    """
+
+    unsafe_chars_re = re.compile(r"[^\w.-]+")
+
+    def __init__(self, output=None, output_dir=None):
+        self.output_dir = output_dir
+        self.file = None
+
+        # The id of every written name
+        self._names = {}
+
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+        elif output is None or output == "-":
+            self.file = sys.stdout
+        else:
+            self.file = open(output, "w")
+
+    def write(self, result):
+        """
+        Writes a single result
+        """
+        if self.output_dir is None:
+            self.file.write(json.dumps(result) + "\n")
+            return
+
+        name = os.path.join(self.output_dir, self._file_name(str(result["id"])))
+
+        if "error" in result:
+            contents = {".error": result["error"]}
+        elif "fragments" in result:
+            contents = {".json": json.dumps(result["fragments"])}
+        else:
+            contents = {".html": result.get("html"), ".css": result.get("css")}
+
+        for ext, text in contents.items():
+            if text is not None:
+                with open(name + ext, "w", encoding="utf-8") as f:
+                    f.write(text)
+
+    def _file_name(self, result_id):
+        """
+        Returns the file name of a result id, without extension
+
+        :raises ValueError: If the id was already written
+        """
+        name = self.unsafe_chars_re.sub("_", result_id).strip("._")
+        name = os.path.splitext(name)[0] or "_"
+
+        if self._names.get(name, result_id) != result_id:
+            name += "-" + md5(result_id.encode("utf-8")).hexdigest()[:8]
+
+        if name in self._names:
+            raise ValueError("Result %r is written twice to %s" % (result_id, name))
+
+        self._names[name] = result_id
+        return name
+
+    def close(self):
+        if self.file is not None and self.file is not sys.stdout:
+            self.file.close()
+
+
+def format_summary(count, errors, size, elapsed, profiler):
+    """
+    Returns the throughput summary of a run
+
+    :rtype: str
+    """
+    elapsed = max(elapsed, 1e-9)
+    lines = [
+        "%d documents (%d errors) in %.2fs, %.1f docs/s, %.2f MB/s"
+        % (count, errors, elapsed, count / elapsed, size / elapsed / 1e6)
+    ]
+    lines += [
+        "  %-16s %10.3fs %8.3fms/doc"
+        % (row["expression"], row["time"], row["mean"] * 1000)
+        for row in profiler.report(kind="stage")
+    ]
+    return "\n".join(lines)
+
+
+def get_parser():
+    """
+    Returns the command line arguments parser
+
+    :rtype: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(
+        prog="chopper", description="Extracts HTML elements and matching CSS rules"
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="directories, glob patterns, HTML files, .jsonl files or - for stdin",
+    )
+    parser.add_argument(
+        "-k", "--keep", action="append", default=[], help="Xpath to keep"
+    )
+    parser.add_argument(
+        "-d", "--discard", action="append", default=[], help="Xpath to discard"
+    )
+    parser.add_argument(
+        "-r", "--rules", help="JSON rules file with keep and discard lists"
+    )
+    parser.add_argument("-m", "--mode", choices=MODES, default="extract")
+    parser.add_argument("--css", help="stylesheet of pages read from paths")
+    parser.add_argument("--base-url", help="base URL of pages read from paths")
+    parser.add_argument("-w", "--workers", type=int, default=1)
+    parser.add_argument("-o", "--output", help="JSON lines output file, default stdout")
+    parser.add_argument("--output-dir", help="write results as files in this directory")
+    parser.add_argument(
+        "--workdir", help="run a resumable batch job writing shards in this directory"
+    )
+    parser.add_argument(
+        "--shard",
+        default="0/1",
+        help="shard of the batch job to run, as INDEX/COUNT, default 0/1",
+    )
+    parser.add_argument("--checkpoint-every", type=int, default=1000)
+    parser.add_argument("-q", "--quiet", action="store_true", help="no summary")
+    return parser
+
+
+def run_batch_job(args, keep, discard):
+    """
+    Runs one shard of a resumable batch job
+
+    :returns: The exit status, 1 if some documents failed
+    :rtype: int
+    """
+    shard, num_shards = (int(n) for n in args.shard.split("/"))
+    job = BatchJob(
+        build_extractor(keep, discard),
+        args.workdir,
+        shard=shard,
+        num_shards=num_shards,
+        mode=args.mode,
+        checkpoint_every=args.checkpoint_every,
+    )
+    start = perf_counter()
+    state = job.run(iter_records(args.inputs, args.css, args.base_url))
+
+    if not args.quiet:
+        print(
+            "shard %d/%d: %d documents done (%d errors), %d in %.2fs"
+            % (
+                shard,
+                num_shards,
+                state["position"],
+                state["errors"],
+                state["processed"],
+                perf_counter() - start,
+            ),
+            file=sys.stderr,
+        )
+
+    return 1 if state["errors"] else 0
+
+
+def main(argv=None):
+    """
+    Runs the command line batch runner: extracts a batch of pages with the same
+    rules, optionally in worker processes, streams results as JSON lines or files
+    and prints a throughput summary
+
+    :returns: The exit status, 1 if some documents failed
+    :rtype: int
+    """
+    args = get_parser().parse_args(argv)
+    keep, discard = load_rules(args)
+
+    if not keep and args.mode != "sanitize":
+        get_parser().error("at least one keep rule is required")
+
+    if args.workdir:
+        if args.workers > 1:
+            get_parser().error("batch jobs run in a single process, run shards instead")
+
+        return run_batch_job(args, keep, discard)
+
+    writer = OutputWriter(args.output, args.output_dir)
+    profiler = Profiler(rules=False)
+    count = errors = size = 0
+    start = perf_counter()
+
+    try:
+        records = iter_records(args.inputs, args.css, args.base_url)
+
+        for result, stages in _run(records, args, keep, discard):
+            count += 1
+            errors += "error" in result
+            size += result.pop("bytes", 0)
+            profiler.merge(stages)
+            writer.write(result)
+    finally:
+        writer.close()
+
+    if not args.quiet:
+        print(
+            format_summary(count, errors, size, perf_counter() - start, profiler),
+            file=sys.stderr,
+        )
+
+    return 1 if errors else 0
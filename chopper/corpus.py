@@ -0,0 +1,226 @@
+from .css.stylesheet import Stylesheet
+
+
+def ranges_from_ids(ids):
+    """
+    Returns rule ids as [start, stop) ranges of consecutive ids
+
+    :param ids: The rule ids, in page order
+    :type ids: iterable of int
+    :rtype: list of list
+    """
+    ranges = []
+
+    for rule_id in ids:
+        if ranges and ranges[-1][1] == rule_id:
+            ranges[-1][1] += 1
+        else:
+            ranges.append([rule_id, rule_id + 1])
+
+    return ranges
+
+
+def rebuild_css(rules, refs):
+    """
+    Returns the cleaned CSS contents of a page
+
+    :param rules: The corpus shared rules, by rule id
+    :type rules: list of str
+    :param refs: The page rule references, as [start, stop) ranges of rule ids
+    :type refs: list of list
+    :rtype: str
+    """
+    return "\n".join(
+        rules[rule_id] for start, stop in refs for rule_id in range(start, stop)
+    )
+
+
+class Corpus:
+    """
+    Extracts pages of the same site against one stylesheet and stores the
+    union of their cleaned CSS rules once
+
+    Every page only references the cleaned rules it kept, as ranges of rule
+    ids given in order of first appearance. The shared stylesheet merges the
+    selectors kept by every page for each source rule, in the source
+    stylesheet order: selectors matching other pages don't match the page,
+    so serving it instead of a page CSS gives the same cascade
+
+    The extractor CSS optimizer, if any, is applied to the rules of every
+    page before they are shared, and to the shared stylesheet
+    """
+
+    def __init__(self, extractor, css_contents, css_base_url=None):
+        """
+        Inits the corpus
+
+        :param extractor: The extractor applied to every page
+        :type extractor: chopper.extractor.Extractor
+        :param css_contents: The CSS contents of the site, or an already
+                             parsed stylesheet
+        :type css_contents: str or Stylesheet
+        :param css_base_url: The base URL used for relative to absolute
+                             links of CSS contents
+        :type css_base_url: str or None
+        """
+        if not isinstance(css_contents, Stylesheet):
+            css_contents = extractor.css_extractor.compile(
+                css_contents, extractor.css_backend
+            )
+
+        self.extractor = extractor
+        self.stylesheet = css_contents
+        self.css_base_url = css_base_url
+
+        # Cleaned rules CSS strings by id
+        self.rules = []
+
+        # Rule ids by (source stylesheet index, CSS string)
+        self._ids = {}
+
+        # Selectors kept by any page by source stylesheet index,
+        # None for rules without selectors
+        self._selectors = {}
+
+    ##########
+    # Public #
+    ##########
+
+    def add(self, html_contents, base_url=None):
+        """
+        Extracts a page and adds its cleaned CSS rules to the shared rules
+
+        :param html_contents: The HTML contents to parse
+        :type html_contents: str
+        :param base_url: The base page URL to use for HTML relative to
+                         absolute links
+        :type base_url: str or None
+        :returns: The cleaned HTML contents and the page rule references,
+                  as [start, stop) ranges of rule ids
+        :rtype: tuple
+        """
+        extractor = self.extractor
+        deadline = extractor.limits.start()
+
+        html_extractor, cleaned_html = extractor._extract_html(
+            html_contents, base_url, deadline
+        )
+
+        if html_extractor is None:
+            extractor._record_document("corpus", html_contents)
+            return None, []
+
+        css_extractor = extractor._get_css_extractor(
+            self.stylesheet, html_extractor.tree, deadline
+        )
+
+        with extractor._stage("css.clean"):
+            cleaned_rules = css_extractor.parse_rules()
+
+            for index, rule in cleaned_rules:
+                self._add_selectors(index, rule)
+
+            # Optimized rules may merge several source rules, they are shared
+            # by their CSS string only
+            if extractor.css_optimizer is not None:
+                cleaned_rules = [
+                    (None, rule)
+                    for rule in extractor.css_optimizer.optimize(
+                        [rule for _, rule in cleaned_rules], self.stylesheet.backend
+                    )
+                ]
+
+        extractor._record_document("corpus", html_contents, None, cleaned_html)
+
+        return cleaned_html, ranges_from_ids(
+            self._get_id(index, rule) for index, rule in cleaned_rules
+        )
+
+    def rebuild(self, refs):
+        """
+        Returns the cleaned CSS contents of a page from its references
+
+        :param refs: The page rule references
+        :type refs: list of list
+        :rtype: str
+        """
+        return rebuild_css(self.rules, refs)
+
+    def to_string(self):
+        """
+        Returns the shared stylesheet, every rule kept by at least one page
+        with the selectors kept by any page, optimized by the extractor
+        CSS optimizer if any
+
+        :rtype: str
+        """
+        backend = self.stylesheet.backend
+        rules = []
+
+        for index in sorted(self._selectors):
+            rule = self.stylesheet.rules[index]
+            selectors = self._selectors[index]
+
+            if selectors is not None:
+                rule = backend.with_selectors(
+                    rule, [s for s in backend.selectors(rule) if s in selectors]
+                )
+
+            rules.append(rule)
+
+        if self.extractor.css_optimizer is not None:
+            rules = self.extractor.css_optimizer.optimize(rules, backend)
+
+        return "\n".join(self._rule_as_string(rule) for rule in rules)
+
+    ###########
+    # Private #
+    ###########
+
+    def _get_id(self, index, rule):
+        """
+        Returns the id of a cleaned rule, adding it to shared rules if unknown
+
+        :param index: The rule index in the source stylesheet, None for
+                      optimized rules
+        :type index: int or None
+        :param rule: The cleaned CSS backend rule
+        :rtype: int
+        """
+        css = self._rule_as_string(rule)
+        key = (index, css)
+
+        try:
+            return self._ids[key]
+        except KeyError:
+            pass
+
+        rule_id = self._ids[key] = len(self.rules)
+        self.rules.append(css)
+        return rule_id
+
+    def _add_selectors(self, index, rule):
+        """
+        Adds the selectors of a cleaned rule to the shared stylesheet
+
+        :param index: The rule index in the source stylesheet
+        :type index: int
+        :param rule: The cleaned CSS backend rule
+        """
+        backend = self.stylesheet.backend
+
+        if backend.is_style_rule(rule):
+            self._selectors.setdefault(index, set()).update(backend.selectors(rule))
+        else:
+            self._selectors[index] = None
+
+    def _rule_as_string(self, rule):
+        """
+        Returns a rule as a CSS string with absolute links
+        """
+        css = self.stylesheet.backend.rule_as_string(rule)
+
+        if self.css_base_url is not None:
+            css = self.extractor.css_extractor._rel_to_abs(css, self.css_base_url)
+
+        return css
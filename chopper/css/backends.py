@@ -0,0 +1,426 @@
+from tinycss.css21 import ImportRule, MediaRule, PageRule, RuleSet
+from tinycss.parsing import split_on_comma, strip_whitespace
+
+from .parser import CSSParser
+from .rules import FontFaceRule, StyleRule
+
+
+class CSSBackend:
+    """
+    Parses stylesheets and serializes their rules for the CSSExtractor
+
+    Style rules are exposed as StyleRule objects whose selectors can be
+    cleaned and whose declarations are (name, value, important) tuples,
+    every other rule is backend specific and kept as is
+    """
+
+    name = None
+
+    # Whether @import rules following other rules are dropped by the parser
+    drops_late_imports = False
+
+    def __reduce__(self):
+        """
+        Backends are pickled by name and unpickled as the shared instance
+        """
+        return get_backend, (self.name,)
+
+    def parse_stylesheet(self, css_contents):
+        """
+        Returns the rules of a stylesheet, invalid rules are dropped
+
+        :param css_contents: The CSS contents to parse
+        :type css_contents: str
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def is_style_rule(self, rule):
+        """
+        Returns whether the rule has selectors to clean or not
+
+        :param rule: The rule to check
+        :rtype: bool
+        """
+        return isinstance(rule, StyleRule)
+
+    def is_import_rule(self, rule):
+        """
+        Returns whether the rule is an @import rule or not
+
+        :param rule: The rule to check
+        :rtype: bool
+        """
+        raise NotImplementedError
+
+    def selectors(self, rule):
+        """
+        Returns the selectors of a style rule
+
+        :param rule: The style rule
+        :type rule: StyleRule
+        :rtype: list of str
+        """
+        return rule.selectors
+
+    def with_selectors(self, rule, selectors):
+        """
+        Returns a copy of a style rule with other selectors
+
+        :param rule: The style rule
+        :type rule: StyleRule
+        :param selectors: The selectors of the copy
+        :type selectors: list of str
+        :rtype: StyleRule
+        """
+        return StyleRule(selectors, rule.declarations, rule.line, rule.column)
+
+    def with_declarations(self, rule, declarations):
+        """
+        Returns a copy of a style rule with other declarations
+
+        :param rule: The style rule
+        :type rule: StyleRule
+        :param declarations: (name, value, important) tuples
+        :type declarations: list of tuple
+        :rtype: StyleRule
+        """
+        return StyleRule(rule.selectors, declarations, rule.line, rule.column)
+
+    def rule_as_string(self, rule):
+        """
+        Converts a rule to a formatted CSS string
+
+        :param rule: The rule to format
+        :returns: The rule as a CSS string
+        :rtype: str
+        """
+        raise NotImplementedError
+
+    def declarations(self, rule):
+        """
+        Returns the declarations of a style rule
+
+        :param rule: The style rule
+        :type rule: StyleRule
+        :returns: (name, value, important) tuples
+        :rtype: list of tuple
+        """
+        return rule.declarations
+
+    def parse_declarations(self, css_contents):
+        """
+        Returns the declarations of a style attribute, invalid ones are dropped
+
+        :param css_contents: The declarations to parse
+        :type css_contents: str
+        :returns: (name, value, important) tuples
+        :rtype: list of tuple
+        """
+        raise NotImplementedError
+
+    def declarations_as_string(self, declarations):
+        """
+        Returns (name, value, important) declarations as a formatted CSS string
+
+        :param declarations: The declarations to format
+        :type declarations: list of tuple
+        :rtype: str
+        """
+        return "".join(
+            "%s:%s%s;" % (name, value, " !important" if important else "")
+            for name, value, important in declarations
+        )
+
+
+class TinycssBackend(CSSBackend):
+    """
+    tinycss 0.4 backend, CSS 2.1 with @font-face and CSS3 @page
+    """
+
+    name = "tinycss"
+    parser = CSSParser()
+    drops_late_imports = True
+
+    def parse_stylesheet(self, css_contents):
+        return [
+            self._style_rule(rule) if isinstance(rule, RuleSet) else rule
+            for rule in self.parser.parse_stylesheet(css_contents).rules
+        ]
+
+    def is_import_rule(self, rule):
+        return isinstance(rule, ImportRule)
+
+    def rule_as_string(self, rule):
+        if isinstance(rule, StyleRule):
+            # Simple CSS rule : a { color: red; }
+            return "%s{%s}" % (
+                ",".join(rule.selectors),
+                self.declarations_as_string(rule.declarations),
+            )
+
+        elif isinstance(rule, RuleSet):
+            # Rules nested in @media rules
+            return self.rule_as_string(self._style_rule(rule))
+
+        elif isinstance(rule, ImportRule):
+            # @import rule
+            return "@import url('%s') %s;" % (rule.uri, ",".join(rule.media))
+
+        elif isinstance(rule, FontFaceRule):
+            # @font-face rule
+            return "@font-face{%s}" % self._declarations_as_string(rule.declarations)
+
+        elif isinstance(rule, MediaRule):
+            # @media rule
+            return "@media %s{%s}" % (
+                ",".join(rule.media),
+                "".join(self.rule_as_string(r) for r in rule.rules),
+            )
+
+        elif isinstance(rule, PageRule):
+            # @page rule
+            selector, pseudo = rule.selector
+
+            return "@page%s%s{%s}" % (
+                " %s" % selector if selector else "",
+                " :%s" % pseudo if pseudo else "",
+                self._declarations_as_string(rule.declarations),
+            )
+
+        return ""
+
+    def parse_declarations(self, css_contents):
+        declarations, _ = self.parser.parse_style_attr(css_contents)
+        return [
+            (d.name, d.value.as_css(), d.priority == "important") for d in declarations
+        ]
+
+    def _style_rule(self, rule):
+        """
+        Returns a StyleRule for a tinycss RuleSet
+        """
+        return StyleRule(
+            [
+                "".join(token.as_css() for token in strip_whitespace(token_list))
+                for token_list in split_on_comma(rule.selector)
+            ],
+            [
+                (d.name, d.value.as_css(), d.priority == "important")
+                for d in rule.declarations
+            ],
+            rule.line,
+            rule.column,
+        )
+
+    def _declarations_as_string(self, declarations):
+        """
+        Returns a list of tinycss declarations as a formatted CSS string
+
+        :param declarations: The list of tinycss Declarations to format
+        :type declarations: list of tinycss.css21.Declaration
+        :returns: The CSS string for the declarations list
+        :rtype: str
+        """
+        return "".join(
+            "%s:%s%s;"
+            % (d.name, d.value.as_css(), " !" + d.priority if d.priority else "")
+            for d in declarations
+        )
+
+
+class Tinycss2Backend(CSSBackend):
+    """
+    tinycss2 backend, a maintained parser following CSS Syntax Level 3
+    that also keeps modern at-rules like @supports, @layer or @container
+    """
+
+    name = "tinycss2"
+
+    # At-rules containing rules
+    block_at_rules = frozenset(
+        (
+            "media",
+            "supports",
+            "layer",
+            "container",
+            "scope",
+            "starting-style",
+            "document",
+        )
+    )
+
+    # At-rules kept as is, others are dropped
+    known_at_rules = block_at_rules | frozenset(
+        (
+            "import",
+            "font-face",
+            "page",
+            "namespace",
+            "keyframes",
+            "-webkit-keyframes",
+            "-moz-keyframes",
+            "counter-style",
+            "property",
+            "font-feature-values",
+            "font-palette-values",
+        )
+    )
+
+    def __init__(self):
+        try:
+            import tinycss2
+        except ImportError as e:  # pragma: no cover
+            raise ImportError(
+                "The tinycss2 CSS backend requires tinycss2: pip install chopper[tinycss2]"
+            ) from e
+
+        self.tinycss2 = tinycss2
+
+    def parse_stylesheet(self, css_contents):
+        return self._parse_rules(
+            self.tinycss2.parse_stylesheet(
+                css_contents, skip_comments=True, skip_whitespace=True
+            )
+        )
+
+    def is_import_rule(self, rule):
+        return not isinstance(rule, StyleRule) and rule.lower_at_keyword == "import"
+
+    def rule_as_string(self, rule):
+        serialize = self.tinycss2.serialize
+
+        if isinstance(rule, StyleRule):
+            return "%s{%s}" % (
+                ",".join(rule.selectors),
+                self.declarations_as_string(self.declarations(rule)),
+            )
+
+        name = rule.lower_at_keyword
+        prelude = serialize(rule.prelude).strip()
+        prelude = " " + prelude if prelude else ""
+
+        if name == "import":
+            return self._import_as_string(rule)
+
+        if rule.content is None:
+            return "@%s%s;" % (name, prelude)
+
+        if name in self.block_at_rules:
+            content = "".join(
+                self.rule_as_string(r)
+                for r in self._parse_rules(
+                    self.tinycss2.parse_rule_list(
+                        rule.content, skip_comments=True, skip_whitespace=True
+                    )
+                )
+            )
+        elif name.endswith("keyframes"):
+            content = serialize(rule.content).strip()
+        else:
+            content = self.declarations_as_string(
+                self._parse_declarations(rule.content)
+            )
+
+        return "@%s%s{%s}" % (name, prelude, content)
+
+    def parse_declarations(self, css_contents):
+        return self._parse_declarations(css_contents)
+
+    def _import_as_string(self, rule):
+        """
+        Returns an @import rule always using url() so relative links
+        can be converted, empty when the rule has no URL
+        """
+        tokens = [t for t in rule.prelude if t.type not in ("whitespace", "comment")]
+
+        if not tokens or tokens[0].type not in ("string", "url"):
+            return ""
+
+        media_start = rule.prelude.index(tokens[0]) + 1
+        media = self.tinycss2.serialize(rule.prelude[media_start:]).strip()
+
+        return "@import url('%s')%s;" % (tokens[0].value, " " + media if media else "")
+
+    def _parse_rules(self, rules):
+        """
+        Returns StyleRule objects for qualified rules and known at-rules,
+        parse errors and unknown at-rules are dropped. Style rules
+        declarations are parsed once, as (name, value, important) tuples
+        """
+        parsed = []
+
+        for rule in rules:
+            if rule.type == "qualified-rule":
+                parsed.append(
+                    StyleRule(
+                        self._split_selectors(rule.prelude),
+                        self._parse_declarations(rule.content),
+                        rule.source_line,
+                        rule.source_column,
+                    )
+                )
+
+            elif (
+                rule.type == "at-rule" and rule.lower_at_keyword in self.known_at_rules
+            ):
+                parsed.append(rule)
+
+        return parsed
+
+    def _split_selectors(self, prelude):
+        """
+        Returns the selectors of a rule prelude, commas in functions
+        and brackets are nested in their block tokens
+        """
+        selectors, current = [], []
+
+        for token in prelude + [None]:
+            if token is None or (token.type == "literal" and token.value == ","):
+                selectors.append(self.tinycss2.serialize(current).strip())
+                current = []
+            elif token.type != "comment":
+                current.append(token)
+
+        return selectors
+
+    def _parse_declarations(self, content):
+        """
+        Returns (name, value, important) tuples for declarations tokens
+        """
+        return [
+            (d.name, self.tinycss2.serialize(d.value).strip(), d.important)
+            for d in self.tinycss2.parse_declaration_list(
+                content, skip_comments=True, skip_whitespace=True
+            )
+            if d.type == "declaration"
+        ]
+
+
+backends = {
+    TinycssBackend.name: TinycssBackend,
+    Tinycss2Backend.name: Tinycss2Backend,
+}
+
+# Backends are stateless, share one instance of each
+_instances = {}
+
+
+def get_backend(backend=None):
+    """
+    Returns a CSS backend instance
+
+    :param backend: A backend name, a backend instance, tinycss when None
+    :type backend: str or CSSBackend or None
+    :rtype: CSSBackend
+    """
+    if isinstance(backend, CSSBackend):
+        return backend
+
+    name = backend or TinycssBackend.name
+
+    try:
+        return _instances[name]
+    except KeyError:
+        instance = _instances[name] = backends[name]()
+        return instance
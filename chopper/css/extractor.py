@@ -1,13 +1,18 @@
 import re
+from collections import deque
+from concurrent.futures import wait
+from itertools import islice
+from time import perf_counter
 from urllib.parse import urljoin
 
 import cssselect
-from tinycss.css21 import ImportRule, MediaRule, PageRule, RuleSet
-from tinycss.parsing import split_on_comma, strip_whitespace
 
+from ..exceptions import DocumentTooLarge
 from ..mixins import TreeBuilderMixin
-from .parser import CSSParser
-from .rules import FontFaceRule
+from ..threads import get_executor
+from .backends import get_backend
+from .stream import iter_rules
+from .stylesheet import Stylesheet
 from .translator import XpathTranslator
 
 
@@ -16,30 +21,100 @@ class CSSExtractor(TreeBuilderMixin):
     Extracts CSS rules only matching a html tree
     """
 
-    parser = CSSParser()
     xpath_translator = XpathTranslator()
 
+    # The minimum number of rules cleaned by a worker at once
+    min_chunk_size = 256
+
     rel_to_abs_re = re.compile(
         r'url\(["\']?(?!data:)(?P<path>[^\)]*)["\']?\)', re.IGNORECASE | re.MULTILINE
     )
 
-    def __init__(self, css_contents, html_contents):
+    def __init__(
+        self,
+        css_contents,
+        html_contents,
+        template_cache=None,
+        limits=None,
+        deadline=None,
+        profiler=None,
+        backend=None,
+        optimizer=None,
+        metrics=None,
+        workers=None,
+    ):
         """
         Inits the CSS extractor
 
-        :param css_contents: The CSS contents to parse
-        :type css_contents: str
-        :param html_contents: The HTML contents to parse
-        :type html_contents: str
+        :param css_contents: The CSS contents to parse or an already parsed stylesheet
+        :type css_contents: str or Stylesheet
+        :param html_contents: The HTML contents to parse or an already built tree
+        :type html_contents: str or lxml.html.HtmlElement
+        :param template_cache: The cache of matches by page template
+        :type template_cache: chopper.cache.TemplateCache or None
+        :param limits: The resource limits to check
+        :type limits: chopper.limits.Limits or None
+        :param deadline: The document deadline, checked between rules
+        :type deadline: chopper.limits.Deadline or None
+        :param profiler: The profiler recording CSS selectors costs
+        :type profiler: chopper.profiler.Profiler or None
+        :param backend: The CSS backend, or its name, used to parse CSS contents
+        :type backend: str or chopper.css.backends.CSSBackend or None
+        :param optimizer: The optimizer of cleaned rules
+        :type optimizer: chopper.css.optimizer.CSSOptimizer or None
+        :param metrics: The metrics counting kept rules and assumed matches
+        :type metrics: chopper.metrics.Metrics or None
+        :param workers: The number of threads cleaning chunks of rules of
+                        large stylesheets, one when None
+        :type workers: int or None
         """
         self.css_contents = css_contents
         self.html_contents = html_contents
+        self.template_cache = template_cache
+        self.template = None
+        self.limits = limits
+        self.deadline = deadline
+        self.profiler = profiler
+        self.backend = backend
+        self.optimizer = optimizer
+        self.metrics = metrics
+        self.workers = workers
         self.cleaned_css = ""
 
     ##########
     # Public #
     ##########
 
+    @classmethod
+    def compile(cls, css_contents, backend=None, translate=False):
+        """
+        Parses CSS contents once to clean them against several HTML trees
+
+        :param css_contents: The CSS contents to parse
+        :type css_contents: str
+        :param backend: The CSS backend, or its name, tinycss when None
+        :type backend: str or chopper.css.backends.CSSBackend or None
+        :param translate: Translate every selector to its Xpath expression now
+                          instead of on its first evaluation, before saving
+                          the stylesheet to a bundle for instance
+        :type translate: bool
+        :returns: The parsed stylesheet
+        :rtype: Stylesheet
+        """
+        backend = get_backend(backend)
+        stylesheet = Stylesheet(backend.parse_stylesheet(css_contents), backend)
+
+        if translate:
+            extractor = cls(stylesheet, None)
+            extractor.stylesheet = stylesheet
+
+            for rule in stylesheet.rules:
+                if backend.is_style_rule(rule):
+                    for selector in backend.selectors(rule):
+                        extractor._selector_to_xpath(selector)
+
+        return stylesheet
+
     def parse(self):
         """
         Parses the CSS contents and returns the cleaned CSS as a string
@@ -47,29 +122,107 @@ class CSSExtractor(TreeBuilderMixin):
         :returns: The cleaned CSS
         :rtype: str
         """
-        # Build the HTML tree
-        self.tree = self._build_tree(self.html_contents)
+        # Too large CSS contents are either refused or kept as is
+        if self._is_too_large():
+            self.cleaned_css = self.css_contents
+            return
 
-        # Parse the CSS contents
-        self.stylesheet = self.parser.parse_stylesheet(self.css_contents)
+        self._load()
 
         # Get the cleaned CSS contents
         self.cleaned_css = self._clean_css()
 
+    def parse_rules(self):
+        """
+        Parses the CSS contents and returns the cleaned rules with their
+        position in the stylesheet
+
+        :returns: (rule index, cleaned CSS backend rule) tuples, in stylesheet order
+        :rtype: list of tuple
+        """
+        self._load()
+
+        return [
+            (index, cleaned_rule)
+            for index, rule in enumerate(self.stylesheet.rules)
+            for cleaned_rule in self._iter_cleaned_rules((rule,))
+        ]
+
     def rel_to_abs(self, base_url):
         """
         Converts relative links from css contents to absolute links
 
         :param base_url: The base page url to use for building absolute links
         :type base_url: str
-        :param css_contents: The CSS contents to parse
-        :type css_contents: str
         """
-        self.cleaned_css = self.rel_to_abs_re.sub(
-            lambda match: "url('%s')"
-            % urljoin(base_url, match.group("path").strip("'\"")),
-            self.cleaned_css,
-        )
+        self.cleaned_css = self._rel_to_abs(self.cleaned_css, base_url)
+
+    def inline(self, base_url=None):
+        """
+        Applies the CSS rules as inline styles on the HTML tree
+
+        Declarations are resolved with the cascade: !important, inline
+        styles, selectors specificity and source order. Selectors with
+        pseudo-elements or dynamic pseudo-classes, rules nested in at-rules
+        and selectors that can't be evaluated are not inlined
+
+        :param base_url: The base page url to use for building absolute links
+        :type base_url: str or None
+        """
+        # Too large CSS contents are either refused or not inlined
+        if self._is_too_large():
+            return
+
+        self._load()
+
+        for elt, declarations in self._cascade().items():
+            self._inline_style(elt, declarations, base_url)
+
+    def stream(self, sink, base_url=None):
+        """
+        Cleans the CSS contents rule by rule and writes matching rules to a sink
+
+        Rules are tokenized, parsed, matched and written one at a time, the
+        CSS stage only holds the rule being cleaned besides the HTML tree
+
+        :param sink: The binary file-like object to write UTF-8 CSS contents to
+        :type sink: io.RawIOBase or io.BufferedIOBase
+        :param base_url: The base page url to use for building absolute links
+        :type base_url: str or None
+        """
+        # Too large CSS contents are either refused or kept as is
+        if self._is_too_large():
+            sink.write(self.css_contents.encode("utf-8"))
+            return
+
+        self.tree = self._build_tree(self.html_contents)
+
+        if self.template_cache is not None:
+            self.template, _ = self.template_cache.get_template(self.tree)
+
+        if isinstance(self.css_contents, Stylesheet):
+            self.stylesheet = self.css_contents
+            rules = self.stylesheet.rules
+        else:
+            # Selectors translations are only cached while cleaning a rule
+            self.stylesheet = Stylesheet([], get_backend(self.backend))
+            rules = self._iter_parsed_rules()
+
+        rules = self._iter_cleaned_rules(rules)
+
+        if self.optimizer is not None:
+            rules = self.optimizer.iter_optimized(rules, self.stylesheet.backend)
+
+        separator = b""
+
+        for rule in rules:
+            css = self._rule_as_string(rule)
+
+            if base_url is not None:
+                css = self._rel_to_abs(css, base_url)
+
+            sink.write(separator + css.encode("utf-8"))
+            separator = b"\n"
 
     def to_string(self):
         """
@@ -88,172 +241,500 @@ class CSSExtractor(TreeBuilderMixin):
         """
         Returns the cleaned CSS
 
-        :param stylesheet: The Stylesheet object to parse
-        :type stylesheet: tinycss.css21.Stylesheet
+        :returns: The cleaned CSS contents
+        :rtype: str
+        """
+        rules = self.stylesheet.rules
+
+        if self.workers is not None and self.workers > 1:
+            rules = self._clean_rules_in_parallel(rules)
+        else:
+            rules = self._iter_cleaned_rules(rules)
+
+        if self.optimizer is not None:
+            rules = self.optimizer.optimize(rules, self.stylesheet.backend)
+
+        return self._build_css(rules)
+
+    def _clean_rules_in_parallel(self, rules):
+        """
+        Returns the cleaned rules matching the tree, chunks of rules are
+        cleaned by several threads against the shared tree, in source order
+
+        :param rules: The CSS backend rules to clean
+        :type rules: list
+        :rtype: list
+        """
+        size = max(self.min_chunk_size, -(-len(rules) // (self.workers * 4)))
+
+        if len(rules) <= size:
+            return list(self._iter_cleaned_rules(rules))
+
+        iterator = iter(rules)
+        chunks = deque(enumerate(iter(lambda: list(islice(iterator, size)), [])))
+        results = [None] * len(chunks)
+
+        def clean_chunks():
+            # Workers take the next chunk until every chunk is taken
+            try:
+                while True:
+                    try:
+                        index, chunk = chunks.popleft()
+                    except IndexError:
+                        return
+
+                    results[index] = list(self._iter_cleaned_rules(chunk))
+            except BaseException:
+                # Other workers stop after their current chunk
+                chunks.clear()
+                raise
+
+        executor = get_executor()
+        futures = [
+            executor.submit(clean_chunks)
+            for _ in range(min(self.workers, len(chunks)) - 1)
+        ]
+
+        # The calling thread also cleans chunks, even if helpers are all busy
+        try:
+            clean_chunks()
+        finally:
+            wait(futures)
+
+        for future in futures:
+            future.result()
+
+        return [rule for chunk in results for rule in chunk]
+
+    def _iter_cleaned_rules(self, rules):
         """
-        # Init the cleaned CSS rules and contents string
-        css_rules = []
+        Yields the cleaned rules matching the tree
 
+        :param rules: The CSS backend rules to clean
+        :type rules: iterable
+        :rtype: generator
+        """
         # For every rule in the CSS
-        for rule in self.stylesheet.rules:
+        for rule in rules:
+            # Out of time, either stop or keep remaining rules as is
+            if self.deadline is not None and self.deadline.expired():
+                if self.limits is None or not self.limits.degrade:
+                    self.deadline.check("css")
+
+                self._count_assumed_match("deadline")
+                yield rule
+                continue
+
             try:
                 # Clean the CSS rule
                 cleaned_rule = self._clean_rule(rule)
 
-                # Append the rule to matched CSS rules
-                if cleaned_rule is not None:
-                    css_rules.append(cleaned_rule)
-
             except Exception:
                 # On error, assume the rule matched the tree
-                css_rules.append(rule)
+                self._count_assumed_match("rule error")
+                cleaned_rule = rule
+
+            if self.metrics is not None:
+                self.metrics.inc(
+                    "chopper_css_rules_total",
+                    (("result", "dropped" if cleaned_rule is None else "kept"),),
+                )
+
+            # Yield matched CSS rules
+            if cleaned_rule is not None:
+                yield cleaned_rule
+
+    def _load(self):
+        """
+        Builds the HTML tree and parses the CSS contents
+        """
+        # Build the HTML tree
+        self.tree = self._build_tree(self.html_contents)
+
+        # Get the known selectors matches for the tree template
+        if self.template_cache is not None:
+            self.template, _ = self.template_cache.get_template(self.tree)
 
-        return self._build_css(css_rules)
+        # Parse the CSS contents
+        if isinstance(self.css_contents, Stylesheet):
+            self.stylesheet = self.css_contents
+        else:
+            self.stylesheet = self.compile(self.css_contents, self.backend)
+
+    def _is_too_large(self):
+        """
+        Returns whether the CSS contents are too large to be cleaned,
+        raises DocumentTooLarge unless resource limits degrade
+
+        :rtype: bool
+        """
+        if self.limits is None:
+            return False
+
+        try:
+            self.limits.check_size(self.css_contents)
+        except DocumentTooLarge:
+            if not self.limits.degrade:
+                raise
+
+            return True
+
+        return False
+
+    def _inline_style(self, elt, declarations, base_url):
+        """
+        Sets the style attribute of an element from its cascaded declarations
+
+        :param elt: The element to style
+        :type elt: lxml.html.HtmlElement
+        :param declarations: (priority, value, important) tuples by property
+        :type declarations: dict
+        :param base_url: The base page url to use for building absolute links
+        :type base_url: str or None
+        """
+        backend = self.stylesheet.backend
+
+        # Inline styles win over selectors without !important
+        for index, (name, value, important) in enumerate(
+            backend.parse_declarations(elt.get("style", ""))
+        ):
+            self._cascade_declaration(
+                declarations, name, value, important, (important, 1, 0, 0, index)
+            )
+
+        # Sorted by priority for shorthands to be overridden as in the cascade
+        style = backend.declarations_as_string(
+            (name, value, important)
+            for name, (_, value, important) in sorted(
+                declarations.items(), key=lambda item: item[1][0]
+            )
+        )
+
+        if base_url is not None:
+            style = self._rel_to_abs(style, base_url)
+
+        elt.set("style", style)
+
+    def _cascade(self):
+        """
+        Returns the declarations of matched elements, by element and property
+
+        :returns: (priority, value, important) tuples by property, by element
+        :rtype: dict
+        """
+        backend = self.stylesheet.backend
+        styles = {}
+
+        for order, rule in enumerate(self.stylesheet.rules):
+            # Out of time, either stop or inline the rules already cascaded
+            if self.deadline is not None and self.deadline.expired():
+                if self.limits is None or not self.limits.degrade:
+                    self.deadline.check("css")
+
+                break
+
+            if not backend.is_style_rule(rule):
+                continue
+
+            declarations = backend.declarations(rule)
+
+            for selector in backend.selectors(rule) if declarations else ():
+                specificity = self._selector_specificity(selector)
+
+                if specificity is None:
+                    continue
+
+                for elt in self._select(selector):
+                    element_declarations = styles.setdefault(elt, {})
+
+                    for index, (name, value, important) in enumerate(declarations):
+                        self._cascade_declaration(
+                            element_declarations,
+                            name,
+                            value,
+                            important,
+                            (important, 0, specificity, order, index),
+                        )
+
+        return styles
+
+    def _cascade_declaration(self, declarations, name, value, important, priority):
+        """
+        Sets a declaration if it wins over the known one of the same property
+
+        :param declarations: (priority, value, important) tuples by property
+        :type declarations: dict
+        :param priority: (important, inline, specificity, rule, declaration)
+        :type priority: tuple
+        """
+        name = name.lower()
+        known = declarations.get(name)
+
+        if known is None or known[0] <= priority:
+            declarations[name] = (priority, value, important)
+
+    def _selector_specificity(self, selector):
+        """
+        Returns the specificity of a selector that can be inlined,
+        specificities are cached on the stylesheet
+
+        :param selector: The CSS selector
+        :type selector: str
+        :returns: The specificity or None if the selector can't be inlined
+        :rtype: tuple or None
+        """
+        try:
+            return self.stylesheet.specificities[selector]
+        except KeyError:
+            pass
+
+        try:
+            parsed = cssselect.parse(selector)[0]
+        except Exception:
+            specificity = None
+        else:
+            if parsed.pseudo_element is None and not self.xpath_translator.is_dynamic(
+                parsed
+            ):
+                specificity = parsed.specificity()
+            else:
+                specificity = None
+
+        self.stylesheet.specificities[selector] = specificity
+        return specificity
+
+    def _select(self, selector):
+        """
+        Returns the elements matching the CSS selector, none when
+        it can't be evaluated
+
+        :param selector: The CSS selector to evaluate
+        :type selector: str
+        :rtype: list
+        """
+        xpath = self._selector_to_xpath(selector)
+
+        if xpath is None:
+            return []
+
+        start = perf_counter()
+
+        try:
+            elements = self.tree.xpath(xpath)
+        except Exception:
+            elements = []
+
+        if self.profiler is not None and self.profiler.rules:
+            self.profiler.record(
+                "selector", selector, perf_counter() - start, bool(elements)
+            )
+
+        return elements
+
+    def _iter_parsed_rules(self):
+        """
+        Yields the parsed rules of the CSS contents, one rule at a time
+
+        Rules are parsed on their own, @import rules following other rules
+        are dropped here when the backend drops them from whole stylesheets
+
+        :rtype: generator
+        """
+        backend = self.stylesheet.backend
+        follows_rules = False
+
+        for css in iter_rules(self.css_contents):
+            self.stylesheet.xpaths.clear()
+
+            for rule in backend.parse_stylesheet(css):
+                if not backend.is_import_rule(rule):
+                    follows_rules = True
+                elif follows_rules and backend.drops_late_imports:
+                    continue
+
+                yield rule
 
     def _clean_rule(self, rule):
         """
         Cleans a css Rule by removing Selectors without matches on the tree
         Returns None if the whole rule do not match
+        The rule itself is left untouched as it can be shared by several trees
 
         :param rule: CSS Rule to check
-        :type rule: A tinycss Rule object
-        :returns: A cleaned tinycss Rule with only Selectors matching the tree or None
-        :rtype: tinycss Rule or None
+        :type rule: A CSS backend rule
+        :returns: A cleaned Rule with only Selectors matching the tree or None
+        :rtype: CSS backend rule or None
         """
+        backend = self.stylesheet.backend
+
         # Always match @ rules
-        if rule.at_keyword is not None:
+        if not backend.is_style_rule(rule):
             return rule
 
         # Clean selectors
-        cleaned_token_list = []
-
-        for token_list in split_on_comma(rule.selector):
-            # If the token list matches the tree
-            if self._token_list_matches_tree(token_list):
-                # Add a Comma if multiple token lists matched
-                if len(cleaned_token_list) > 0:
-                    cleaned_token_list.append(
-                        cssselect.parser.Token(
-                            "DELIM", ",", len(cleaned_token_list) + 1
-                        )
-                    )
-
-                # Append it to the list of cleaned token list
-                cleaned_token_list += token_list
+        selectors = backend.selectors(rule)
+        cleaned_selectors = [s for s in selectors if self._selector_matches_tree(s)]
 
         # Return None if selectors list is empty
-        if not cleaned_token_list:
+        if not cleaned_selectors:
             return None
 
-        # Update rule token list
-        rule.selector = cleaned_token_list
-
         # Return cleaned rule
-        return rule
+        if len(cleaned_selectors) == len(selectors):
+            return rule
 
-    def _token_list_matches_tree(self, token_list):
+        return backend.with_selectors(rule, cleaned_selectors)
+
+    def _selector_matches_tree(self, selector):
         """
-        Returns whether the token list matches the HTML tree
+        Returns whether the selector matches the HTML tree,
+        from the template cache when possible
 
-        :param selector: A Token list to check
-        :type selector: list of Token objects
-        :returns: True if the token list has matches in self.tree
+        :param selector: A CSS selector to check
+        :type selector: str
+        :returns: True if the selector has matches in self.tree
         :rtype: bool
         """
-        try:
-            parsed_selector = cssselect.parse(
-                "".join(token.as_css() for token in token_list)
-            )[0]
+        if self.template is None or not self.template_cache.can_cache_selector(
+            selector
+        ):
+            return self._profile_selector(selector)
 
-            return bool(
-                self.tree.xpath(
-                    self.xpath_translator.selector_to_xpath(parsed_selector)
-                )
+        try:
+            matches = self.template.selectors[selector]
+        except KeyError:
+            matches = self._profile_selector(selector)
+            self.template.selectors[selector] = matches
+            result = "miss"
+        else:
+            result = "hit"
+
+        if self.metrics is not None:
+            self.metrics.inc(
+                "chopper_selector_cache_requests_total", (("result", result),)
             )
-        except Exception:
-            # On error, assume the selector matches the tree
-            return True
 
-    def _build_css(self, rules):
+        return matches
+
+    def _profile_selector(self, selector):
         """
-        Returns a CSS string for the given rules
+        Returns whether the CSS selector matches the HTML tree
 
-        :param rules: List of tinycss Rule
-        :type rules: list of tinycss Rule objects
-        :returns: CSS contents for the rules
-        :rtype: string
+        :param selector: The CSS selector to check
+        :type selector: str
+        :returns: True if the selector has matches in self.tree
+        :rtype: bool
         """
-        # Build and return the cleaned CSS contents
-        return "\n".join(self._rule_as_string(rule) for rule in rules)
+        if self.profiler is None or not self.profiler.rules:
+            return self._evaluate_selector(selector)
 
-    def _rule_as_string(self, rule):
+        start = perf_counter()
+        matches = self._evaluate_selector(selector)
+        self.profiler.record("selector", selector, perf_counter() - start, matches)
+
+        return matches
+
+    def _evaluate_selector(self, selector):
         """
-        Converts a tinycss rule to a formatted CSS string
+        Evaluates the CSS selector against the HTML tree,
+        assumes it matches when it can't be evaluated
 
-        :param rule: The rule to format
-        :type rule: tinycss Rule object
-        :returns: The Rule as a CSS string
-        :rtype: str
+        :param selector: The CSS selector to evaluate
+        :type selector: str
+        :returns: True if the selector has matches in self.tree
+        :rtype: bool
         """
-        if isinstance(rule, RuleSet):
-            # Simple CSS rule : a { color: red; }
-            return "%s{%s}" % (
-                self._selector_as_string(rule.selector),
-                self._declarations_as_string(rule.declarations),
-            )
+        xpath = self._selector_to_xpath(selector)
 
-        elif isinstance(rule, ImportRule):
-            # @import rule
-            return "@import url('%s') %s;" % (rule.uri, ",".join(rule.media))
+        # The selector could not be translated, assume it matches the tree
+        if xpath is None:
+            self._count_assumed_match("untranslatable")
+            return True
 
-        elif isinstance(rule, FontFaceRule):
-            # @font-face rule
-            return "@font-face{%s}" % self._declarations_as_string(rule.declarations)
+        try:
+            return bool(self.tree.xpath(xpath))
+        except Exception:
+            # On error, assume the selector matches the tree
+            self._count_assumed_match("xpath error")
+            return True
 
-        elif isinstance(rule, MediaRule):
-            # @media rule
-            return "@media %s{%s}" % (
-                ",".join(rule.media),
-                "".join(self._rule_as_string(r) for r in rule.rules),
-            )
+    def _count_assumed_match(self, reason):
+        """
+        Counts a selector or rule assumed to match the tree
 
-        elif isinstance(rule, PageRule):
-            # @page rule
-            selector, pseudo = rule.selector
+        :param reason: Why it could not be evaluated
+        :type reason: str
+        """
+        if self.metrics is not None:
+            self.metrics.inc("chopper_css_assumed_matches_total", (("reason", reason),))
 
-            return "@page%s%s{%s}" % (
-                " %s" % selector if selector else "",
-                " :%s" % pseudo if pseudo else "",
-                self._declarations_as_string(rule.declarations),
-            )
+    def _selector_to_xpath(self, selector):
+        """
+        Returns the Xpath expression for a CSS selector, translations are
+        cached on the stylesheet
+
+        :param selector: The CSS selector to translate
+        :type selector: str
+        :returns: The Xpath expression or None if the selector can't be translated
+        :rtype: str or None
+        """
+        try:
+            return self.stylesheet.xpaths[selector]
+        except KeyError:
+            pass
 
-        return ""
+        try:
+            try:
+                parsed = cssselect.parse(selector)[0]
+            except cssselect.SelectorSyntaxError:
+                # Pseudo-elements followed by pseudo-classes: a::before:hover
+                parsed = cssselect.parse(
+                    self.xpath_translator.strip_pseudo_elements(selector)
+                )[0]
+
+            xpath = self.xpath_translator.selector_to_xpath(parsed)
+        except Exception:
+            xpath = None
 
-    def _selector_as_string(self, selector):
+        self.stylesheet.xpaths[selector] = xpath
+        return xpath
+
+    @classmethod
+    def _rel_to_abs(cls, css, base_url):
         """
-        Returns a selector as a CSS string
+        Returns CSS contents with absolute links
 
-        :param selector: A list of tinycss Tokens
-        :type selector: list
-        :returns: The CSS string for the selector
+        :param css: The CSS contents
+        :type css: str
+        :param base_url: The base page url to use for building absolute links
+        :type base_url: str
         :rtype: str
         """
-        return ",".join(
-            "".join(token.as_css() for token in strip_whitespace(token_list))
-            for token_list in split_on_comma(selector)
+        return cls.rel_to_abs_re.sub(
+            lambda match: "url('%s')"
+            % urljoin(base_url, match.group("path").strip("'\"")),
+            css,
         )
 
-    def _declarations_as_string(self, declarations):
+    def _build_css(self, rules):
+        """
+        Returns a CSS string for the given rules
+
+        :param rules: List of CSS backend rules
+        :type rules: list
+        :returns: CSS contents for the rules
+        :rtype: string
         """
-        Returns a list of declarations as a formatted CSS string
+        # Build and return the cleaned CSS contents
+        return "\n".join(self._rule_as_string(rule) for rule in rules)
 
-        :param declarations: The list of tinycss Declarations to format
-        :type declarations: list of tinycss.css21.Declaration
-        :returns: The CSS string for the declarations list
+    def _rule_as_string(self, rule):
+        """
+        Converts a rule to a formatted CSS string
+
+        :param rule: The rule to format
+        :type rule: CSS backend rule
+        :returns: The Rule as a CSS string
         :rtype: str
         """
-        return "".join(
-            "%s:%s%s;"
-            % (d.name, d.value.as_css(), " !" + d.priority if d.priority else "")
-            for d in declarations
-        )
+        return self.stylesheet.backend.rule_as_string(rule)
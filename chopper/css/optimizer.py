@@ -0,0 +1,190 @@
+import re
+
+
+class CSSOptimizer:
+    """
+    Optimizes the declarations of kept CSS rules
+
+    Only changes that can't alter the cascade are made: adjacent rules with
+    the same selectors are merged, earlier exact duplicates of a rule are
+    removed and, in a rule, declarations overridden by a later or !important
+    declaration of the same property are removed. Different values using
+    functions or vendor prefixes are kept as fallbacks. Rules nested in
+    at-rules are kept as is.
+    """
+
+    # Functions and vendor prefixed values, different declarations of the
+    # same property using them are kept as fallbacks for older browsers
+    fallback_value_re = re.compile(r"\(|(?:^|\s)-[a-z]+-", re.IGNORECASE)
+
+    # Vendor prefix of a property name
+    vendor_prefix_re = re.compile(r"^-[a-z]+-", re.IGNORECASE)
+
+    def __init__(self, properties=None, vendor_prefixes=None):
+        """
+        Inits the optimizer
+
+        :param properties: The properties to keep, without vendor prefixes,
+                           all properties when None. Custom properties are
+                           always kept
+        :type properties: iterable of str or None
+        :param vendor_prefixes: The vendor prefixes of properties to keep,
+                                like "-webkit-", all prefixes when None
+        :type vendor_prefixes: iterable of str or None
+        """
+        self.properties = None if properties is None else frozenset(properties)
+        self.vendor_prefixes = (
+            None if vendor_prefixes is None else frozenset(vendor_prefixes)
+        )
+
+    ##########
+    # Public #
+    ##########
+
+    def optimize(self, rules, backend):
+        """
+        Returns the optimized rules
+
+        :param rules: The CSS backend rules to optimize
+        :type rules: iterable
+        :param backend: The CSS backend of the rules
+        :type backend: chopper.css.backends.CSSBackend
+        :rtype: list
+        """
+        rules = list(self.iter_optimized(rules, backend))
+
+        # A later identical rule overrides everything the earlier one sets
+        seen = set()
+        optimized = []
+
+        for rule in reversed(rules):
+            if backend.is_style_rule(rule):
+                key = (
+                    tuple(backend.selectors(rule)),
+                    tuple(backend.declarations(rule)),
+                )
+
+                if key in seen:
+                    continue
+
+                seen.add(key)
+
+            optimized.append(rule)
+
+        optimized.reverse()
+        return optimized
+
+    def iter_optimized(self, rules, backend):
+        """
+        Yields optimized rules, holding a single rule at once. Earlier exact
+        duplicates of rules are not removed
+
+        :param rules: The CSS backend rules to optimize
+        :type rules: iterable
+        :param backend: The CSS backend of the rules
+        :type backend: chopper.css.backends.CSSBackend
+        :rtype: generator
+        """
+        pending = None
+
+        for rule in rules:
+            if not backend.is_style_rule(rule):
+                if pending is not None:
+                    yield from self._optimize_rule(pending, backend)
+                    pending = None
+
+                yield rule
+                continue
+
+            if pending is not None:
+                # Merge adjacent rules with the same selectors
+                if backend.selectors(pending) == backend.selectors(rule):
+                    pending = backend.with_declarations(
+                        pending,
+                        backend.declarations(pending) + backend.declarations(rule),
+                    )
+                    continue
+
+                yield from self._optimize_rule(pending, backend)
+
+            pending = rule
+
+        if pending is not None:
+            yield from self._optimize_rule(pending, backend)
+
+    ###########
+    # Private #
+    ###########
+
+    def _optimize_rule(self, rule, backend):
+        """
+        Yields the rule without overridden and filtered declarations,
+        nothing when no declaration is left
+        """
+        declarations = backend.declarations(rule)
+
+        # Properties with an !important declaration ignore other declarations
+        important = {
+            name.lower() for name, _, is_important in declarations if is_important
+        }
+
+        optimized = [
+            declaration
+            for index, declaration in enumerate(declarations, 1)
+            if self._is_allowed(declaration[0])
+            and (declaration[2] or declaration[0].lower() not in important)
+            and not self._is_overridden(declaration, declarations[index:])
+        ]
+
+        if not optimized:
+            return
+
+        if len(optimized) == len(declarations):
+            yield rule
+        else:
+            yield backend.with_declarations(rule, optimized)
+
+    def _is_overridden(self, declaration, following):
+        """
+        Returns whether a declaration is overridden by a following one
+        of the same property
+        """
+        name, value, important = declaration
+        name = name.lower()
+
+        for other_name, other_value, other_important in following:
+            if other_name.lower() != name or (important and not other_important):
+                continue
+
+            # Keep fallbacks for values older browsers may not support
+            if other_value != value and (
+                self.fallback_value_re.search(value)
+                or self.fallback_value_re.search(other_value)
+            ):
+                continue
+
+            return True
+
+        return False
+
+    def _is_allowed(self, name):
+        """
+        Returns whether a property is allowed or not
+        """
+        if name.startswith("--"):
+            return True
+
+        match = self.vendor_prefix_re.match(name)
+
+        if match is not None:
+            prefix = match.group()
+
+            if (
+                self.vendor_prefixes is not None
+                and prefix.lower() not in self.vendor_prefixes
+            ):
+                return False
+
+            name = name.replace(prefix, "", 1)
+
+        return self.properties is None or name.lower() in self.properties
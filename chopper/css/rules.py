@@ -9,3 +9,18 @@ class FontFaceRule:
         self.declarations = declarations
         self.line = line
         self.column = column
+
+
+class StyleRule:
+    """
+    Style rule with selectors: a, p { color: red; }
+    Declarations are (name, value, important) tuples
+    """
+
+    at_keyword = None
+
+    def __init__(self, selectors, declarations, line, column):
+        self.selectors = selectors
+        self.declarations = declarations
+        self.line = line
+        self.column = column
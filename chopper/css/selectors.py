@@ -0,0 +1,73 @@
+import re
+
+from lxml import etree
+
+from .translator import XpathTranslator
+
+
+class SelectorRule(str):
+    """
+    A keep or discard rule written as a CSS selector
+
+    The rule is the Xpath translation of the selector, so it is cached,
+    profiled and logged like any Xpath rule, and its expression is compiled
+    once and evaluated on every document. Plain id and class selectors only
+    compare id or class attributes rather than testing every element, class
+    attributes are only tokenized when they contain every class name.
+    """
+
+    translator = XpathTranslator()
+
+    # A single id or a few classes, with an optional tag name: div#main, .a.b
+    lookup_re = re.compile(
+        r"^\s*(?P<tag>[a-zA-Z][\w-]*)?"
+        r"(?:#(?P<id>-?[_a-zA-Z][\w-]*)|(?P<classes>(?:\.-?[_a-zA-Z][\w-]*)+))\s*$"
+    )
+
+    def __new__(cls, selector):
+        """
+        Translates and compiles the selector
+
+        :param selector: The CSS selector, or a selectors group
+        :type selector: str
+        :raises cssselect.SelectorError: If the selector can't be translated
+        """
+        rule = super().__new__(cls, cls.translator.css_to_xpath(selector))
+        rule.selector = selector
+        rule.lookup = cls._lookup_xpath(selector)
+        rule.select = etree.XPath(rule.lookup or rule)
+        return rule
+
+    def __reduce__(self):
+        # Compiled expressions can't be pickled, compile them again
+        return type(self), (self.selector,)
+
+    @classmethod
+    def _lookup_xpath(cls, selector):
+        """
+        Returns the Xpath expression walking id or class attributes only,
+        None if the selector isn't a plain id or class lookup
+        """
+        match = cls.lookup_re.match(selector)
+
+        if match is None:
+            return None
+
+        if match.group("id") is not None:
+            condition = ". = '%s'" % match.group("id")
+        else:
+            # Substring tests rule out most attributes before tokenizing them
+            names = match.group("classes")[1:].split(".")
+            condition = " and ".join(
+                ["contains(., '%s')" % name for name in names]
+                + [
+                    "contains(concat(' ', normalize-space(.), ' '), ' %s ')" % name
+                    for name in names
+                ]
+            )
+
+        return "descendant-or-self::*/@%s[%s]/parent::%s" % (
+            "id" if match.group("id") is not None else "class",
+            condition,
+            (match.group("tag") or "*").lower(),
+        )
@@ -0,0 +1,106 @@
+import re
+
+# Tokens changing the nesting state of a stylesheet
+token_re = re.compile(r"/\*|[\"'{}()\[\];\\]")
+
+# The end of a comment, or of a string started with a quote
+comment_end_re = re.compile(r"\*/")
+string_end_res = {
+    '"': re.compile(r'(?:[^"\\\n]|\\[\s\S])*(?:"|\n)'),
+    "'": re.compile(r"(?:[^'\\\n]|\\[\s\S])*(?:'|\n)"),
+}
+
+openings = frozenset("{([")
+closings = frozenset("})]")
+
+
+def iter_rules(css_contents, chunk_size=65536):
+    """
+    Yields the top-level rules of a stylesheet one at a time, as CSS strings
+
+    Only nesting is tokenized: strings, comments, escapes and blocks, so that
+    every rule can then be parsed on its own. File-like contents are read by
+    chunks and only the rule being tokenized is held in memory.
+
+    :param css_contents: The CSS contents, or a text file-like object
+    :type css_contents: str or io.TextIOBase
+    :param chunk_size: The number of characters read at once from files
+    :type chunk_size: int
+    :rtype: generator of str
+    """
+    if isinstance(css_contents, str):
+        buffer, read = css_contents, None
+    else:
+        buffer, read = "", css_contents.read
+
+    start = position = depth = 0
+
+    while True:
+        match = token_re.search(buffer, position)
+        end = None if match is None else _token_end(buffer, match, read is None)
+
+        if end is None:
+            # Tokens are incomplete, read more contents
+            chunk = read(chunk_size) if read is not None else ""
+
+            if not chunk:
+                break
+
+            # Drop the rules already yielded, a trailing "/" may start a comment
+            if match is not None:
+                position = match.start()
+            else:
+                position = max(position, len(buffer) - 1)
+
+            buffer, position, start = buffer[start:] + chunk, position - start, 0
+            continue
+
+        position = end
+        token = match.group()
+
+        if token in openings:
+            depth += 1
+        elif token in closings:
+            depth = max(depth - 1, 0)
+
+        # The end of a block or of a statement at-rule
+        if depth == 0 and token in ("}", ";"):
+            yield buffer[start:end]
+            start = end
+
+    # Rules left unfinished at the end of the stylesheet
+    if buffer[start:].strip():
+        yield buffer[start:]
+
+
+def _token_end(buffer, match, complete):
+    """
+    Returns the end of a token, None when it's not in the buffer yet
+
+    :param buffer: The CSS contents read
+    :type buffer: str
+    :param match: The match of the start of the token
+    :type match: re.Match
+    :param complete: Whether the buffer holds the whole contents or not
+    :type complete: bool
+    :rtype: int or None
+    """
+    token = match.group()
+
+    if token == "/*":
+        found = comment_end_re.search(buffer, match.end())
+        return found and found.end()
+
+    if token in string_end_res:
+        found = string_end_res[token].match(buffer, match.end())
+
+        # An unfinished string could be finished by the next chunk
+        if found and (complete or found.end() < len(buffer)):
+            return found.end()
+
+        return None
+
+    if token == "\\":
+        return match.end() + 1 if match.end() < len(buffer) else None
+
+    return match.end()
@@ -0,0 +1,22 @@
+class Stylesheet:
+    """
+    A parsed stylesheet that can be cleaned against several HTML trees
+
+    Selectors are translated to Xpath expressions at most once and the
+    translations, and selectors specificities used to inline styles, are
+    shared by every CSSExtractor using the stylesheet
+    """
+
+    def __init__(self, rules, backend):
+        """
+        Inits the stylesheet
+
+        :param rules: The parsed CSS rules
+        :type rules: list
+        :param backend: The CSS backend that parsed the rules
+        :type backend: chopper.css.backends.CSSBackend
+        """
+        self.rules = rules
+        self.backend = backend
+        self.xpaths = {}
+        self.specificities = {}
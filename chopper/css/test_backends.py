@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from ..extractor import Extractor, MultiExtractor
+from ..test_extractor import TEST_CSS, TEST_HTML
+from .backends import CSSBackend, Tinycss2Backend, TinycssBackend, get_backend
+from .extractor import CSSExtractor
+
+
+class CSSBackendsTestCase(TestCase):
+    def format_output(self, output):
+        return "".join(line.strip() for line in output.splitlines())
+
+    def test_get_backend(self):
+        """
+        Tests backends are resolved by name and shared
+        """
+        self.assertIsInstance(get_backend(), TinycssBackend)
+        self.assertIs(get_backend("tinycss2"), get_backend("tinycss2"))
+
+        backend = Tinycss2Backend()
+        self.assertIs(get_backend(backend), backend)
+
+        with self.assertRaises(KeyError):
+            get_backend("nope")
+
+        with self.assertRaises(NotImplementedError):
+            CSSBackend().parse_stylesheet("")
+
+    def test_backends_same_results(self):
+        """
+        Tests both backends clean CSS the same way
+        """
+        extractor = Extractor.keep("//strong")
+
+        self.assertEqual(
+            extractor.extract(TEST_HTML, TEST_CSS),
+            Extractor(css_backend="tinycss2")
+            .keep("//strong")
+            .extract(TEST_HTML, TEST_CSS),
+        )
+
+    def test_tinycss2_at_rules(self):
+        """
+        Tests modern at-rules are kept by the tinycss2 backend
+        """
+        input_css = """
+        @import 'test.css' screen;
+        @charset "utf-8";
+        @foo bar;
+        @supports (display: grid) { div { display: grid; } }
+        @layer base { p { margin: 0; } }
+        @layer base, theme;
+        @container sidebar (min-width: 400px) { a { color: red; } }
+        @media print { footer { display: none; } }
+        @font-face { font-family: 'test'; src: url(font.woff); }
+        @page :first { margin: 1in; }
+        @keyframes spin { from { opacity: 0 } to { opacity: 1 } }
+        a, section, :is(em, section) { color: blue !important; }
+        """
+        _, css = (
+            Extractor(css_backend="tinycss2")
+            .keep('//div[@id="main"]')
+            .extract(TEST_HTML, input_css, base_url="http://test.com/dir/")
+        )
+
+        expected_css = (
+            """@import url('http://test.com/dir/test.css') screen;"""
+            """@supports (display: grid){div{display:grid;}}"""
+            """@layer base{p{margin:0;}}"""
+            """@layer base, theme;"""
+            """@container sidebar (min-width: 400px){a{color:red;}}"""
+            """@media print{footer{display:none;}}"""
+            """@font-face{font-family:"test";src:url('http://test.com/dir/font.woff');}"""
+            """@page :first{margin:1in;}"""
+            """@keyframes spin{from { opacity: 0 } to { opacity: 1 }}"""
+            """a,:is(em, section){color:blue !important;}"""
+        )
+        self.assertEqual(self.format_output(css), expected_css)
+
+    def test_declarations(self):
+        """
+        Tests backends expose declarations the same way
+        """
+        for name in ("tinycss", "tinycss2"):
+            stylesheet = CSSExtractor.compile(
+                "a { color: red !important; margin: 0 1px }", name
+            )
+            self.assertEqual(
+                stylesheet.backend.declarations(stylesheet.rules[0]),
+                [("color", "red", True), ("margin", "0 1px", False)],
+            )
+
+    def test_multi_extractor_backend(self):
+        """
+        Tests the multi extractor parses CSS with its backend
+        """
+        results = MultiExtractor(
+            [Extractor.keep("//footer")], css_backend="tinycss2"
+        ).extract(TEST_HTML, "@supports (x: y) { a { b: c } } footer { color: blue; }")
+        self.assertEqual(
+            results[0][1], "@supports (x: y){a{b:c;}}\nfooter{color:blue;}"
+        )
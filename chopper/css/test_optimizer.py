@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from io import BytesIO
+from unittest import TestCase
+
+from ..extractor import Extractor, MultiExtractor
+from .optimizer import CSSOptimizer
+
+TEST_HTML = """<html><body><div class="a"><p class="b">Text</p></div></body></html>"""
+
+
+class CSSOptimizerTestCase(TestCase):
+    def optimize(self, css, optimizer=None, **kwargs):
+        extractor = Extractor(css_optimizer=optimizer or CSSOptimizer(), **kwargs)
+        return extractor.keep("//p").extract(TEST_HTML, css)[1]
+
+    def test_overridden_declarations(self):
+        """
+        Tests declarations overridden in a rule are removed
+        """
+        css = (
+            "p { color: red; margin: 0; color: blue !important; color: green; }"
+            ".a { width: 10px; width: calc(100% - 10px); width: 10px; }"
+            "div { display: -webkit-box; display: flex; display: flex; }"
+            ".b { display: block; display: grid; }"
+        )
+        self.assertEqual(
+            self.optimize(css),
+            "p{margin:0;color:blue !important;}\n"
+            ".a{width:calc(100% - 10px);width:10px;}\n"
+            "div{display:-webkit-box;display:flex;}\n"
+            ".b{display:grid;}",
+        )
+
+    def test_merge_rules(self):
+        """
+        Tests adjacent rules with the same selectors are merged and earlier
+        exact duplicates are removed
+        """
+        css = (
+            "p, .a { color: red; } p, .a { margin: 0; color: blue; }"
+            ".b { color: red; } div { color: blue; } .b { color: red; }"
+            "p, .a { color: green; } @media print { p { color: red; } }"
+            "p, .a { color: black; }"
+        )
+        self.assertEqual(
+            self.optimize(css),
+            "p,.a{margin:0;color:blue;}\n"
+            "div{color:blue;}\n"
+            ".b{color:red;}\n"
+            "p,.a{color:green;}\n"
+            "@media print{p{color:red;}}\n"
+            "p,.a{color:black;}",
+        )
+
+    def test_allowlist(self):
+        """
+        Tests properties and vendor prefixes allowlists
+        """
+        css = (
+            "p { -webkit-transition: none; -moz-transition: none; transition: none;"
+            " color: red; --main: red; -o-foo: bar; }"
+            "div { margin: 0; }"
+        )
+        optimizer = CSSOptimizer(
+            properties=["transition", "color"], vendor_prefixes=["-webkit-"]
+        )
+        self.assertEqual(
+            self.optimize(css, optimizer, css_backend="tinycss2"),
+            "p{-webkit-transition:none;transition:none;color:red;--main:red;}",
+        )
+
+    def test_backends_and_stream(self):
+        """
+        Tests optimized CSS is the same with both backends and when streamed
+        """
+        css = "p { color: red; } p { color: blue; } .a { margin: 0; margin: 1px; }"
+        expected = "p{color:blue;}\n.a{margin:1px;}"
+
+        for backend in ("tinycss", "tinycss2"):
+            self.assertEqual(self.optimize(css, css_backend=backend), expected)
+
+        sink = BytesIO()
+        extractor = Extractor(css_optimizer=CSSOptimizer()).keep("//p")
+        extractor.extract(TEST_HTML, css, css_sink=sink)
+        self.assertEqual(sink.getvalue().decode("utf-8"), expected)
+
+    def test_multi_extractor(self):
+        """
+        Tests CSS results are not shared between different optimizers
+        """
+        css = "p { color: red; color: blue; }"
+        results = MultiExtractor(
+            [Extractor.keep("//p"), Extractor(css_optimizer=CSSOptimizer()).keep("//p")]
+        ).extract(TEST_HTML, css)
+
+        self.assertEqual(results[0][1], "p{color:red;color:blue;}")
+        self.assertEqual(results[1][1], "p{color:blue;}")
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import pickle
+from unittest import TestCase
+
+from cssselect import SelectorSyntaxError
+from lxml import html
+
+from .selectors import SelectorRule
+
+TEST_HTML = """
+<html><body>
+    <div id="main" class=" a  b	c">
+        <p class="a">A</p>
+        <p id="main" class="b-c">B</p>
+    </div>
+    <span class="A a-b">C</span>
+</body></html>
+"""
+
+
+class SelectorRuleTestCase(TestCase):
+    def test_lookups(self):
+        """
+        Tests plain id and class lookups match like their Xpath translation
+        """
+        tree = html.fromstring(TEST_HTML)
+
+        for selector in (
+            "#main",
+            "p#main",
+            ".a",
+            ".a.c",
+            "DIV.a.b",
+            ".A",
+            ".b",
+            ".c.b",
+            "span.a-b.A",
+            ".b.c-",
+        ):
+            rule = SelectorRule(selector)
+            self.assertIsNotNone(rule.lookup)
+            self.assertEqual(rule.select(tree), tree.xpath(rule))
+
+        for selector in ("p", "div > p", "#main, .a", "p.a:first-child", "[id]"):
+            rule = SelectorRule(selector)
+            self.assertIsNone(rule.lookup)
+            self.assertEqual(rule.select(tree), tree.xpath(rule))
+
+    def test_translation(self):
+        """
+        Tests rules are Xpath translations, invalid selectors are rejected
+        """
+        rule = SelectorRule("p.a")
+        self.assertEqual(rule, SelectorRule.translator.css_to_xpath("p.a"))
+        self.assertEqual(rule.selector, "p.a")
+
+        self.assertRaises(SelectorSyntaxError, SelectorRule, "p..a")
+
+        loaded = pickle.loads(pickle.dumps(rule))
+        self.assertEqual((loaded, loaded.selector), (rule, rule.selector))
+        self.assertEqual(len(loaded.select(html.fromstring(TEST_HTML))), 1)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from io import BytesIO, StringIO
+from unittest import TestCase
+
+from ..extractor import Extractor
+from ..limits import Limits
+from ..test_extractor import TEST_CSS, TEST_HTML
+from .extractor import CSSExtractor
+from .stream import iter_rules
+
+STREAM_CSS = """@charset "utf-8";
+/* a { } */ a { background: url(data:image/png;base64,AA==) }
+@media print { p { content: "}" } }
+@import 'x;y.css';
+q[title='a}b'] { x: \\} }
+/* end */"""
+
+
+class StreamTestCase(TestCase):
+    def test_iter_rules(self):
+        """
+        Tests rules are split on top-level blocks and statements only
+        """
+        self.assertEqual(
+            [rule.strip() for rule in iter_rules(STREAM_CSS)],
+            [
+                '@charset "utf-8";',
+                "/* a { } */ a { background: url(data:image/png;base64,AA==) }",
+                '@media print { p { content: "}" } }',
+                "@import 'x;y.css';",
+                "q[title='a}b'] { x: \\} }",
+                "/* end */",
+            ],
+        )
+
+    def test_iter_rules_file(self):
+        """
+        Tests files are split the same way whatever the chunks size
+        """
+        expected = list(iter_rules(STREAM_CSS))
+
+        for chunk_size in range(1, len(STREAM_CSS) + 1):
+            self.assertEqual(
+                list(iter_rules(StringIO(STREAM_CSS), chunk_size)), expected
+            )
+
+    def test_extract_css_sink(self):
+        """
+        Tests streamed CSS is the same as extracted CSS
+        """
+        for backend in ("tinycss", "tinycss2"):
+            extractor = Extractor(css_backend=backend).keep('//div[@id="main"]')
+            expected_html, expected_css = extractor.extract(
+                TEST_HTML, TEST_CSS, base_url="http://test.com/"
+            )
+
+            for css in (
+                TEST_CSS,
+                StringIO(TEST_CSS),
+                CSSExtractor.compile(TEST_CSS, backend),
+            ):
+                sink = BytesIO()
+                html, cleaned_css = extractor.extract(
+                    TEST_HTML, css, base_url="http://test.com/", css_sink=sink
+                )
+
+                self.assertEqual(html, expected_html)
+                self.assertIsNone(cleaned_css)
+                self.assertEqual(sink.getvalue().decode("utf-8"), expected_css)
+
+    def test_extract_css_sink_late_rules(self):
+        """
+        Tests @import and @charset rules following other rules are streamed
+        as the whole stylesheet parser handles them
+        """
+        html = "<html><body><div><p>A</p></div></body></html>"
+
+        for backend in ("tinycss", "tinycss2"):
+            extractor = Extractor(css_backend=backend).keep("//div")
+
+            for css in (
+                "@import url(a.css);\np { color: red; }\n@import url(b.css);",
+                "@font-face { font-family: x; }\n@import 'b.css';\np { margin: 0; }",
+                "@media print { p { color: red; } }\n@import url(a.css);",
+                "@import url(a.css);\n@charset 'utf-8';\n@import url(b.css);",
+                "p { color: red; }\n@charset 'utf-8';\np { margin: 0; }",
+            ):
+                sink = BytesIO()
+                extractor.extract(html, css, css_sink=sink)
+
+                self.assertEqual(
+                    sink.getvalue().decode("utf-8"), extractor.extract(html, css)[1]
+                )
+
+    def test_extract_css_sink_no_match(self):
+        """
+        Tests nothing is written when the HTML has no match
+        """
+        sink = BytesIO()
+        result = Extractor.keep("//nothing").extract(TEST_HTML, TEST_CSS, css_sink=sink)
+
+        self.assertEqual(result, (None, None))
+        self.assertEqual(sink.getvalue(), b"")
+
+    def test_extract_css_sink_degrade(self):
+        """
+        Tests too large CSS contents are streamed as is when degrading
+        """
+        sink = BytesIO()
+        extractor = Extractor(limits=Limits(max_bytes=600, degrade=True))
+        extractor.keep("//footer").extract(TEST_HTML, TEST_CSS * 3, css_sink=sink)
+
+        self.assertEqual(sink.getvalue().decode("utf-8"), TEST_CSS * 3)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from ..extractor import Extractor
+from ..profiler import Profiler
+
+TEST_HTML = """
+<html><body>
+    <ul class="icons">
+        <li><a class="btn" href="#">A</a></li>
+        <li><input type="text" placeholder="B"></li>
+    </ul>
+</body></html>
+"""
+
+
+class XpathTranslatorTestCase(TestCase):
+    def extract_css(self, css):
+        return Extractor.keep("//ul").extract(TEST_HTML, css)[1].split("\n")
+
+    def test_pseudo_elements(self):
+        """
+        Tests selectors with pseudo-elements are matched without them
+        """
+        css = (
+            "a.btn::before { content: 'a'; }"
+            "a.nope::before { content: 'b'; }"
+            "li:nth-of-type(2n)::after { content: 'c'; }"
+            "li:nth-of-type(3n)::after { content: 'd'; }"
+            "input::placeholder { color: red; }"
+            "textarea::placeholder { color: red; }"
+            "a::before:hover { color: red; }"
+            "b::-webkit-scrollbar-thumb:hover { color: red; }"
+            "ul > ::after { color: red; }"
+        )
+        self.assertEqual(
+            self.extract_css(css),
+            [
+                "a.btn::before{content:'a';}",
+                "li:nth-of-type(2n)::after{content:'c';}",
+                "input::placeholder{color:red;}",
+                "a::before:hover{color:red;}",
+                "ul > ::after{color:red;}",
+            ],
+        )
+
+    def test_dynamic_pseudo_classes(self):
+        """
+        Tests dynamic and unknown pseudo-classes don't filter elements,
+        even when negated
+        """
+        css = (
+            "a:focus-visible { color: red; }"
+            "b:focus-visible { color: red; }"
+            "input:-webkit-autofill { color: red; }"
+            "a:not(:hover) { color: red; }"
+            "b:not(:hover) { color: red; }"
+            "input:not(:placeholder-shown) { color: red; }"
+            "a:is(:hover, .other) { color: red; }"
+            "a:dir(ltr) { color: red; }"
+            "a:not(.btn) { color: red; }"
+            "li:not(:first-child) { color: red; }"
+        )
+        self.assertEqual(
+            self.extract_css(css),
+            [
+                "a:focus-visible{color:red;}",
+                "input:-webkit-autofill{color:red;}",
+                "a:not(:hover){color:red;}",
+                "input:not(:placeholder-shown){color:red;}",
+                "a:is(:hover, .other){color:red;}",
+                "a:dir(ltr){color:red;}",
+                "li:not(:first-child){color:red;}",
+            ],
+        )
+
+    def test_no_assumed_matches(self):
+        """
+        Tests pseudo-elements and dynamic pseudo-classes are translated
+        """
+        extractor = Extractor.keep("//ul")
+        translator = extractor.css_extractor.xpath_translator
+        self.assertEqual(translator.strip_pseudo_elements("a::before:hover"), "a")
+        self.assertEqual(translator.strip_pseudo_elements("a > ::part(x)"), "a >*")
+
+        selectors = ["a::before:hover", "b:focus-within", "b:not(:hover)::after"]
+        stylesheet = extractor.css_extractor.compile(
+            "%s { color: red; }" % ", ".join(selectors)
+        )
+        profiler = Profiler()
+        extractor.profiler = profiler
+        extractor.extract(TEST_HTML, stylesheet)
+
+        self.assertTrue(all(stylesheet.xpaths[s] is not None for s in selectors))
+        self.assertEqual(
+            {
+                row["expression"]: row["matches"]
+                for row in profiler.report(kind="selector")
+            },
+            {"a::before:hover": 1, "b:focus-within": 0, "b:not(:hover)::after": 0},
+        )
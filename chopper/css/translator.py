@@ -1,11 +1,64 @@
+import re
+
 from cssselect import HTMLTranslator
+from cssselect.parser import Function, Pseudo
 
 
 class XpathTranslator(HTMLTranslator):
     """
     Custom xpath translator
+
+    Pseudo-elements are ignored and pseudo-classes depending on a dynamic
+    state (user actions, form validity, browser features, vendor specific
+    ones...) don't filter matched elements, even when negated
     """
 
+    # Pseudo-classes only depending on the document structure
+    structural_pseudos = frozenset(
+        (
+            "first-child",
+            "last-child",
+            "first-of-type",
+            "last-of-type",
+            "only-child",
+            "only-of-type",
+            "empty",
+            "root",
+            "scope",
+        )
+    )
+
+    # Functional pseudo-classes translated by cssselect
+    static_functions = frozenset(
+        (
+            "nth-child",
+            "nth-last-child",
+            "nth-of-type",
+            "nth-last-of-type",
+            "contains",
+            "lang",
+        )
+    )
+
+    # Pseudo-elements, with the dynamic pseudo-classes that can follow them
+    pseudo_element_re = re.compile(r"::[-\w]+(?:\([^)]*\))?(?::[-\w]+(?:\([^)]*\))?)*")
+
+    def strip_pseudo_elements(self, selector):
+        """
+        Returns a selector without its pseudo-elements
+
+        :param selector: The CSS selector
+        :type selector: str
+        :rtype: str
+        """
+        selector = self.pseudo_element_re.sub("", selector).strip()
+
+        # Selectors ending with a combinator apply to any element
+        if not selector or selector[-1] in ">+~":
+            selector += "*"
+
+        return selector
+
     def pseudo_matches_if_exists(self, xpath):
         """
         Returns the default xpath
@@ -21,3 +74,81 @@ class XpathTranslator(HTMLTranslator):
     xpath_enabled_pseudo = pseudo_matches_if_exists
     xpath_disabled_pseudo = pseudo_matches_if_exists
     xpath_checked_pseudo = pseudo_matches_if_exists
+
+    def xpath_pseudo(self, pseudo):
+        """
+        Unknown pseudo-classes don't filter matched elements
+        """
+        if pseudo.ident.lower() in self.structural_pseudos:
+            return super().xpath_pseudo(pseudo)
+
+        return self.xpath(pseudo.selector)
+
+    def xpath_function(self, function):
+        """
+        Unknown functional pseudo-classes don't filter matched elements
+        """
+        if function.name.lower() in self.static_functions:
+            return super().xpath_function(function)
+
+        return self.xpath(function.selector)
+
+    def xpath_negation(self, negation):
+        """
+        Negated dynamic pseudo-classes don't filter matched elements
+        """
+        if self.is_dynamic(negation.subselector):
+            return self.xpath(negation.selector)
+
+        return super().xpath_negation(negation)
+
+    def xpath_matching(self, matching):
+        """
+        :is() with a dynamic selector doesn't filter matched elements
+        """
+        if any(self.is_dynamic(s) for s in matching.selector_list):
+            return self.xpath(matching.selector)
+
+        return super().xpath_matching(matching)
+
+    def xpath_specificityadjustment(self, matching):
+        """
+        :where() with a dynamic selector doesn't filter matched elements
+        """
+        if any(self.is_dynamic(s) for s in matching.selector_list):
+            return self.xpath(matching.selector)
+
+        return super().xpath_specificityadjustment(matching)
+
+    def is_dynamic(self, tree):
+        """
+        Returns whether a parsed selector uses dynamic pseudo-classes,
+        which don't filter matched elements
+
+        :param tree: The parsed selector, or one of its nodes
+        :type tree: cssselect.parser.Selector
+        :rtype: bool
+        """
+        nodes = [tree]
+
+        while nodes:
+            node = nodes.pop()
+            node = getattr(node, "parsed_tree", node)
+
+            if isinstance(node, Pseudo):
+                if node.ident.lower() not in self.structural_pseudos:
+                    return True
+
+            elif isinstance(node, Function):
+                if node.name.lower() not in self.static_functions:
+                    return True
+
+            for name in ("selector", "subselector"):
+                child = getattr(node, name, None)
+
+                if child is not None:
+                    nodes.append(child)
+
+            nodes.extend(getattr(node, "selector_list", ()))
+
+        return False
@@ -0,0 +1,40 @@
+class ChopperError(Exception):
+    """
+    Base class for chopper errors
+    """
+
+
+class LimitExceeded(ChopperError):
+    """
+    A document exceeded one of the configured resource limits
+    """
+
+
+class DocumentTooLarge(LimitExceeded):
+    """
+    The HTML or CSS contents are larger than the maximum size
+    """
+
+
+class TooManyNodes(LimitExceeded):
+    """
+    The HTML tree has more elements than the maximum nodes count
+    """
+
+
+class TreeTooDeep(LimitExceeded):
+    """
+    The HTML tree is deeper than the maximum depth
+    """
+
+
+class DeadlineExceeded(LimitExceeded):
+    """
+    The document processing took longer than its time budget
+    """
+
+
+class BundleError(ChopperError):
+    """
+    A bundle file is not a chopper bundle or was saved by another version
+    """
@@ -1,21 +1,108 @@
 # -*- coding:utf-8 -*-
-from .css.extractor import CSSExtractor
+from copy import deepcopy
+from importlib import import_module
+
+from .exceptions import DocumentTooLarge
 from .html.extractor import HTMLExtractor
+from .limits import Limits
+from .mixins import ProfilerMixin
+from .threads import get_executor
+
+
+class LazyImport:
+    """
+    Class attribute importing its value on first access, documents without
+    CSS contents never import the CSS parsers and selectors translator
+    """
+
+    def __init__(self, module, name):
+        """
+        Inits the lazy import
+
+        :param module: The module to import, relative to the chopper package
+        :type module: str
+        :param name: The name of the attribute to get from the module
+        :type name: str
+        """
+        self.module = module
+        self.name = name
 
+    def __get__(self, instance, owner=None):
+        return getattr(import_module(self.module, __package__), self.name)
 
-class Extractor:
+
+class Extractor(ProfilerMixin):
     """
     Extracts HTML contents given a list of xpaths
     by preserving ancestors
     """
 
     html_extractor = HTMLExtractor
-    css_extractor = CSSExtractor
+    css_extractor = LazyImport(".css.extractor", "CSSExtractor")
+    selector_rule = LazyImport(".css.selectors", "SelectorRule")
+
+    def __init__(
+        self,
+        template_cache=None,
+        limits=None,
+        profiler=None,
+        parser_options=None,
+        css_backend=None,
+        minifier=None,
+        css_optimizer=None,
+        metrics=None,
+        slow_log=None,
+        parallel_css=False,
+        css_workers=None,
+    ):
+        """
+        Inits the extractor
+
+        :param template_cache: An optional cache of matches by page template
+        :type template_cache: chopper.cache.TemplateCache or None
+        :param limits: Optional resource limits applied to every document
+        :type limits: chopper.limits.Limits or None
+        :param profiler: An optional profiler recording rules and stages costs
+        :type profiler: chopper.profiler.Profiler or None
+        :param parser_options: An optional HTML parser configuration
+        :type parser_options: chopper.html.parser.HTMLParserOptions or None
+        :param css_backend: The CSS backend, or its name, used to parse CSS contents
+        :type css_backend: str or chopper.css.backends.CSSBackend or None
+        :param minifier: An optional minifier applied to cleaned HTML contents
+        :type minifier: chopper.html.minifier.HTMLMinifier or None
+        :param css_optimizer: An optional optimizer of cleaned CSS rules
+        :type css_optimizer: chopper.css.optimizer.CSSOptimizer or None
+        :param metrics: Optional metrics updated with every document
+        :type metrics: chopper.metrics.Metrics or None
+        :param slow_log: An optional log of documents extracted too slowly
+        :type slow_log: chopper.slowlog.SlowLog or None
+        :param parallel_css: Parse CSS contents on a helper thread while the
+                             HTML contents are cleaned
+        :type parallel_css: bool
+        :param css_workers: The number of threads matching selectors of large
+                            stylesheets against a single tree, one when None
+        :type css_workers: int or None
+        """
+        self.template_cache = template_cache
+        self.limits = limits or Limits()
+        self.profiler = profiler
+        self.parser_options = parser_options
+        self.css_backend = css_backend
+        self.minifier = minifier
+        self.css_optimizer = css_optimizer
+        self.metrics = metrics
+        self.slow_log = slow_log
+        self.parallel_css = parallel_css
+        self.css_workers = css_workers
+
+        if metrics is not None and template_cache is not None:
+            metrics.track_template_cache(template_cache)
 
-    def __init__(self):
         # Expose public methods
         self.keep = self._keep
         self.discard = self._discard
+        self.keep_css = self._keep_css
+        self.discard_css = self._discard_css
 
         # Keep Xpaths expressions
         self._xpaths_to_keep = []
@@ -53,58 +140,514 @@ class Extractor:
         """
         return cls().discard(xpath)
 
-    def extract(self, html_contents, css_contents=None, base_url=None):
+    @classmethod
+    def keep_css(cls, selector):
+        """
+        Creates an instance of Extractor and adds a keep CSS selector
+
+        :param selector: The CSS selector to keep
+        :type selector: str
+
+        :retuns: A new instance of Extractor
+        :rtype: Extractor
+        """
+        return cls().keep_css(selector)
+
+    @classmethod
+    def discard_css(cls, selector):
+        """
+        Creates an instance of Extractor and adds a discard CSS selector
+
+        :param selector: The CSS selector to discard
+        :type selector: str
+
+        :retuns: A new instance of Extractor
+        :rtype: Extractor
+        """
+        return cls().discard_css(selector)
+
+    def extract(
+        self,
+        html_contents,
+        css_contents=None,
+        base_url=None,
+        html_sink=None,
+        css_sink=None,
+    ):
         """
         Extracts the cleaned html tree as a string and only
         css rules matching the cleaned html tree
 
+        :param html_contents: The HTML contents to parse, an already built tree
+                              is cleaned in place
+        :type html_contents: str or lxml.html.HtmlElement
+        :param css_contents: The CSS contents to parse or an already parsed
+                             stylesheet, or a text file when streamed to a sink
+        :type css_contents: str or Stylesheet or io.TextIOBase
+        :param base_url: The base page URL to use for relative to absolute links
+        :type base_url: str
+        :param html_sink: A binary file-like object the cleaned HTML contents are
+                          written to incrementally, None is returned instead of them
+        :type html_sink: io.BufferedIOBase or None
+        :param css_sink: A binary file-like object the cleaned CSS contents are
+                         streamed to rule by rule, None is returned instead of them
+        :type css_sink: io.BufferedIOBase or None
+
+        :returns: cleaned HTML contents, cleaned CSS contents
+        :rtype: str or tuple
+        """
+        return self._extract(
+            html_contents,
+            css_contents,
+            base_url,
+            html_sink=html_sink,
+            css_sink=css_sink,
+        )
+
+    def sanitize(
+        self,
+        html_contents,
+        css_contents=None,
+        base_url=None,
+        html_sink=None,
+        css_sink=None,
+    ):
+        """
+        Removes elements matching discard Xpath expressions, keeps the rest
+        of the document and only css rules matching the cleaned html tree.
+        Keep Xpath expressions are not used
+
         :param html_contents: The HTML contents to parse
-        :type html_contents: str
-        :param css_contents: The CSS contents to parse
-        :type css_contents: str
+        :type html_contents: str or lxml.html.HtmlElement
+        :param css_contents: The CSS contents to parse or an already parsed stylesheet
+        :type css_contents: str or Stylesheet
         :param base_url: The base page URL to use for relative to absolute links
         :type base_url: str
+        :param html_sink: A binary file-like object to write cleaned HTML contents to
+        :type html_sink: io.BufferedIOBase or None
+        :param css_sink: A binary file-like object to stream cleaned CSS contents to
+        :type css_sink: io.BufferedIOBase or None
 
         :returns: cleaned HTML contents, cleaned CSS contents
         :rtype: str or tuple
         """
-        # Clean HTML
-        html_extractor = self.html_extractor(
-            html_contents, self._xpaths_to_keep, self._xpaths_to_discard
+        return self._extract(
+            html_contents,
+            css_contents,
+            base_url,
+            sanitize=True,
+            html_sink=html_sink,
+            css_sink=css_sink,
         )
-        has_matches = html_extractor.parse()
 
-        if has_matches:
-            # Relative to absolute URLs
-            if base_url is not None:
+    def extract_fragments(self, html_contents, base_url=None):
+        """
+        Extracts every top-most keep match as its own HTML fragment,
+        in document order, without preserving ancestors
+
+        :param html_contents: The HTML contents to parse
+        :type html_contents: str
+        :param base_url: The base page URL to use for relative to absolute links
+        :type base_url: str
+
+        :returns: cleaned HTML fragments
+        :rtype: list of str
+        """
+        html_extractor = self._get_html_extractor(html_contents)
+
+        if not html_extractor.parse_fragments():
+            self._record_document("fragments", html_contents)
+            return []
+
+        # Relative to absolute URLs
+        if base_url is not None:
+            html_extractor.rel_to_abs(base_url)
+
+        if self.minifier is not None:
+            html_extractor.minify()
+
+        fragments = html_extractor.fragments_to_string()
+        self._record_document("fragments", html_contents, None, fragments)
+
+        return fragments
+
+    def extract_inline(self, html_contents, css_contents, base_url=None):
+        """
+        Extracts the cleaned html tree as a string, with css rules matching
+        the cleaned html tree applied as inline styles
+
+        :param html_contents: The HTML contents to parse
+        :type html_contents: str or lxml.html.HtmlElement
+        :param css_contents: The CSS contents to parse or an already parsed stylesheet
+        :type css_contents: str or Stylesheet
+        :param base_url: The base page URL to use for relative to absolute links
+        :type base_url: str
+
+        :returns: cleaned HTML contents with inline styles
+        :rtype: str
+        """
+        deadline = self.limits.start()
+
+        # Clean HTML
+        html_extractor = self._get_html_extractor(html_contents)
+
+        with self._stage("html.clean"):
+            has_matches = html_extractor.parse()
+
+        deadline.check("html")
+
+        if not has_matches:
+            self._record_document("inline", html_contents, css_contents)
+            return None
+
+        # Relative to absolute URLs
+        if base_url is not None:
+            with self._stage("html.rel_to_abs"):
                 html_extractor.rel_to_abs(base_url)
 
-            # Convert ElementTree to string
+        # Match CSS against the cleaned tree and inline matched declarations
+        css_extractor = self._get_css_extractor(
+            css_contents, html_extractor.tree, deadline
+        )
+
+        with self._stage("css.inline"):
+            css_extractor.inline(base_url)
+
+        if self.minifier is not None:
+            with self._stage("html.minify"):
+                html_extractor.minify()
+
+        with self._stage("html.serialize"):
             cleaned_html = html_extractor.to_string()
 
-        else:
-            cleaned_html = None
+        self._record_document("inline", html_contents, css_contents, cleaned_html)
 
-        # Clean CSS
-        if css_contents is not None:
-            if cleaned_html is not None:
-                css_extractor = self.css_extractor(css_contents, cleaned_html)
-                css_extractor.parse()
+        return cleaned_html
 
-                # Relative to absolute URLs
-                if base_url is not None:
-                    css_extractor.rel_to_abs(base_url)
+    ###########
+    # Private #
+    ###########
 
-                cleaned_css = css_extractor.to_string()
+    def _extract(
+        self,
+        html_contents,
+        css_contents,
+        base_url,
+        css_results=None,
+        sanitize=False,
+        html_sink=None,
+        css_sink=None,
+    ):
+        """
+        Extracts the cleaned HTML and CSS contents, watched by the slow log
+
+        :param css_results: Cleaned CSS contents already computed,
+                            by cleaned HTML contents and CSS optimizer
+        :type css_results: dict or None
+        :param sanitize: Only remove elements to discard
+        :type sanitize: bool
+        :param html_sink: The binary file-like object to write cleaned HTML to
+        :type html_sink: io.BufferedIOBase or None
+        :param css_sink: The binary file-like object to stream cleaned CSS to
+        :type css_sink: io.BufferedIOBase or None
 
-            else:
-                cleaned_css = None
+        :returns: cleaned HTML contents, cleaned CSS contents
+        :rtype: str or tuple
+        """
+        if self.slow_log is None:
+            return self._extract_document(
+                html_contents,
+                css_contents,
+                base_url,
+                css_results,
+                sanitize,
+                html_sink,
+                css_sink,
+            )
+
+        mode = "sanitize" if sanitize else "extract"
+
+        with self.slow_log.watch(
+            self, mode, html_contents, css_contents, base_url
+        ) as document:
+            return document._extract_document(
+                html_contents,
+                css_contents,
+                base_url,
+                css_results,
+                sanitize,
+                html_sink,
+                css_sink,
+            )
+
+    def _extract_document(
+        self,
+        html_contents,
+        css_contents,
+        base_url,
+        css_results=None,
+        sanitize=False,
+        html_sink=None,
+        css_sink=None,
+    ):
+        """
+        Extracts the cleaned HTML and CSS contents, see _extract
+        """
+        deadline = self.limits.start()
 
-        else:
+        # The stylesheet doesn't depend on the HTML, parse it meanwhile
+        stylesheet = self._compile_css_async(css_contents, css_sink)
+
+        # Clean HTML
+        html_extractor, cleaned_html = self._extract_html(
+            html_contents, base_url, deadline, sanitize, html_sink
+        )
+
+        mode = "sanitize" if sanitize else "extract"
+
+        if css_contents is None:
+            self._record_document(mode, html_contents, None, cleaned_html)
             return cleaned_html
 
+        # Clean CSS, identical trees, optimizers and limits give identical results
+        css_key = (cleaned_html, self.css_optimizer, self.limits._key)
+
+        if html_extractor is None:
+            cleaned_css = None
+
+            if stylesheet is not None:
+                stylesheet.cancel()
+
+        elif css_sink is not None:
+            cleaned_css = None
+            css_extractor = self._get_css_extractor(
+                css_contents, html_extractor.tree, deadline
+            )
+
+            with self._stage("css.stream"):
+                css_extractor.stream(css_sink, base_url)
+
+        elif css_results is not None and css_key in css_results:
+            # The same HTML was already cleaned against this stylesheet
+            cleaned_css = css_results[css_key]
+
+        else:
+            if stylesheet is not None:
+                with self._stage("css.wait"):
+                    stylesheet = stylesheet.result()
+
+            cleaned_css = self._extract_css(
+                stylesheet or css_contents, html_extractor.tree, base_url, deadline
+            )
+
+            if css_results is not None and cleaned_html is not None:
+                css_results[css_key] = cleaned_css
+
+        self._record_document(
+            mode, html_contents, css_contents, cleaned_html, cleaned_css
+        )
+
         return (cleaned_html, cleaned_css)
 
+    def _compile_css_async(self, css_contents, css_sink=None):
+        """
+        Starts parsing CSS contents on a helper thread when enabled
+
+        :param css_contents: The CSS contents to parse
+        :type css_contents: str or Stylesheet or io.TextIOBase or None
+        :param css_sink: The binary file-like object CSS is streamed to
+        :type css_sink: io.BufferedIOBase or None
+        :returns: The future parsed stylesheet, None when CSS contents are
+                  parsed after the HTML
+        :rtype: concurrent.futures.Future or None
+        """
+        # Streamed CSS contents are never parsed at once
+        if (
+            not self.parallel_css
+            or not isinstance(css_contents, str)
+            or css_sink is not None
+        ):
+            return None
+
+        # Too large contents are refused or kept as is by the CSS extractor
+        try:
+            self.limits.check_size(css_contents)
+        except DocumentTooLarge:
+            return None
+
+        return get_executor().submit(
+            self.css_extractor.compile, css_contents, self.css_backend
+        )
+
+    def _extract_html(
+        self, html_contents, base_url, deadline, sanitize=False, html_sink=None
+    ):
+        """
+        Extracts the cleaned HTML contents
+
+        :param html_contents: The HTML contents to parse
+        :type html_contents: str or lxml.html.HtmlElement
+        :param base_url: The base page URL to use for relative to absolute links
+        :type base_url: str
+        :param deadline: The document deadline
+        :type deadline: chopper.limits.Deadline
+        :param sanitize: Only remove elements to discard
+        :type sanitize: bool
+        :param html_sink: The binary file-like object to write cleaned HTML to
+        :type html_sink: io.BufferedIOBase or None
+        :returns: The HTML extractor, None without matches, and the cleaned
+                  HTML contents, None without matches or when written to the sink
+        :rtype: tuple
+        """
+        html_extractor = self._get_html_extractor(html_contents)
+
+        with self._stage("html.clean"):
+            has_matches = (
+                html_extractor.sanitize() if sanitize else html_extractor.parse()
+            )
+
+        deadline.check("html")
+
+        if not has_matches:
+            return None, None
+
+        # Relative to absolute URLs
+        if base_url is not None:
+            with self._stage("html.rel_to_abs"):
+                html_extractor.rel_to_abs(base_url)
+
+        if self.minifier is not None:
+            with self._stage("html.minify"):
+                html_extractor.minify()
+
+        # Convert ElementTree to string, or write it to the sink
+        with self._stage("html.serialize"):
+            if html_sink is None:
+                cleaned_html = html_extractor.to_string()
+            else:
+                cleaned_html = None
+                html_extractor.write(html_sink)
+
+        deadline.check("html serialization")
+
+        return html_extractor, cleaned_html
+
+    def _extract_css(self, css_contents, tree, base_url, deadline):
+        """
+        Returns the CSS contents matching the cleaned tree
+
+        :param css_contents: The CSS contents to parse or an already parsed stylesheet
+        :type css_contents: str or Stylesheet
+        :param tree: The cleaned HTML tree
+        :type tree: lxml.html.HtmlElement
+        :param base_url: The base page URL to use for relative to absolute links
+        :type base_url: str
+        :param deadline: The document deadline
+        :type deadline: chopper.limits.Deadline
+        :returns: The cleaned CSS contents
+        :rtype: str
+        """
+        # Match CSS against the cleaned tree, no need to parse it again
+        css_extractor = self._get_css_extractor(css_contents, tree, deadline)
+
+        with self._stage("css.clean"):
+            css_extractor.parse()
+
+        # Relative to absolute URLs
+        if base_url is not None:
+            with self._stage("css.rel_to_abs"):
+                css_extractor.rel_to_abs(base_url)
+
+        return css_extractor.to_string()
+
+    def _get_html_extractor(self, html_contents):
+        """
+        Returns a configured HTML extractor
+
+        :param html_contents: The HTML contents to parse
+        :type html_contents: str or lxml.html.HtmlElement
+        :rtype: HTMLExtractor
+        """
+        return self.html_extractor(
+            html_contents,
+            self._xpaths_to_keep,
+            self._xpaths_to_discard,
+            template_cache=self.template_cache,
+            limits=self.limits,
+            profiler=self.profiler,
+            parser_options=self.parser_options,
+            minifier=self.minifier,
+        )
+
+    def _get_css_extractor(self, css_contents, tree, deadline=None):
+        """
+        Returns a configured CSS extractor
+
+        :param css_contents: The CSS contents to parse or an already parsed stylesheet
+        :type css_contents: str or Stylesheet
+        :param tree: The cleaned HTML tree
+        :type tree: lxml.html.HtmlElement
+        :param deadline: The document deadline
+        :type deadline: chopper.limits.Deadline or None
+        :rtype: CSSExtractor
+        """
+        return self.css_extractor(
+            css_contents,
+            tree,
+            template_cache=self.template_cache,
+            limits=self.limits,
+            deadline=deadline,
+            profiler=self.profiler,
+            backend=self.css_backend,
+            optimizer=self.css_optimizer,
+            metrics=self.metrics,
+            workers=self.css_workers,
+        )
+
+    def _record_document(
+        self,
+        mode,
+        html_contents,
+        css_contents=None,
+        cleaned_html=None,
+        cleaned_css=None,
+    ):
+        """
+        Updates the metrics with a processed document
+
+        :param mode: The extraction mode
+        :type mode: str
+        :param html_contents: The HTML contents received
+        :param css_contents: The CSS contents received
+        :param cleaned_html: The cleaned HTML contents or fragments returned,
+                             None without matches or when written to a sink
+        :type cleaned_html: str or list of str or None
+        :param cleaned_css: The cleaned CSS contents returned
+        :type cleaned_css: str or None
+        """
+        metrics = self.metrics
+
+        if metrics is None:
+            return
+
+        metrics.inc("chopper_documents_total", (("mode", mode),))
+
+        # Trees and compiled stylesheets have no size
+        for kind, contents in (("html", html_contents), ("css", css_contents)):
+            if isinstance(contents, (str, bytes)):
+                metrics.inc(
+                    "chopper_input_bytes_total", (("kind", kind),), len(contents)
+                )
+
+        if isinstance(cleaned_html, list):
+            cleaned_html = "".join(cleaned_html)
+
+        for kind, contents in (("html", cleaned_html), ("css", cleaned_css)):
+            if contents:
+                metrics.inc(
+                    "chopper_output_bytes_total", (("kind", kind),), len(contents)
+                )
+
     ##################
     # Rules handling #
     ##################
@@ -135,6 +678,32 @@ class Extractor:
         self.__add(self._xpaths_to_discard, xpath)
         return self
 
+    def _keep_css(self, selector):
+        """
+        Adds a keep CSS selector, translated and compiled once
+
+        :param selector: The CSS selector to keep
+        :type selector: str
+
+        :retuns: self
+        :rtype: Extractor
+        """
+        self.__add(self._xpaths_to_keep, self.selector_rule(selector))
+        return self
+
+    def _discard_css(self, selector):
+        """
+        Adds a discard CSS selector, translated and compiled once
+
+        :param selector: The CSS selector to discard
+        :type selector: str
+
+        :retuns: self
+        :rtype: Extractor
+        """
+        self.__add(self._xpaths_to_discard, self.selector_rule(selector))
+        return self
+
     def __add(self, dest, xpath):
         """
         Adds a Xpath expression to the dest list
@@ -146,3 +715,63 @@ class Extractor:
         """
         assert isinstance(xpath, str)
         dest.append(xpath)
+
+
+class MultiExtractor:
+    """
+    Applies several Extractor configurations to a document
+    by parsing its HTML and CSS contents only once
+    """
+
+    html_extractor = HTMLExtractor
+    css_extractor = LazyImport(".css.extractor", "CSSExtractor")
+    stylesheet_type = LazyImport(".css.stylesheet", "Stylesheet")
+
+    def __init__(self, extractors, parser_options=None, css_backend=None):
+        """
+        Inits the multi extractor
+
+        :param extractors: The extractors to apply
+        :type extractors: list of Extractor
+        :param parser_options: An optional HTML parser configuration
+        :type parser_options: chopper.html.parser.HTMLParserOptions or None
+        :param css_backend: The CSS backend, or its name, used to parse CSS contents
+        :type css_backend: str or chopper.css.backends.CSSBackend or None
+        """
+        self.extractors = list(extractors)
+        self.parser_options = parser_options
+        self.css_backend = css_backend
+
+    def extract(self, html_contents, css_contents=None, base_url=None):
+        """
+        Extracts the cleaned HTML and CSS contents for every extractor
+
+        Every extractor cleans its own copy of the parsed tree, the parsed
+        stylesheet, its selectors translations and identical cleaned trees
+        CSS matches are shared
+
+        :param html_contents: The HTML contents to parse
+        :type html_contents: str
+        :param css_contents: The CSS contents to parse or an already parsed stylesheet
+        :type css_contents: str or Stylesheet
+        :param base_url: The base page URL to use for relative to absolute links
+        :type base_url: str
+
+        :returns: one Extractor.extract result by extractor
+        :rtype: list
+        """
+        tree = self.html_extractor(
+            html_contents, [], [], parser_options=self.parser_options
+        )._build_tree(html_contents)
+
+        if css_contents is not None and not isinstance(
+            css_contents, self.stylesheet_type
+        ):
+            css_contents = self.css_extractor.compile(css_contents, self.css_backend)
+
+        css_results = {}
+
+        return [
+            extractor._extract(deepcopy(tree), css_contents, base_url, css_results)
+            for extractor in self.extractors
+        ]
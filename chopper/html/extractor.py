@@ -1,9 +1,10 @@
 import re
 from itertools import chain
+from time import perf_counter
 from urllib.parse import urljoin
 
 from lxml import html
-from lxml.etree import strip_attributes
+from lxml.etree import htmlfile, strip_attributes
 
 from ..mixins import TreeBuilderMixin
 
@@ -21,7 +22,17 @@ class HTMLExtractor(TreeBuilderMixin):
         re.IGNORECASE | re.MULTILINE | re.DOTALL,
     )
 
-    def __init__(self, html_contents, xpaths_to_keep, xpaths_to_discard):
+    def __init__(
+        self,
+        html_contents,
+        xpaths_to_keep,
+        xpaths_to_discard,
+        template_cache=None,
+        limits=None,
+        profiler=None,
+        parser_options=None,
+        minifier=None,
+    ):
         """
         Inits the extractor
 
@@ -31,10 +42,26 @@ class HTMLExtractor(TreeBuilderMixin):
         :type to_keep: list
         :param to_discard: A list of xpaths to discard
         :type to_discard: list
+        :param template_cache: The cache of matches by page template
+        :type template_cache: chopper.cache.TemplateCache or None
+        :param limits: The resource limits to check
+        :type limits: chopper.limits.Limits or None
+        :param profiler: The profiler recording Xpath expressions costs
+        :type profiler: chopper.profiler.Profiler or None
+        :param parser_options: The HTML parser configuration
+        :type parser_options: chopper.html.parser.HTMLParserOptions or None
+        :param minifier: The minifier applied before serialization
+        :type minifier: chopper.html.minifier.HTMLMinifier or None
         """
         self.html_contents = html_contents
         self.xpaths_to_keep = xpaths_to_keep
         self.xpaths_to_discard = xpaths_to_discard
+        self.template_cache = template_cache
+        self.limits = limits
+        self.profiler = profiler
+        self.parser_options = parser_options
+        self.minifier = minifier
+        self.fragments = None
 
     ##########
     # Public #
@@ -48,11 +75,10 @@ class HTMLExtractor(TreeBuilderMixin):
         :rtype: bool
         """
         # Create the element tree
-        self.tree = self._build_tree(self.html_contents)
+        self.tree = self._build_checked_tree()
 
         # Get explicits elements to keep and discard
-        self.elts_to_keep = self._get_elements_to_keep()
-        self.elts_to_discard = self._get_elements_to_discard()
+        self.elts_to_keep, self.elts_to_discard = self._get_rules_elements()
 
         # Init an empty list of Elements to remove
         self.elts_to_remove = []
@@ -70,22 +96,162 @@ class HTMLExtractor(TreeBuilderMixin):
 
         return True
 
+    def sanitize(self):
+        """
+        Removes every element to discard in a single pass and keeps
+        the rest of the tree, keep Xpaths are not used
+
+        :returns: Whether the cleaned HTML has contents or not
+        :rtype: bool
+        """
+        # Create the element tree
+        self.tree = self._build_checked_tree()
+
+        # The root can't be removed from its tree
+        elts_to_discard = self._get_elements_to_discard()
+
+        if self.tree in elts_to_discard:
+            return False
+
+        self._remove_elements(elts_to_discard)
+
+        return True
+
+    def parse_fragments(self):
+        """
+        Collects every top-most keep element as its own fragment,
+        in document order, with discards applied.
+        Ancestors are not preserved and the rest of the tree is left as is.
+
+        :returns: Whether there are fragments or not
+        :rtype: bool
+        """
+        # Create the element tree
+        self.tree = self._build_checked_tree()
+
+        keep, discard = map(set, self._get_rules_elements())
+        discard -= keep
+
+        self.fragments = []
+        fragments = set()
+
+        # Walk the tree once to get keep elements in document order
+        for elt in self.tree.iter():
+            if elt not in keep:
+                continue
+
+            # Skip keep elements nested in a fragment or in a discarded element
+            if any(a in fragments or a in discard for a in elt.iterancestors()):
+                continue
+
+            self.fragments.append(elt)
+            fragments.add(elt)
+
+        # Only remove discarded elements that belong to a fragment
+        self._remove_elements(
+            [e for e in discard if any(a in fragments for a in e.iterancestors())]
+        )
+
+        return bool(self.fragments)
+
     def rel_to_abs(self, base_url):
         """
         Converts relative links from html contents to absolute links
         """
+        for root in self._output_roots():
+            self._rel_to_abs_element(root, base_url)
+
+    def minify(self):
+        """
+        Minifies the cleaned html tree, or fragments, with the minifier
+        """
+        for elt in self._output_roots():
+            self.minifier.minify(elt)
+
+    def to_string(self):
+        """
+        Returns the cleaned html tree as a string
+
+        :returns: The cleaned HTML contents
+        :rtype: str
+        """
+        return html.tostring(self.tree).decode()
+
+    def write(self, sink):
+        """
+        Writes the cleaned html tree to a binary sink, incrementally
+
+        :param sink: The binary file-like object to write UTF-8 HTML contents to
+        :type sink: io.RawIOBase or io.BufferedIOBase
+        """
+        with htmlfile(sink, encoding="utf-8") as f:
+            f.write(self.tree)
+
+    def fragments_to_string(self):
+        """
+        Returns every fragment as a string, without its tail
+
+        :returns: The list of HTML fragments
+        :rtype: list of str
+        """
+        return [html.tostring(f, with_tail=False).decode() for f in self.fragments]
+
+    ###########
+    # Private #
+    ###########
+
+    def _build_checked_tree(self):
+        """
+        Returns the HTML tree, checking resource limits
+
+        :returns: The parsed lxml element
+        :rtype: lxml.html.HtmlElement
+        """
+        if self.limits is None:
+            return self._build_tree(self.html_contents)
+
+        self.limits.check_size(self.html_contents)
+        tree = self._build_tree(self.html_contents)
+        self.limits.check_tree(tree)
+
+        return tree
+
+    def _output_roots(self):
+        """
+        Returns the root elements of the output
+
+        :returns: The fragments in fragment mode, the whole tree otherwise
+        :rtype: list of lxml.html.HtmlElement
+        """
+        if self.fragments is not None:
+            return self.fragments
+
+        return [self.tree]
+
+    def _rel_to_abs_element(self, elt, base_url):
+        """
+        Converts relative links from an element and its descendants
+        to absolute links
+
+        :param elt: The HtmlElement to convert
+        :type elt: lxml.html.HtmlElement
+        :param base_url: The base page url to use for building absolute links
+        :type base_url: str
+        """
         # Delete target attributes
-        strip_attributes(self.tree, "target")
+        strip_attributes(elt, "target")
 
         # Absolute links
-        self.tree.rewrite_links(
-            lambda link: urljoin(base_url, link)
-            if not link.startswith(self.rel_to_abs_excluded_prefixes)
-            else link
+        elt.rewrite_links(
+            lambda link: (
+                urljoin(base_url, link)
+                if not link.startswith(self.rel_to_abs_excluded_prefixes)
+                else link
+            )
         )
 
         # Extra attributes
-        onclick_elements = self.tree.xpath("//*[@onclick]")
+        onclick_elements = elt.xpath("descendant-or-self::*[@onclick]")
 
         for element in onclick_elements:
             # Replace attribute with absolute URL
@@ -102,29 +268,45 @@ class HTMLExtractor(TreeBuilderMixin):
                 ),
             )
 
-    def to_string(self):
+    def _get_elements(self, source, kind=None):
         """
-        Returns the cleaned html tree as a string
+        Returns the list of HtmlElements for the source
 
-        :returns: The cleaned HTML contents
-        :rtype: str
+        :param source: The source list to parse
+        :type source: list
+        :param kind: The kind of Xpath expressions (keep or discard), for profiling
+        :type kind: str or None
+        :returns: A list of HtmlElements
+        :rtype: list
         """
-        return html.tostring(self.tree).decode()
+        if self.profiler is None or not self.profiler.rules:
+            return list(chain(*[self._select(xpath) for xpath in source]))
 
-    ###########
-    # Private #
-    ###########
+        elements = []
+
+        for xpath in source:
+            start = perf_counter()
+            matches = self._select(xpath)
+            self.profiler.record(kind, xpath, perf_counter() - start, matches)
+            elements += matches
+
+        return elements
 
-    def _get_elements(self, source):
+    def _select(self, xpath):
         """
-        Returns the list of HtmlElements for the source
+        Returns the matches of an Xpath expression, rules compiled once
+        (CSS selectors) are evaluated as is
 
-        :param source: The source list to parse
-        :type source: list
-        :returns: A list of HtmlElements
+        :param xpath: The Xpath expression or compiled rule
+        :type xpath: str or chopper.css.selectors.SelectorRule
         :rtype: list
         """
-        return list(chain(*[self.tree.xpath(xpath) for xpath in source]))
+        select = getattr(xpath, "select", None)
+
+        if select is None:
+            return self.tree.xpath(xpath)
+
+        return select(self.tree)
 
     def _get_elements_to_keep(self):
         """
@@ -133,7 +315,7 @@ class HTMLExtractor(TreeBuilderMixin):
         :returns: List of elements to keep
         :rtype: list of lxml.html.HtmlElement
         """
-        return self._get_elements(self.xpaths_to_keep)
+        return self._get_elements(self.xpaths_to_keep, "keep")
 
     def _get_elements_to_discard(self):
         """
@@ -142,7 +324,42 @@ class HTMLExtractor(TreeBuilderMixin):
         :returns: List of elements to discard
         :rtype: list of lxml.html.HtmlElement
         """
-        return self._get_elements(self.xpaths_to_discard)
+        return self._get_elements(self.xpaths_to_discard, "discard")
+
+    def _get_rules_elements(self):
+        """
+        Returns the lists of lxml Elements to keep and to discard,
+        from the template cache when possible
+
+        :returns: List of elements to keep, list of elements to discard
+        :rtype: tuple
+        """
+        cache = self.template_cache
+
+        if cache is None or not cache.can_cache_xpaths(
+            self.xpaths_to_keep + self.xpaths_to_discard
+        ):
+            return self._get_elements_to_keep(), self._get_elements_to_discard()
+
+        template, nodes = cache.get_template(self.tree)
+        key = (tuple(self.xpaths_to_keep), tuple(self.xpaths_to_discard))
+
+        # Known template, resolve elements from their indexes
+        if key in template.rules:
+            return tuple([nodes[i] for i in indexes] for indexes in template.rules[key])
+
+        elements = self._get_elements_to_keep(), self._get_elements_to_discard()
+        positions = {node: i for i, node in enumerate(nodes)}
+
+        try:
+            template.rules[key] = tuple(
+                [positions[e] for e in elts] for elts in elements
+            )
+        except KeyError:
+            # Some matches are not tree nodes (texts, attributes...), don't cache them
+            pass
+
+        return elements
 
     def _parse_element(self, elt, parent_is_keep=False):
         """
@@ -228,10 +445,14 @@ class HTMLExtractor(TreeBuilderMixin):
             # Get the element parent
             parent = e.getparent()
 
+            # Element already removed
+            if parent is None:
+                continue
+
             # lxml also remove the element tail, preserve it
             if e.tail and e.tail.strip():
                 parent_text = parent.text or ""
                 parent.text = parent_text + e.tail
 
             # Remove the element
-            e.getparent().remove(e)
+            parent.remove(e)
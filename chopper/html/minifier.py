@@ -0,0 +1,151 @@
+import re
+
+from lxml.etree import Comment
+
+
+class HTMLMinifier:
+    """
+    Minifies cleaned HTML trees before their serialization
+
+    Whitespace runs are collapsed to a single space, except in elements
+    where whitespace is significant, comments and optionally empty
+    attributes are removed
+    """
+
+    # Elements whose texts are kept as is, with their descendants texts
+    preserved_tags = frozenset(("pre", "textarea", "script", "style"))
+
+    # Elements whose whitespace-only texts are never rendered
+    blank_tags = frozenset(
+        ("html", "head", "table", "thead", "tbody", "tr", "ul", "ol")
+    )
+
+    # Attributes meaningful even when empty
+    boolean_attributes = frozenset(
+        (
+            "allowfullscreen",
+            "async",
+            "autofocus",
+            "autoplay",
+            "checked",
+            "compact",
+            "controls",
+            "declare",
+            "default",
+            "defer",
+            "disabled",
+            "formnovalidate",
+            "hidden",
+            "inert",
+            "ismap",
+            "itemscope",
+            "loop",
+            "multiple",
+            "muted",
+            "nohref",
+            "noresize",
+            "noshade",
+            "novalidate",
+            "nowrap",
+            "open",
+            "playsinline",
+            "readonly",
+            "required",
+            "reversed",
+            "selected",
+        )
+    )
+    kept_empty_attributes = boolean_attributes | frozenset(("alt", "value"))
+
+    # HTML whitespace, non-breaking spaces are significant
+    whitespace_re = re.compile(r"[ \t\n\r\f]+")
+
+    def __init__(
+        self,
+        collapse_whitespace=True,
+        remove_comments=True,
+        remove_empty_attributes=False,
+    ):
+        """
+        Inits the minifier
+
+        :param collapse_whitespace: Collapse whitespace runs to a single space
+        :type collapse_whitespace: bool
+        :param remove_comments: Remove comments, except conditional comments
+        :type remove_comments: bool
+        :param remove_empty_attributes: Remove attributes with an empty value,
+                                        except boolean attributes, alt and value
+        :type remove_empty_attributes: bool
+        """
+        self.collapse_whitespace = collapse_whitespace
+        self.remove_comments = remove_comments
+        self.remove_empty_attributes = remove_empty_attributes
+
+    def minify(self, tree):
+        """
+        Minifies a tree in place
+
+        :param tree: The element to minify with its descendants
+        :type tree: lxml.html.HtmlElement
+        """
+        if self.remove_comments:
+            self._remove_comments(tree)
+
+        # Elements whose texts are kept as is
+        preserved = set()
+
+        if any(a.tag in self.preserved_tags for a in tree.iterancestors()):
+            preserved.add(tree)
+
+        for elt in tree.iter():
+            parent = elt.getparent()
+
+            if elt.tag in self.preserved_tags or parent in preserved:
+                preserved.add(elt)
+
+            if self.collapse_whitespace:
+                # Comments and processing instructions texts are kept as is
+                if isinstance(elt.tag, str) and elt not in preserved:
+                    elt.text = self._collapse(elt.text, elt.tag)
+
+                # The tail belongs to the parent, the tree tail is not output
+                if elt is not tree and parent not in preserved:
+                    elt.tail = self._collapse(elt.tail, parent.tag)
+
+            if self.remove_empty_attributes and elt.attrib:
+                self._remove_empty_attributes(elt)
+
+    def _remove_comments(self, tree):
+        """
+        Removes comments, conditional comments are kept
+        """
+        comments = [c for c in tree.iter(Comment) if not c.text.startswith("[if")]
+
+        for comment in comments:
+            # Comments tails are moved to the previous node
+            comment.drop_tree()
+
+    def _collapse(self, text, tag):
+        """
+        Returns the text with collapsed whitespace runs, None for
+        whitespace-only texts of elements where they are not rendered
+        """
+        if not text:
+            return text
+
+        text = self.whitespace_re.sub(" ", text)
+
+        if text == " " and tag in self.blank_tags:
+            return None
+
+        return text
+
+    def _remove_empty_attributes(self, elt):
+        """
+        Removes the element attributes with an empty value
+        """
+        attrib = elt.attrib
+
+        for name, value in list(attrib.items()):
+            if not value.strip() and name.lower() not in self.kept_empty_attributes:
+                del attrib[name]
@@ -0,0 +1,314 @@
+import codecs
+import mmap
+import os
+import re
+from contextlib import contextmanager
+from itertools import chain
+from threading import local
+
+from lxml import etree, html
+from lxml.html.defs import block_tags
+
+# Parsers are not thread safe, every thread gets its own pooled parsers
+_parsers = local()
+
+# How lxml tells whole documents from fragments, see lxml.html.fromstring
+_looks_like_full_html = re.compile(r"^\s*<(?:html|!doctype)", re.I).match
+
+# Encodings declared in the first bytes of files, which libxml2 honours
+_meta_charset = re.compile(rb"<meta[^>]+charset\s*=", re.I).search
+_byte_order_marks = (
+    (codecs.BOM_UTF8, "UTF-8"),
+    (codecs.BOM_UTF16_LE, "UTF-16LE"),
+    (codecs.BOM_UTF16_BE, "UTF-16BE"),
+)
+
+
+def is_html_file(html_contents):
+    """
+    Returns True if the HTML contents are a file path or a binary file object
+
+    :rtype: bool
+    """
+    return isinstance(html_contents, os.PathLike) or hasattr(html_contents, "read")
+
+
+class HTMLParserOptions:
+    """
+    lxml HTML parser configuration, parsers are created once per thread
+    and reused for every document
+    """
+
+    modes = ("auto", "document", "fragment")
+
+    # The size of file chunks fed to the parser when files can't be mapped
+    chunk_size = 65536
+
+    def __init__(
+        self,
+        mode="auto",
+        remove_comments=False,
+        remove_pis=False,
+        remove_blank_text=False,
+        huge_tree=False,
+        no_network=True,
+    ):
+        """
+        Inits the parser options
+
+        :param mode: document to always build a whole html document, fragment
+                     to parse an HTML fragment, auto lets lxml guess
+        :type mode: str
+        :param remove_comments: Discard comments while parsing
+        :type remove_comments: bool
+        :param remove_pis: Discard processing instructions while parsing
+        :type remove_pis: bool
+        :param remove_blank_text: Discard blank text nodes between tags
+        :type remove_blank_text: bool
+        :param huge_tree: Disable libxml2 security limits on deep trees and long texts
+        :type huge_tree: bool
+        :param no_network: Prevent network access while parsing
+        :type no_network: bool
+        """
+        assert mode in self.modes
+
+        self.mode = mode
+        self.parser_kwargs = {
+            "remove_comments": remove_comments,
+            "remove_pis": remove_pis,
+            "remove_blank_text": remove_blank_text,
+            "huge_tree": huge_tree,
+            "no_network": no_network,
+        }
+        self._key = tuple(sorted(self.parser_kwargs.items()))
+
+    def get_parser(self, encoding=None):
+        """
+        Returns the parser of the current thread for these options
+
+        :param encoding: The encoding of bytes contents, detected by libxml2
+                         when None
+        :type encoding: str or None
+        :rtype: lxml.html.HTMLParser
+        """
+        try:
+            pool = _parsers.pool
+        except AttributeError:
+            pool = _parsers.pool = {}
+
+        key = (self._key, encoding)
+
+        try:
+            return pool[key]
+        except KeyError:
+            parser = pool[key] = html.HTMLParser(
+                encoding=encoding, **self.parser_kwargs
+            )
+            return parser
+
+    def build_tree(self, html_contents):
+        """
+        Returns a HTML tree from the HTML contents
+
+        :param html_contents: The HTML contents to parse, or a path or binary
+                              file object to read them from
+        :type html_contents: str, bytes, os.PathLike or file object
+        :returns: The parsed lxml element
+        :rtype: lxml.html.HtmlElement
+        """
+        if is_html_file(html_contents):
+            return self._file_build_tree(html_contents)
+
+        parser = self.get_parser()
+
+        if self.mode == "document":
+            return html.document_fromstring(html_contents, parser=parser)
+
+        if self.mode == "fragment":
+            return self._fragment_fromstring(html_contents, parser)
+
+        return html.fromstring(html_contents, parser=parser)
+
+    def _fragment_fromstring(self, html_contents, parser):
+        """
+        Returns the single element of a fragment, several elements or texts
+        are wrapped in a div element
+        """
+        head = html_contents[:1024]
+
+        if isinstance(head, bytes):
+            head = head.decode("latin-1")
+
+        # Parsed once in a body, as lxml.html.fragments_fromstring does
+        if _looks_like_full_html(head) is None:
+            wrapper = "<html><body>%s</body></html>"
+
+            if isinstance(html_contents, bytes):
+                wrapper = wrapper.encode("ascii")
+
+            html_contents = wrapper % html_contents
+
+        return _fragment_root(html.document_fromstring(html_contents, parser=parser))
+
+    def _file_build_tree(self, html_file):
+        """
+        Returns a HTML tree from a file, the same tree build_tree returns
+        for its decoded contents
+
+        Files are memory mapped and handed to libxml2 as is, the OS page
+        cache backs the buffer and no Python copy of the file is made.
+        Fragments, which need a wrapping body, and files that can't be
+        mapped are fed to the parser in chunks.
+
+        Files are decoded according to their byte order mark or their meta
+        charset, UTF-8 otherwise.
+        """
+        with _open_html_file(html_file) as (buffer, chunks):
+            if buffer is not None:
+                head = buffer[:1024]
+            else:
+                head = next(chunks, b"")
+
+            encoding, bom_size = _detect_encoding(head)
+            head = head[bom_size:]
+
+            is_full_html = (
+                _looks_like_full_html(head.decode(encoding or "ascii", "ignore"))
+                is not None
+            )
+            is_fragment = self.mode == "fragment" and not is_full_html
+
+            if buffer is None:
+                chunks = chain((head,), chunks)
+                document = self._feed(chunks, encoding, is_fragment)
+            elif is_fragment:
+                buffer.seek(bom_size)
+                chunks = iter(lambda: buffer.read(self.chunk_size), b"")
+                document = self._feed(chunks, encoding, is_fragment)
+            else:
+                with memoryview(buffer)[bom_size:] as contents:
+                    document = html.document_fromstring(
+                        contents, parser=self.get_parser(encoding)
+                    )
+
+        if self.mode == "fragment":
+            return _fragment_root(document)
+
+        if self.mode == "document" or is_full_html:
+            return document
+
+        return _guess_root(document)
+
+    def _feed(self, chunks, encoding, is_fragment):
+        """
+        Returns the document parsed from chunks of HTML, fragments are parsed
+        in a body as lxml.html.fragments_fromstring does
+        """
+        # A fresh parser, a failed feed would leave a pooled one unusable
+        parser = html.HTMLParser(encoding=encoding, **self.parser_kwargs)
+
+        if is_fragment:
+            wrapper_encoding = encoding or "ascii"
+            chunks = chain(
+                ("<html><body>".encode(wrapper_encoding),),
+                chunks,
+                ("</body></html>".encode(wrapper_encoding),),
+            )
+
+        for chunk in chunks:
+            parser.feed(chunk)
+
+        try:
+            document = parser.close()
+        except etree.XMLSyntaxError:
+            document = None
+
+        if document is None:
+            raise etree.ParserError("Document is empty")
+
+        return document
+
+
+def _detect_encoding(head):
+    """
+    Returns the encoding of a file from its first bytes, None when its meta
+    charset is left to libxml2, and the size of its byte order mark
+    """
+    for bom, encoding in _byte_order_marks:
+        if head.startswith(bom):
+            return encoding, len(bom)
+
+    if _meta_charset(head) is not None:
+        return None, 0
+
+    return "UTF-8", 0
+
+
+@contextmanager
+def _open_html_file(html_file):
+    """
+    Yields a read-only memory map of a file and None, or None and an iterator
+    over its chunks when the file can't be mapped: empty files, pipes or
+    in-memory files
+    """
+    if isinstance(html_file, os.PathLike):
+        with open(html_file, "rb") as f:
+            with _open_html_file(f) as opened:
+                yield opened
+        return
+
+    try:
+        buffer = mmap.mmap(html_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        chunk_size = HTMLParserOptions.chunk_size
+        yield None, iter(lambda: html_file.read(chunk_size), b"")
+        return
+
+    with buffer:
+        yield buffer, None
+
+
+def _fragment_root(document):
+    """
+    Returns the single element of a fragment document body, several elements
+    or texts are wrapped in a div element
+    """
+    body = document.find("body")
+
+    if body is None:
+        raise etree.ParserError("No fragment found")
+
+    text = body.text if body.text and body.text.strip() else None
+
+    if len(body) == 1 and text is None:
+        return body[0]
+
+    root = html.Element("div")
+    root.text = text
+    root.extend(body)
+    return root
+
+
+def _guess_root(document):
+    """
+    Returns the root element lxml.html.fromstring guesses for a document
+    that doesn't start with an html tag or a doctype
+    """
+    if document.find("head") is not None:
+        return document
+
+    body = document.find("body")
+
+    if body is None:
+        return document
+
+    if (
+        len(body) == 1
+        and (not body.text or not body.text.strip())
+        and (not body[-1].tail or not body[-1].tail.strip())
+    ):
+        return body[0]
+
+    is_block = any(element.tag in block_tags for element in body.iter(etree.Element))
+    body.tag = "div" if is_block else "span"
+    return body
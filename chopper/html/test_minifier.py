@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from lxml import html
+
+from ..extractor import Extractor
+from ..test_extractor import TEST_CSS, TEST_HTML
+from .minifier import HTMLMinifier
+
+
+class HTMLMinifierTestCase(TestCase):
+    def minify(self, contents, **kwargs):
+        tree = html.fromstring(contents)
+        HTMLMinifier(**kwargs).minify(tree)
+        return html.tostring(tree, encoding="unicode")
+
+    def test_collapse_whitespace(self):
+        """
+        Tests whitespace is collapsed out of preformatted elements
+        """
+        self.assertEqual(
+            self.minify(
+                """<div>  a \n\t b <b> x </b>  <pre>  a\n  <b> b </b>  </pre>"""
+                """  <textarea>  t  </textarea>\xa0 <script>  a  =  1  </script></div>"""
+            ),
+            """<div> a b <b> x </b> <pre>  a\n  <b> b </b>  </pre>"""
+            """ <textarea>  t  </textarea>\xa0 <script>  a  =  1  </script></div>""",
+        )
+
+    def test_blank_texts(self):
+        """
+        Tests whitespace-only texts are removed where they are not rendered
+        """
+        self.assertEqual(
+            self.minify(
+                """<html> <head> <title>T</title> </head> <body> <ul> <li> a </li> </ul>"""
+                """ <table> <tr> <td> 1 </td> </tr> </table> </body> </html>"""
+            ),
+            """<html><head><title>T</title></head><body> <ul><li> a </li></ul>"""
+            """ <table><tr><td> 1 </td></tr></table> </body></html>""",
+        )
+
+    def test_remove_comments(self):
+        """
+        Tests comments are removed, except conditional comments
+        """
+        contents = """<div>a <!-- comment --> b<!--[if IE]>ie<![endif]--></div>"""
+
+        self.assertEqual(
+            self.minify(contents), """<div>a b<!--[if IE]>ie<![endif]--></div>"""
+        )
+        self.assertEqual(
+            self.minify(contents, remove_comments=False, collapse_whitespace=False),
+            contents,
+        )
+
+    def test_remove_empty_attributes(self):
+        """
+        Tests empty attributes are removed, except meaningful ones
+        """
+        contents = (
+            """<p><input type="checkbox" checked class="" value="" title=" ">"""
+            """<img alt="" src="a.png"></p>"""
+        )
+
+        self.assertEqual(self.minify(contents), contents)
+        self.assertEqual(
+            self.minify(contents, remove_empty_attributes=True),
+            """<p><input type="checkbox" checked value=""><img alt="" src="a.png"></p>""",
+        )
+
+    def test_extract(self):
+        """
+        Tests extracted HTML and fragments are minified
+        """
+        extractor = Extractor(minifier=HTMLMinifier()).keep('//div[@id="main"]')
+        html_contents, css_contents = extractor.extract(TEST_HTML, TEST_CSS)
+
+        self.assertEqual(
+            html_contents,
+            """<html><body> <div id="main"> <a href="test">Test <em>Link</em></a> </div> </body></html>""",
+        )
+        self.assertEqual(
+            css_contents,
+            Extractor.keep('//div[@id="main"]').extract(TEST_HTML, TEST_CSS)[1],
+        )
+
+        extractor = Extractor(minifier=HTMLMinifier()).keep("//p")
+        self.assertEqual(
+            extractor.extract_fragments(TEST_HTML),
+            [
+                "<p> Hello <strong>world</strong> ! </p>",
+                "<p> This is <span>not</span> a test </p>",
+            ],
+        )
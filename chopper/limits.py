@@ -0,0 +1,144 @@
+import os
+from time import monotonic
+
+from lxml import etree
+
+from .exceptions import DeadlineExceeded, DocumentTooLarge, TooManyNodes, TreeTooDeep
+
+
+class Deadline:
+    """
+    The time budget of a single document
+    """
+
+    def __init__(self, timeout=None):
+        """
+        Inits the deadline
+
+        :param timeout: The time budget in seconds, None for no budget
+        :type timeout: float or None
+        """
+        self.timeout = timeout
+        self.expires_at = None if timeout is None else monotonic() + timeout
+
+    def expired(self):
+        """
+        Returns whether the time budget is exhausted or not
+
+        :rtype: bool
+        """
+        return self.expires_at is not None and monotonic() > self.expires_at
+
+    def check(self, stage):
+        """
+        Raises DeadlineExceeded if the time budget is exhausted
+
+        :param stage: The name of the last stage, for error messages
+        :type stage: str
+        """
+        if self.expired():
+            raise DeadlineExceeded(
+                "Deadline of %ss exceeded after the %s stage" % (self.timeout, stage)
+            )
+
+
+class Limits:
+    """
+    Resource limits applied to every extracted document
+
+    When degrade is True, CSS contents exceeding a limit are returned without
+    being cleaned instead of raising, other limits always raise a LimitExceeded
+    """
+
+    def __init__(
+        self,
+        max_bytes=None,
+        max_nodes=None,
+        max_depth=None,
+        timeout=None,
+        degrade=False,
+    ):
+        """
+        Inits the limits, None disables a limit
+
+        :param max_bytes: The maximum size of HTML and CSS contents,
+                          in characters for str contents
+        :type max_bytes: int or None
+        :param max_nodes: The maximum number of elements in the HTML tree
+        :type max_nodes: int or None
+        :param max_depth: The maximum depth of the HTML tree, the root being at depth 1
+        :type max_depth: int or None
+        :param timeout: The time budget of each document in seconds
+        :type timeout: float or None
+        :param degrade: Whether CSS cleaning should be skipped instead of raising
+        :type degrade: bool
+        """
+        self.max_bytes = max_bytes
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.timeout = timeout
+        self.degrade = degrade
+
+        # Equal limits give equal results, see Extractor._extract
+        self._key = (max_bytes, max_nodes, max_depth, timeout, degrade)
+
+        # Counting and walking levels is done by libxml2, not in Python
+        self._count_nodes = (
+            etree.XPath("count(descendant-or-self::*)")
+            if max_nodes is not None
+            else None
+        )
+        self._too_deep = (
+            etree.XPath("boolean(%s)" % "/".join(["*"] * max_depth))
+            if max_depth is not None
+            else None
+        )
+
+    def start(self):
+        """
+        Returns the deadline of a new document
+
+        :rtype: Deadline
+        """
+        return Deadline(self.timeout)
+
+    def check_size(self, contents):
+        """
+        Raises DocumentTooLarge if the contents are too large
+
+        :param contents: The HTML or CSS contents, or the path of a file,
+                         checked before reading it
+        :type contents: str, bytes or os.PathLike
+        """
+        if self.max_bytes is None:
+            return
+
+        if isinstance(contents, os.PathLike):
+            size = os.path.getsize(contents)
+        elif isinstance(contents, (str, bytes)):
+            size = len(contents)
+        else:
+            return
+
+        if size > self.max_bytes:
+            raise DocumentTooLarge(
+                "Contents size %d exceeds %d" % (size, self.max_bytes)
+            )
+
+    def check_tree(self, tree):
+        """
+        Raises TooManyNodes or TreeTooDeep if the tree is too large
+
+        :param tree: The parsed HTML tree
+        :type tree: lxml.html.HtmlElement
+        """
+        if self._count_nodes is not None:
+            count = int(self._count_nodes(tree))
+
+            if count > self.max_nodes:
+                raise TooManyNodes(
+                    "Tree has %d elements, more than %d" % (count, self.max_nodes)
+                )
+
+        if self._too_deep is not None and self._too_deep(tree):
+            raise TreeTooDeep("Tree is deeper than %d" % self.max_depth)
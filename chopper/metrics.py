@@ -0,0 +1,304 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+
+
+class Metrics:
+    """
+    Process-wide counters and histograms updated by extractors
+
+    Metrics are rendered to the Prometheus text exposition format, to serve
+    from any HTTP endpoint or write to a textfile collector, or to a dict.
+    Sizes are counted in characters for str contents, like limits.
+    """
+
+    # Type and help text by metric name
+    descriptions = {
+        "chopper_documents_total": ("counter", "Documents processed, by mode"),
+        "chopper_input_bytes_total": (
+            "counter",
+            "Size of the HTML and CSS contents received, compiled stylesheets and trees excluded",
+        ),
+        "chopper_output_bytes_total": (
+            "counter",
+            "Size of the cleaned HTML and CSS contents returned, sinks excluded",
+        ),
+        "chopper_stage_duration_seconds": (
+            "histogram",
+            "Duration of the extraction stages",
+        ),
+        "chopper_css_rules_total": ("counter", "CSS rules kept or dropped"),
+        "chopper_css_assumed_matches_total": (
+            "counter",
+            "CSS selectors and rules assumed to match the tree, by reason",
+        ),
+        "chopper_selector_cache_requests_total": (
+            "counter",
+            "CSS selectors matches looked up in the template cache",
+        ),
+        "chopper_template_cache_requests_total": (
+            "counter",
+            "Page templates looked up in the template cache",
+        ),
+    }
+
+    # Histogram buckets upper bounds, in seconds
+    default_buckets = (
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+    )
+
+    def __init__(self, buckets=None):
+        """
+        Inits the registry
+
+        :param buckets: The histograms buckets upper bounds, in seconds
+        :type buckets: iterable of float or None
+        """
+        self.buckets = tuple(sorted(buckets or self.default_buckets))
+
+        # Value by (name, labels)
+        self._counters = {}
+
+        # [count by bucket with a last +Inf bucket, sum] by (name, labels)
+        self._histograms = {}
+
+        # Template caches whose own hits and misses are reported
+        self._template_caches = []
+
+        self._lock = Lock()
+
+    def __getstate__(self):
+        """
+        Metrics are pickled without their lock, with their values
+        """
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    ##########
+    # Public #
+    ##########
+
+    def inc(self, name, labels=(), value=1):
+        """
+        Increments a counter
+
+        :param name: The counter name
+        :type name: str
+        :param labels: The (label, value) pairs of the counter
+        :type labels: tuple
+        :param value: The value to add
+        :type value: int or float
+        """
+        key = (name, labels)
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        """
+        Records a value in a histogram
+
+        :param name: The histogram name
+        :type name: str
+        :param value: The observed value, in seconds for durations
+        :type value: float
+        :param labels: The (label, value) pairs of the histogram
+        :type labels: tuple
+        """
+        index = bisect_left(self.buckets, value)
+        key = (name, labels)
+
+        with self._lock:
+            try:
+                histogram = self._histograms[key]
+            except KeyError:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+
+            histogram[0][index] += 1
+            histogram[1] += value
+
+    @contextmanager
+    def measure(self, name, labels=()):
+        """
+        Records the duration of the managed block in a histogram
+
+        :param name: The histogram name
+        :type name: str
+        :param labels: The (label, value) pairs of the histogram
+        :type labels: tuple
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start, labels)
+
+    def track_template_cache(self, cache):
+        """
+        Reports the hits and misses of a template cache
+
+        :param cache: The template cache
+        :type cache: chopper.cache.TemplateCache
+        """
+        with self._lock:
+            if not any(c is cache for c in self._template_caches):
+                self._template_caches.append(cache)
+
+    def reset(self):
+        """
+        Removes every recorded value, tracked template caches are kept
+        """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_dict(self):
+        """
+        Returns every metric with its samples
+
+        Counters samples have labels and value keys, histograms samples
+        have labels, buckets (cumulative counts by upper bound), sum and
+        count keys
+
+        :rtype: dict
+        """
+        metrics = {}
+
+        for (name, labels), value in self._collect_counters():
+            metrics.setdefault(name, []).append(
+                {"labels": dict(labels), "value": value}
+            )
+
+        for (name, labels), (counts, total) in self._collect_histograms():
+            cumulative = 0
+            buckets = {}
+
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                buckets[_format_value(bound)] = cumulative
+
+            metrics.setdefault(name, []).append(
+                {
+                    "labels": dict(labels),
+                    "buckets": buckets,
+                    "sum": total,
+                    "count": cumulative,
+                }
+            )
+
+        return metrics
+
+    def to_prometheus(self):
+        """
+        Returns every metric in the Prometheus text exposition format
+
+        :rtype: str
+        """
+        lines = []
+
+        for name, samples in sorted(self.to_dict().items()):
+            kind, description = self.descriptions.get(name, ("untyped", name))
+            lines.append("# HELP %s %s" % (name, description))
+            lines.append("# TYPE %s %s" % (name, kind))
+
+            for sample in samples:
+                labels = sample["labels"]
+
+                if "buckets" not in sample:
+                    lines.append(
+                        "%s%s %s"
+                        % (name, _format_labels(labels), _format_value(sample["value"]))
+                    )
+                    continue
+
+                for bound, count in sample["buckets"].items():
+                    lines.append(
+                        "%s_bucket%s %d"
+                        % (name, _format_labels(dict(labels, le=bound)), count)
+                    )
+
+                lines.append(
+                    "%s_sum%s %s"
+                    % (name, _format_labels(labels), _format_value(sample["sum"]))
+                )
+                lines.append(
+                    "%s_count%s %d" % (name, _format_labels(labels), sample["count"])
+                )
+
+        return "\n".join(lines) + "\n"
+
+    ###########
+    # Private #
+    ###########
+
+    def _collect_counters(self):
+        """
+        Returns the counters items sorted by name and labels, with the
+        tracked template caches hits and misses
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            caches = list(self._template_caches)
+
+        if caches:
+            name = "chopper_template_cache_requests_total"
+            counters[(name, (("result", "hit"),))] = sum(c.hits for c in caches)
+            counters[(name, (("result", "miss"),))] = sum(c.misses for c in caches)
+
+        return sorted(counters.items())
+
+    def _collect_histograms(self):
+        """
+        Returns copies of the histograms items sorted by name and labels
+        """
+        with self._lock:
+            return sorted(
+                (key, (list(counts), total))
+                for key, (counts, total) in self._histograms.items()
+            )
+
+
+def _format_value(value):
+    """
+    Returns a sample value or bucket bound as a Prometheus number
+    """
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(value)
+
+
+def _format_labels(labels):
+    """
+    Returns labels as a Prometheus label set, empty without labels
+    """
+    if not labels:
+        return ""
+
+    return "{%s}" % ",".join(
+        '%s="%s"'
+        % (
+            name,
+            str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"),
+        )
+        for name, value in labels.items()
+    )
@@ -1,4 +1,12 @@
-from lxml import html
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+from lxml import etree, html
+
+from .html.parser import HTMLParserOptions, is_html_file
+
+# lxml defaults, for files built without parser options
+_default_parser_options = HTMLParserOptions()
 
 
 class TreeBuilderMixin:
@@ -7,11 +15,71 @@ class TreeBuilderMixin:
     from a HTML contents string
     """
 
+    # chopper.html.parser.HTMLParserOptions, lxml defaults when None
+    parser_options = None
+
     def _build_tree(self, html_contents):
         """
         Returns a HTML tree from the HTML contents
+        An already built tree is returned as is, file paths and binary file
+        objects are read without a Python copy of the whole file
 
+        :param html_contents: The HTML contents to parse
+        :type html_contents: str, bytes, os.PathLike, file object
+                             or lxml.html.HtmlElement
         :returns: The parsed lxml element
         :rtype: lxml.html.HtmlElement
         """
+        if isinstance(html_contents, etree._Element):
+            return html_contents
+
+        if self.parser_options is not None:
+            return self.parser_options.build_tree(html_contents)
+
+        if is_html_file(html_contents):
+            return _default_parser_options.build_tree(html_contents)
+
         return html.fromstring(html_contents)
+
+
+class ProfilerMixin:
+    """
+    Adds a '_stage' method measuring a stage duration when a profiler
+    or metrics are set
+    """
+
+    profiler = None
+    metrics = None
+
+    def _stage(self, name):
+        """
+        Returns a context manager measuring the stage duration
+
+        :param name: The name of the stage
+        :type name: str
+        :rtype: context manager
+        """
+        if self.metrics is not None:
+            return self._measure_stage(name)
+
+        if self.profiler is None:
+            return nullcontext()
+
+        return self.profiler.measure("stage", name)
+
+    @contextmanager
+    def _measure_stage(self, name):
+        """
+        Records the stage duration to the metrics and to the profiler, if any
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            duration = perf_counter() - start
+            self.metrics.observe(
+                "chopper_stage_duration_seconds", duration, (("stage", name),)
+            )
+
+            if self.profiler is not None:
+                self.profiler.record("stage", name, duration)
@@ -0,0 +1,163 @@
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+
+
+class Profiler:
+    """
+    Aggregates the cost of keep and discard Xpath expressions, CSS selectors
+    and extraction stages across documents
+    """
+
+    report_sort_keys = ("time", "calls", "mean", "match_rate")
+
+    def __init__(self, rules=True):
+        """
+        Inits the profiler
+
+        :param rules: Whether every keep and discard Xpath expression and CSS
+                      selector evaluation is timed, or only stages
+        :type rules: bool
+        """
+        self.rules = rules
+
+        # [total time, calls count, matching calls count] by (kind, expression)
+        self._stats = {}
+        self._lock = Lock()
+
+    def __getstate__(self):
+        """
+        Pickles the statistics without the lock, loaded profilers get their own
+        """
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    ##########
+    # Public #
+    ##########
+
+    def record(self, kind, expression, duration, matched=False):
+        """
+        Records a single evaluation
+
+        :param kind: The kind of expression (keep, discard, selector or stage)
+        :type kind: str
+        :param expression: The evaluated expression or stage name
+        :type expression: str
+        :param duration: The evaluation duration in seconds
+        :type duration: float
+        :param matched: Whether the evaluation had matches or not
+        :type matched: bool
+        """
+        with self._lock:
+            stats = self._stats.setdefault((kind, expression), [0.0, 0, 0])
+            stats[0] += duration
+            stats[1] += 1
+            stats[2] += bool(matched)
+
+    @contextmanager
+    def measure(self, kind, expression):
+        """
+        Records the duration of the managed block
+
+        :param kind: The kind of expression
+        :type kind: str
+        :param expression: The evaluated expression or stage name
+        :type expression: str
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(kind, expression, perf_counter() - start)
+
+    def merge(self, other):
+        """
+        Adds the statistics of another profiler, or of its report
+
+        :param other: The profiler or report to merge
+        :type other: Profiler or list of dict
+        """
+        report = other.report() if isinstance(other, Profiler) else other
+
+        with self._lock:
+            for row in report:
+                stats = self._stats.setdefault(
+                    (row["kind"], row["expression"]), [0.0, 0, 0]
+                )
+                stats[0] += row["time"]
+                stats[1] += row["calls"]
+                stats[2] += row["matches"]
+
+    def reset(self):
+        """
+        Removes every recorded statistic
+        """
+        with self._lock:
+            self._stats.clear()
+
+    def report(self, sort="time", kind=None, limit=None):
+        """
+        Returns the statistics of every expression, most expensive first
+
+        :param sort: The key to sort by: time, calls, mean or match_rate
+        :type sort: str
+        :param kind: Only report this kind of expressions
+        :type kind: str or None
+        :param limit: The maximum number of rows
+        :type limit: int or None
+        :returns: A dict by expression with kind, expression, time, calls,
+                  matches, mean and match_rate keys
+        :rtype: list of dict
+        """
+        assert sort in self.report_sort_keys
+
+        with self._lock:
+            items = list(self._stats.items())
+
+        rows = [
+            {
+                "kind": k,
+                "expression": expression,
+                "time": total,
+                "calls": calls,
+                "matches": matches,
+                "mean": total / calls,
+                "match_rate": matches / calls,
+            }
+            for (k, expression), (total, calls, matches) in items
+            if kind is None or k == kind
+        ]
+        rows.sort(key=lambda row: row[sort], reverse=True)
+
+        return rows[:limit]
+
+    def format_report(self, sort="time", kind=None, limit=20):
+        """
+        Returns the report as a text table
+
+        :returns: The formatted report
+        :rtype: str
+        """
+        lines = [
+            "%-9s %8s %10s %10s %7s  %s"
+            % ("kind", "calls", "total(s)", "mean(ms)", "match%", "expression")
+        ]
+        lines += [
+            "%-9s %8d %10.4f %10.4f %7.1f  %s"
+            % (
+                row["kind"],
+                row["calls"],
+                row["time"],
+                row["mean"] * 1000,
+                row["match_rate"] * 100,
+                row["expression"],
+            )
+            for row in self.report(sort=sort, kind=kind, limit=limit)
+        ]
+        return "\n".join(lines)
@@ -0,0 +1,227 @@
+from collections import OrderedDict
+from threading import Lock
+from urllib.parse import urlsplit
+
+
+class _PathNode:
+    """
+    A node of a path prefix index, by path segment
+    """
+
+    __slots__ = ("children", "route")
+
+    def __init__(self):
+        self.children = {}
+        self.route = None
+
+
+class _HostNode:
+    """
+    A node of the host trie, by host label from the top-level domain
+    """
+
+    __slots__ = ("children", "paths", "wildcard_paths")
+
+    def __init__(self):
+        self.children = {}
+
+        # Routes of the host itself, and of its subdomains (*.host)
+        self.paths = None
+        self.wildcard_paths = None
+
+
+class ExtractorRegistry:
+    """
+    Maps URL patterns to extractors, compiled on first use
+
+    Patterns are a host, optionally starting with a "*." wildcard matching
+    any subdomain or being "*" to match any host, followed by an optional
+    path prefix: "example.com", "*.example.com/blog", "*/amp". Path prefixes
+    match whole path segments, "/blog" matches "/blog/post" but not "/blogs".
+
+    A URL is routed to the most specific host, exact hosts first then the
+    longest wildcard, and to its longest path prefix. Less specific hosts
+    are tried when no path prefix of a host matches. Routing walks the host
+    labels and path segments once, whatever the number of patterns.
+
+    Registered factories are only called when a URL is first routed to them
+    and the latest used results are kept, least recently used ones are
+    compiled again when needed.
+    """
+
+    def __init__(self, maxsize=256):
+        """
+        Inits the registry
+
+        :param maxsize: The maximum number of compiled extractors to keep
+        :type maxsize: int
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._hosts = _HostNode()
+        self._factories = {}
+        self._compiled = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._factories)
+
+    ##########
+    # Public #
+    ##########
+
+    def register(self, pattern, factory):
+        """
+        Registers the extractor of a URL pattern, replacing any extractor
+        registered for the same pattern
+
+        :param pattern: The host and optional path prefix pattern
+        :type pattern: str
+        :param factory: A callable returning the extractor, called on first
+                        use, or an already built extractor
+        :type factory: callable or chopper.extractor.Extractor
+        """
+        host, _, path = pattern.split("://")[-1].partition("/")
+        labels = _host_labels(host)
+        wildcard = labels[-1:] == ["*"]
+
+        if wildcard:
+            labels.pop()
+
+        segments = _path_segments(path)
+
+        node = self._hosts
+
+        for label in labels:
+            node = node.children.setdefault(label, _HostNode())
+
+        attribute = "wildcard_paths" if wildcard else "paths"
+        paths = getattr(node, attribute)
+
+        if paths is None:
+            paths = _PathNode()
+            setattr(node, attribute, paths)
+
+        for segment in segments:
+            paths = paths.children.setdefault(segment, _PathNode())
+
+        # Equivalent patterns are the same route
+        route = paths.route = "/".join(
+            [".".join((["*"] if wildcard else []) + labels[::-1])] + segments
+        )
+
+        with self._lock:
+            self._factories[route] = factory
+            self._compiled.pop(route, None)
+
+    def resolve(self, url):
+        """
+        Returns the extractor of a URL, compiled if needed
+
+        :param url: The page URL
+        :type url: str
+        :returns: The extractor, None when no pattern matches the URL
+        :rtype: chopper.extractor.Extractor or None
+        """
+        route = self.route(url)
+
+        if route is None:
+            return None
+
+        with self._lock:
+            try:
+                extractor = self._compiled[route]
+            except KeyError:
+                factory = self._factories[route]
+                self.misses += 1
+            else:
+                self._compiled.move_to_end(route)
+                self.hits += 1
+                return extractor
+
+        # Compile outside the lock, other URLs are still resolved meanwhile
+        extractor = factory() if callable(factory) else factory
+
+        with self._lock:
+            self._compiled[route] = extractor
+
+            if len(self._compiled) > self.maxsize:
+                self._compiled.popitem(last=False)
+
+        return extractor
+
+    def route(self, url):
+        """
+        Returns the pattern a URL is routed to, normalized: lowercase host
+        without scheme, port nor trailing slashes
+
+        :param url: The page URL
+        :type url: str
+        :returns: The matching pattern, None when no pattern matches the URL
+        :rtype: str or None
+        """
+        parts = urlsplit(url if "//" in url else "//" + url)
+        labels = _host_labels(parts.hostname or "")
+
+        # Path indexes from the least to the most specific host
+        candidates = []
+        node = self._hosts
+
+        for index, label in enumerate(labels):
+            # A wildcard matches at least one more label
+            if node.wildcard_paths is not None:
+                candidates.append(node.wildcard_paths)
+
+            node = node.children.get(label)
+
+            if node is None:
+                break
+
+            if index == len(labels) - 1 and node.paths is not None:
+                candidates.append(node.paths)
+
+        segments = _path_segments(parts.path)
+
+        for paths in reversed(candidates):
+            route = paths.route
+
+            for segment in segments:
+                paths = paths.children.get(segment)
+
+                if paths is None:
+                    break
+
+                if paths.route is not None:
+                    route = paths.route
+
+            if route is not None:
+                return route
+
+        return None
+
+    def clear(self):
+        """
+        Removes every compiled extractor, patterns are kept
+        """
+        with self._lock:
+            self._compiled.clear()
+
+
+def _host_labels(host):
+    """
+    Returns the labels of a host from the top-level domain, without port
+    """
+    host = host.split(":")[0].lower().rstrip(".")
+
+    if not host:
+        return []
+
+    return host.split(".")[::-1]
+
+
+def _path_segments(path):
+    """
+    Returns the non-empty segments of a path
+    """
+    return [segment for segment in path.split("/") if segment]
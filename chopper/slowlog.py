@@ -0,0 +1,442 @@
+import json
+import os
+import shutil
+from collections import deque
+from contextlib import contextmanager
+from copy import copy, deepcopy
+from hashlib import sha256
+from threading import Lock
+from time import perf_counter, time
+
+from lxml import etree
+
+from .profiler import Profiler
+
+# Counts the elements of a tree in libxml2
+_count_nodes = etree.XPath("count(descendant-or-self::*)")
+
+
+class SlowLog:
+    """
+    Records documents whose extraction took longer than a threshold
+
+    Every document watched by the slow log has its stages timed on its own:
+    a slow document entry has its digest, sizes, node count and stages
+    durations. Timing every keep, discard and selector rule to report the
+    slowest ones is opt-in. The raw HTML and CSS contents of slow documents
+    can be captured to a directory, with their rules, to be replayed later,
+    see load_capture.
+
+    Trees are cleaned in place: their elements are counted beforehand, and
+    they are only copied when captured, their entries have no digest
+    otherwise. File objects are read by the extraction, seekable ones are
+    read again from their initial position for slow documents. Other file
+    objects, like pipes, can't be read again: their entries have no digest,
+    size nor node count and their contents are not captured.
+    """
+
+    def __init__(
+        self,
+        threshold,
+        capture_dir=None,
+        max_captures=100,
+        max_rules=10,
+        max_entries=100,
+        logger=None,
+        profile_rules=False,
+    ):
+        """
+        Inits the slow log
+
+        :param threshold: The duration in seconds from which a document is slow
+        :type threshold: float
+        :param capture_dir: The directory to capture slow documents contents to,
+                            None to not capture them
+        :type capture_dir: str or None
+        :param max_captures: The number of captures to keep, older ones are removed
+        :type max_captures: int
+        :param max_rules: The number of slowest rules in an entry
+        :type max_rules: int
+        :param max_entries: The number of latest entries kept in memory
+        :type max_entries: int
+        :param logger: An optional logger to log every slow document to
+        :type logger: logging.Logger or None
+        :param profile_rules: Whether to time every rule of every document to
+                              report the slowest rules of slow documents,
+                              stages are always timed
+        :type profile_rules: bool
+        """
+        self.threshold = threshold
+        self.capture_dir = capture_dir
+        self.max_captures = max_captures
+        self.max_rules = max_rules
+        self.logger = logger
+        self.profile_rules = profile_rules
+        self.entries = deque(maxlen=max_entries)
+        self._lock = Lock()
+
+    def __getstate__(self):
+        """
+        Entries are pickled without the lock
+        """
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    ##########
+    # Public #
+    ##########
+
+    @contextmanager
+    def watch(self, extractor, mode, html_contents, css_contents, base_url=None):
+        """
+        Returns a context manager giving a copy of the extractor profiling
+        the document on its own, the document is recorded if it's slow or
+        fails after the threshold
+
+        Rules are timed when the slow log profiles them, or when the
+        extractor profiler does anyway
+
+        :param extractor: The extractor processing the document
+        :type extractor: chopper.extractor.Extractor
+        :param mode: The extraction mode
+        :type mode: str
+        :param html_contents: The HTML contents
+        :type html_contents: str, bytes, os.PathLike, file object
+                             or lxml.html.HtmlElement
+        :param css_contents: The CSS contents
+        :type css_contents: str, text file object, Stylesheet or None
+        :param base_url: The base page URL
+        :type base_url: str or None
+        """
+        document = copy(extractor)
+        document.profiler = Profiler(
+            rules=self.profile_rules
+            or (extractor.profiler is not None and extractor.profiler.rules)
+        )
+        document.slow_log = None
+
+        # The extraction cleans trees and reads files, keep what's recorded
+        recorded_html = html_contents
+        nodes = None
+
+        if isinstance(html_contents, etree._Element):
+            nodes = int(_count_nodes(html_contents))
+            recorded_html = (
+                deepcopy(html_contents) if self.capture_dir is not None else None
+            )
+
+        html_position = _position(html_contents)
+        css_position = _position(css_contents)
+
+        error = None
+        start = perf_counter()
+
+        try:
+            yield document
+        except Exception as e:
+            error = "%s: %s" % (type(e).__name__, e)
+            raise
+        finally:
+            duration = perf_counter() - start
+
+            # The shared profiler still aggregates every document
+            if extractor.profiler is not None:
+                extractor.profiler.merge(document.profiler)
+
+            if duration >= self.threshold:
+                self.record(
+                    extractor,
+                    mode,
+                    duration,
+                    document.profiler,
+                    _read_again(recorded_html, html_position),
+                    _read_again(css_contents, css_position),
+                    base_url,
+                    error,
+                    nodes,
+                )
+
+    def record(
+        self,
+        extractor,
+        mode,
+        duration,
+        profiler,
+        html_contents,
+        css_contents,
+        base_url=None,
+        error=None,
+        nodes=None,
+    ):
+        """
+        Records a slow document
+
+        :param extractor: The extractor that processed the document
+        :type extractor: chopper.extractor.Extractor
+        :param mode: The extraction mode
+        :type mode: str
+        :param duration: The document duration in seconds
+        :type duration: float
+        :param profiler: The profiler of the document only
+        :type profiler: chopper.profiler.Profiler
+        :param html_contents: The HTML contents, None if they can't be recorded
+        :param css_contents: The CSS contents
+        :param base_url: The base page URL
+        :type base_url: str or None
+        :param error: The error raised by the extraction, if any
+        :type error: str or None
+        :param nodes: The number of elements of the HTML contents, counted
+                      from them when None
+        :type nodes: int or None
+        :returns: The slow document entry
+        :rtype: dict
+        """
+        # Unseekable files can't be read again
+        if hasattr(html_contents, "read"):
+            html_contents = None
+
+        html_data = _as_bytes(html_contents)
+        css_data = _as_bytes(css_contents)
+        digest = sha256(html_data + b"\0" + css_data).hexdigest()
+
+        if nodes is None and html_contents is not None:
+            nodes = _node_count(extractor, html_contents)
+
+        entry = {
+            "time": time(),
+            "mode": mode,
+            "duration": duration,
+            "digest": digest if html_contents is not None else None,
+            "html_size": _size(html_contents),
+            "css_size": _size(css_contents),
+            "nodes": nodes,
+            "stages": {
+                row["expression"]: row["time"] for row in profiler.report(kind="stage")
+            },
+            "slowest_rules": [
+                {k: row[k] for k in ("kind", "expression", "time", "calls", "matches")}
+                for row in profiler.report()
+                if row["kind"] != "stage"
+            ][: self.max_rules],
+            "error": error,
+            "capture": None,
+        }
+
+        if self.capture_dir is not None:
+            entry["capture"] = self._capture(
+                entry,
+                extractor,
+                html_contents,
+                css_contents,
+                html_data,
+                css_data,
+                base_url,
+            )
+
+        self.entries.append(entry)
+
+        if self.logger is not None:
+            self.logger.warning(
+                "Slow document %.12s: %.3fs, %d nodes, %s",
+                entry["digest"],
+                duration,
+                entry["nodes"] or 0,
+                ", ".join("%s %.3fs" % item for item in entry["stages"].items()),
+            )
+
+        return entry
+
+    ###########
+    # Private #
+    ###########
+
+    def _capture(
+        self,
+        entry,
+        extractor,
+        html_contents,
+        css_contents,
+        html_data,
+        css_data,
+        base_url,
+    ):
+        """
+        Saves the document contents and rules to a new capture directory,
+        removes the oldest captures over the maximum
+
+        :returns: The capture directory
+        :rtype: str
+        """
+        path = os.path.join(
+            self.capture_dir,
+            "%019d-%.12s" % (entry["time"] * 1e9, entry["digest"] or "unreadable"),
+        )
+        os.makedirs(path, exist_ok=True)
+
+        # Unseekable files and compiled stylesheets can't be captured
+        if html_contents is not None:
+            with open(os.path.join(path, "page.html"), "wb") as f:
+                f.write(html_data)
+
+        if isinstance(css_contents, (str, bytes)):
+            with open(os.path.join(path, "style.css"), "wb") as f:
+                f.write(css_data)
+
+        capture = dict(
+            entry,
+            keep=list(extractor._xpaths_to_keep),
+            discard=list(extractor._xpaths_to_discard),
+            base_url=base_url,
+            css_backend=_backend_name(extractor.css_backend),
+            capture=path,
+        )
+
+        with open(os.path.join(path, "entry.json"), "w") as f:
+            json.dump(capture, f, indent=2)
+
+        with self._lock:
+            captures = sorted(os.listdir(self.capture_dir))
+
+            for name in captures[: max(len(captures) - self.max_captures, 0)]:
+                shutil.rmtree(os.path.join(self.capture_dir, name), ignore_errors=True)
+
+        return path
+
+
+def load_capture(path):
+    """
+    Returns a captured slow document, to replay it
+
+    :param path: The capture directory
+    :type path: str
+    :returns: The entry, with keep, discard, base_url and css_backend keys,
+              and the html and css contents, None if not captured
+    :rtype: dict
+    """
+    with open(os.path.join(path, "entry.json")) as f:
+        capture = json.load(f)
+
+    try:
+        with open(os.path.join(path, "page.html"), "rb") as f:
+            capture["html"] = f.read()
+    except FileNotFoundError:
+        capture["html"] = None
+
+    try:
+        with open(os.path.join(path, "style.css"), encoding="utf-8") as f:
+            capture["css"] = f.read()
+    except FileNotFoundError:
+        capture["css"] = None
+
+    return capture
+
+
+def replay_capture(capture, extractor=None):
+    """
+    Extracts a captured slow document again
+
+    :param capture: The capture, see load_capture
+    :type capture: dict
+    :param extractor: The extractor to use, a new extractor with the capture
+                      CSS backend by default. The capture rules are added to it
+    :type extractor: chopper.extractor.Extractor or None
+    :returns: The extraction results
+    :rtype: str or tuple
+    """
+    from .extractor import Extractor
+
+    if extractor is None:
+        extractor = Extractor(css_backend=capture["css_backend"])
+
+    for xpath in capture["keep"]:
+        extractor.keep(xpath)
+
+    for xpath in capture["discard"]:
+        extractor.discard(xpath)
+
+    method = extractor.sanitize if capture["mode"] == "sanitize" else extractor.extract
+
+    return method(capture["html"], capture["css"], capture["base_url"])
+
+
+def _position(contents):
+    """
+    Returns the position of a seekable file object, None for other contents
+    """
+    if not hasattr(contents, "read"):
+        return None
+
+    try:
+        return contents.tell() if contents.seekable() else None
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _read_again(contents, position):
+    """
+    Returns the contents of a file object read again from a position,
+    other contents as is
+    """
+    if position is None:
+        return contents
+
+    contents.seek(position)
+    return contents.read()
+
+
+def _as_bytes(contents):
+    """
+    Returns contents as bytes, empty for missing contents and compiled stylesheets
+    """
+    if isinstance(contents, bytes):
+        return contents
+
+    if isinstance(contents, os.PathLike):
+        with open(contents, "rb") as f:
+            return f.read()
+
+    if isinstance(contents, str):
+        return contents.encode("utf-8", "surrogatepass")
+
+    if isinstance(contents, etree._Element):
+        return etree.tostring(contents, method="html", encoding="utf-8")
+
+    return b""
+
+
+def _size(contents):
+    """
+    Returns the size of contents, in characters for str, None without size
+    """
+    if isinstance(contents, (str, bytes)):
+        return len(contents)
+
+    if isinstance(contents, os.PathLike):
+        return os.path.getsize(contents)
+
+    return None
+
+
+def _node_count(extractor, html_contents):
+    """
+    Returns the number of elements of the parsed HTML contents,
+    None if they can't be parsed again
+    """
+    try:
+        tree = extractor._get_html_extractor(html_contents)._build_tree(html_contents)
+    except Exception:
+        return None
+
+    return int(_count_nodes(tree))
+
+
+def _backend_name(backend):
+    """
+    Returns the name of a CSS backend given by name or instance
+    """
+    return getattr(backend, "name", backend)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import tempfile
+from contextlib import redirect_stderr
+from io import StringIO
+from unittest import TestCase, mock
+
+from . import batch
+from .batch import BatchJob, shard_of
+from .cli import main
+from .extractor import Extractor
+
+HTML = "<html><body><p>%s</p><footer>F</footer></body></html>"
+
+
+def records(count=20):
+    return [{"id": "page-%d" % i, "html": HTML % i} for i in range(count)]
+
+
+class BatchJobTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.workdir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_results(self, job):
+        with open(job.output_path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_shard_of(self):
+        """
+        Tests shards are deterministic and spread records
+        """
+        self.assertEqual(shard_of("page-1", 4), shard_of("page-1", 4))
+        self.assertEqual({shard_of("page-%d" % i, 4) for i in range(100)}, {0, 1, 2, 3})
+
+    def test_shards_cover_records(self):
+        """
+        Tests every record is extracted by exactly one shard
+        """
+        extractor = Extractor.keep("//p")
+        ids = []
+
+        for shard in range(3):
+            job = BatchJob(extractor, self.workdir, shard=shard, num_shards=3)
+            state = job.run(records())
+
+            self.assertTrue(job.is_done())
+            self.assertFalse(os.path.exists(job.partial_path))
+            self.assertEqual(state["processed"], state["position"])
+            ids += [r["id"] for r in self.read_results(job)]
+
+        self.assertEqual(sorted(ids), sorted(r["id"] for r in records()))
+
+    def test_resume(self):
+        """
+        Tests a failed job resumes from its last checkpoint
+        """
+        extractor = Extractor.keep("//p")
+        job = BatchJob(extractor, self.workdir, checkpoint_every=5)
+        process_record = batch.process_record
+        calls = []
+
+        def crash_after_12(*args):
+            calls.append(args)
+            if len(calls) > 12:
+                raise KeyboardInterrupt
+            return process_record(*args)
+
+        with mock.patch.object(batch, "process_record", crash_after_12):
+            with self.assertRaises(KeyboardInterrupt):
+                job.run(records())
+
+        self.assertFalse(job.is_done())
+
+        state = BatchJob(extractor, self.workdir, checkpoint_every=5).run(records())
+
+        self.assertEqual(state["position"], 20)
+        self.assertEqual(state["processed"], 10)
+        self.assertEqual(
+            self.read_results(job),
+            [
+                {"id": "page-%d" % i, "html": "<html><body><p>%d</p></body></html>" % i}
+                for i in range(20)
+            ],
+        )
+
+        # A done shard is skipped
+        state = BatchJob(extractor, self.workdir).run(records())
+        self.assertEqual((state["position"], state["processed"]), (20, 0))
+
+    def test_lost_partial_output(self):
+        """
+        Tests a shard starts over when its partial output lost checkpointed results
+        """
+        extractor = Extractor.keep("//p")
+        job = BatchJob(extractor, self.workdir, checkpoint_every=5)
+
+        with mock.patch.object(batch, "process_record", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                job.run(records())
+
+        for truncate in (True, False):
+            state = {"position": 10, "output_size": 100, "processed": 10, "errors": 0}
+            batch._write_atomic(job.checkpoint_path, json.dumps(state))
+
+            if truncate:
+                with open(job.partial_path, "r+b") as f:
+                    f.truncate(40)
+            elif os.path.exists(job.partial_path):
+                os.remove(job.partial_path)
+
+            with mock.patch.object(
+                batch, "process_record", side_effect=KeyboardInterrupt
+            ):
+                with self.assertRaises(KeyboardInterrupt):
+                    job.run(records())
+
+            self.assertEqual(os.path.getsize(job.partial_path), 0)
+
+        state = job.run(records())
+
+        self.assertEqual((state["position"], state["processed"]), (20, 20))
+        self.assertEqual(
+            [r["id"] for r in self.read_results(job)], [r["id"] for r in records()]
+        )
+
+    def test_cli_batch_job(self):
+        """
+        Tests running a shard from the command line
+        """
+        path = os.path.join(self.workdir, "records.jsonl")
+        with open(path, "w") as f:
+            for record in records(4) + [{"id": "bad"}]:
+                f.write(json.dumps(record) + "\n")
+
+        with redirect_stderr(StringIO()) as err:
+            status = main(
+                [path, "-k", "//p", "--workdir", self.workdir, "--shard", "0/1"]
+            )
+
+        self.assertEqual(status, 1)
+        self.assertIn("shard 0/1: 5 documents done (1 errors)", err.getvalue())
+        self.assertEqual(len(self.read_results(BatchJob(None, self.workdir))), 5)
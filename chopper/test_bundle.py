@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+from .bundle import MAGIC, load_bundle, save_bundle
+from .cache import TemplateCache
+from .css.extractor import CSSExtractor
+from .exceptions import BundleError
+from .extractor import Extractor
+
+TEST_CSS = """
+@media print { p { color: black; } }
+div, .x { color: red; }
+a:hover { color: blue; }
+"""
+
+TEST_HTML = """<div><p class="x">A</p><a href="b.html">B</a><span>C</span></div>"""
+
+
+class BundleTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "site.bundle")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save_and_load(self):
+        """
+        Tests loaded extractors and stylesheets give the same results
+        """
+        extractor = Extractor(template_cache=TemplateCache()).keep("//p").keep("//a")
+        extractor.discard("//span")
+
+        for backend in ("tinycss", "tinycss2"):
+            stylesheet = CSSExtractor.compile(TEST_CSS, backend, translate=True)
+            expected = extractor.extract(TEST_HTML, stylesheet, base_url="http://t/")
+
+            save_bundle(self.path, {"extractor": extractor, "css": stylesheet})
+            bundle = load_bundle(self.path)
+
+            # Selectors translations are saved with the stylesheet
+            self.assertEqual(bundle["css"].xpaths, stylesheet.xpaths)
+            self.assertIs(bundle["css"].backend, stylesheet.backend)
+
+            loaded = bundle["extractor"]
+            self.assertEqual(
+                loaded.extract(TEST_HTML, bundle["css"], base_url="http://t/"), expected
+            )
+            self.assertEqual(loaded.keep("//b")._xpaths_to_keep, ["//p", "//a", "//b"])
+
+    def test_version_mismatch(self):
+        """
+        Tests files from other versions and other formats are refused
+        """
+        save_bundle(self.path, {"css": CSSExtractor.compile(TEST_CSS)})
+
+        with open(self.path, "rb") as f:
+            contents = f.read()
+
+        with open(self.path, "wb") as f:
+            f.write(contents.replace(MAGIC + b"1 ", MAGIC + b"0 ", 1))
+
+        with self.assertRaisesRegex(BundleError, "another chopper version"):
+            load_bundle(self.path)
+
+        with open(self.path, "wb") as f:
+            f.write(b"not a bundle")
+
+        with self.assertRaisesRegex(BundleError, "not a chopper bundle"):
+            load_bundle(self.path)
+
+    def test_lazy_imports(self):
+        """
+        Tests the CSS stack is only imported when CSS contents are cleaned
+        """
+        code = (
+            "import sys\n"
+            "from chopper.extractor import Extractor\n"
+            "Extractor.keep('//p').extract('<div><p>A</p></div>')\n"
+            "print(any(m.split('.')[0] in ('cssselect', 'tinycss', 'tinycss2')"
+            " or m.startswith('chopper.css') for m in sys.modules))\n"
+        )
+        output = subprocess.check_output(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        self.assertEqual(output.strip(), b"False")
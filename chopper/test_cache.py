@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from .cache import TemplateCache
+from .extractor import Extractor
+
+PAGE_HTML = """
+<html>
+    <body>
+        <div id="main"><p class="text">%s</p><a href="%s">Link</a></div>
+        <footer>Footer</footer>
+    </body>
+</html>
+"""
+
+PAGE_CSS = """
+p.text { color: red; }
+footer { color: blue; }
+a[href] { color: green; }
+"""
+
+
+class TemplateCacheTestCase(TestCase):
+    def test_same_template_hits(self):
+        """
+        Tests pages sharing a skeleton share their matches
+        """
+        cache = TemplateCache()
+        extractor = Extractor(template_cache=cache).keep('//div[@id="main"]')
+
+        first = extractor.extract(PAGE_HTML % ("First", "/1"), PAGE_CSS)
+        second = extractor.extract(PAGE_HTML % ("Second", "/2"), PAGE_CSS)
+
+        self.assertEqual(
+            first,
+            Extractor.keep('//div[@id="main"]').extract(
+                PAGE_HTML % ("First", "/1"), PAGE_CSS
+            ),
+        )
+        self.assertIn("Second", second[0])
+        self.assertEqual(second[1], first[1])
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def test_selectors_cache(self):
+        """
+        Tests only skeleton selectors matches are cached
+        """
+        cache = TemplateCache()
+        Extractor(template_cache=cache).keep("//p").extract(
+            PAGE_HTML % ("", ""), PAGE_CSS
+        )
+
+        templates = list(cache._templates.values())
+        self.assertEqual(templates[1].selectors, {"p.text": True, "footer": False})
+
+    def test_uncacheable_rules(self):
+        """
+        Tests rules using attributes or texts are always evaluated
+        """
+        cache = TemplateCache()
+        extractor = Extractor(template_cache=cache).keep('//a[@href="/1"]')
+
+        self.assertIsNotNone(extractor.extract(PAGE_HTML % ("", "/1")))
+        self.assertIsNone(extractor.extract(PAGE_HTML % ("", "/2")))
+
+        self.assertFalse(
+            cache.can_cache_xpaths(["//p[text()='a']", "//p[contains(., 'a')]"])
+        )
+        self.assertTrue(
+            cache.can_cache_xpaths(["//div[@id='a']/p[contains(@class, 'b')][2]"])
+        )
+
+        # Texts and other attributes can be read without naming them
+        texts = PAGE_HTML % ("Text", "/1"), PAGE_HTML % ("", "/1")
+        links = (
+            "<html><body><div><a href='/1'>Link</a></div></body></html>",
+            "<html><body><div><a>Link</a></div></body></html>",
+        )
+
+        for xpath, pages in (
+            ("//p[normalize-space()]", texts),
+            ("//p[node()]", texts),
+            ("//p[count(child::node())>0]", texts),
+            ("//a[attribute::href]", links),
+            ("//*[@*='/1']", links),
+        ):
+            self.assertFalse(cache.can_cache_xpaths([xpath]), xpath)
+
+            extractor = Extractor(template_cache=cache).keep(xpath)
+            self.assertIsNotNone(extractor.extract(pages[0]), xpath)
+            self.assertIsNone(extractor.extract(pages[1]), xpath)
+
+        for xpath in ("//p[@class][. = 'Text']", "//p[$name]"):
+            self.assertFalse(cache.can_cache_xpaths([xpath]), xpath)
+
+        # Elements string values are their texts
+        for xpath in (
+            "//div[p='First']",
+            "//div[contains(p, 'x')]",
+            "//div[string(..)='x']",
+            "//div[normalize-space(*)='x']",
+            "//div[string-length(p)>3]",
+            "//div[p + 1 > 0]",
+            "//div[(p | a)='x']",
+            "//div[/='x']",
+        ):
+            self.assertFalse(cache.can_cache_xpaths([xpath]), xpath)
+
+        # Id and class values, positions and translated selectors are cached
+        for xpath in (
+            "//div[@id='main' or @class='a']/*[position() mod 2 = 1]",
+            "descendant-or-self::*/@class[contains(concat(' ', normalize-space(.), ' '), ' text ')]/parent::p",
+            Extractor.keep_css("div > p.text:first-child")._xpaths_to_keep[0],
+            "//div[p and not(footer)][count(*) > 1]/*[name() = 'p']",
+            "//div[p/@class = 'text']/..",
+        ):
+            self.assertTrue(cache.can_cache_xpaths([xpath]), xpath)
+
+    def test_same_skeleton_texts(self):
+        """
+        Tests rules reading texts give each page its own matches
+        """
+        cache = TemplateCache()
+        extractor = Extractor(template_cache=cache).keep("//div[p='First']")
+
+        self.assertIsNotNone(extractor.extract(PAGE_HTML % ("First", "/1")))
+        self.assertIsNone(extractor.extract(PAGE_HTML % ("Second", "/1")))
+        self.assertIsNotNone(extractor.extract(PAGE_HTML % ("First", "/2")))
+
+    def test_different_templates(self):
+        """
+        Tests pages with different skeletons don't share their matches
+        """
+        cache = TemplateCache(maxsize=1)
+        extractor = Extractor(template_cache=cache).keep("//footer")
+
+        extractor.extract(PAGE_HTML % ("", ""))
+        html = extractor.extract(
+            "<html><body><div><footer>Other</footer></div></body></html>"
+        )
+
+        self.assertEqual(
+            html, "<html><body><div><footer>Other</footer></div></body></html>"
+        )
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        self.assertEqual(len(cache._templates), 1)
+
+        cache.clear()
+        self.assertEqual(len(cache._templates), 0)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from unittest import TestCase
+
+from . import cli
+from .cli import main
+
+HTML = "<html><body><div><p>%s</p><a href='/x'>Link</a></div><footer>F</footer></body></html>"
+CSS = "p { color: red; } footer { color: blue; }"
+
+
+class CLITestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.pages = os.path.join(self.dir, "pages")
+        os.makedirs(self.pages)
+
+        for i in range(3):
+            with open(os.path.join(self.pages, "page%d.html" % i), "w") as f:
+                f.write(HTML % i)
+
+        self.css = os.path.join(self.dir, "style.css")
+        with open(self.css, "w") as f:
+            f.write(CSS)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_main(self, *argv):
+        stdout, stderr = StringIO(), StringIO()
+
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            status = main(list(argv))
+
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def test_directory_to_jsonl(self):
+        """
+        Tests extracting a directory to JSON lines with a summary
+        """
+        status, out, err = self.run_main(
+            self.pages, "-k", "//p", "--css", self.css, "--base-url", "http://a.com/"
+        )
+        results = [json.loads(line) for line in out.splitlines()]
+
+        self.assertEqual(status, 0)
+        self.assertEqual(
+            [r["html"] for r in results],
+            ["<html><body><div><p>%d</p></div></body></html>" % i for i in range(3)],
+        )
+        self.assertEqual({r["css"] for r in results}, {"p{color:red;}"})
+        self.assertIn("3 documents (0 errors)", err)
+        self.assertIn("html.clean", err)
+
+        # Only stages are timed, not every rule and selector
+        self.assertFalse(cli._worker[1].rules)
+
+    def test_jsonl_rules_file_and_workers(self):
+        """
+        Tests JSON lines input, rules file and worker processes
+        """
+        rules = os.path.join(self.dir, "rules.json")
+        with open(rules, "w") as f:
+            json.dump({"keep": ["//div"], "discard": ["//p"]}, f)
+
+        records = os.path.join(self.dir, "records.jsonl")
+        with open(records, "w") as f:
+            for i in range(5):
+                f.write(
+                    json.dumps({"id": i, "html": HTML % i, "base_url": "http://a.com/"})
+                    + "\n"
+                )
+            f.write(json.dumps({"id": "bad"}) + "\n")
+
+        output = os.path.join(self.dir, "out.jsonl")
+        status, _, err = self.run_main(records, "-r", rules, "-w", "2", "-o", output)
+
+        with open(output) as f:
+            results = [json.loads(line) for line in f]
+
+        self.assertEqual(status, 1)
+        self.assertEqual([r["id"] for r in results], [0, 1, 2, 3, 4, "bad"])
+        self.assertEqual(
+            results[0]["html"],
+            '<html><body><div><a href="http://a.com/x">Link</a></div></body></html>',
+        )
+        self.assertTrue(results[-1]["error"].startswith("KeyError"))
+        self.assertIn("6 documents (1 errors)", err)
+
+    def test_output_dir_and_modes(self):
+        """
+        Tests writing results as files, sanitize and fragments modes
+        """
+        output_dir = os.path.join(self.dir, "out")
+        pattern = os.path.join(self.pages, "page0.*")
+
+        self.run_main(
+            pattern,
+            "-m",
+            "sanitize",
+            "-d",
+            "//div",
+            "--css",
+            self.css,
+            "--output-dir",
+            output_dir,
+            "-q",
+        )
+        page = os.path.join(self.pages, "page0").replace(os.sep, "_").strip("._")
+        name = os.path.join(output_dir, page)
+
+        with open(name + ".html") as f:
+            self.assertEqual(f.read(), "<html><body><footer>F</footer></body></html>")
+        with open(name + ".css") as f:
+            self.assertEqual(f.read(), "footer{color:blue;}")
+
+        status, out, err = self.run_main(
+            pattern, "-m", "fragments", "-k", "//p", "-k", "//footer", "-q"
+        )
+        self.assertEqual(
+            json.loads(out)["fragments"], ["<p>0</p>", "<footer>F</footer>"]
+        )
+        self.assertEqual(err, "")
+
+    def test_output_dir_collisions(self):
+        """
+        Tests results whose ids map to the same file name are all written
+        """
+        output_dir = os.path.join(self.dir, "out")
+        records = os.path.join(self.dir, "records.jsonl")
+
+        with open(records, "w") as f:
+            for i, result_id in enumerate(["pages/a.html", "pages_a.html", "a.htm"]):
+                f.write(json.dumps({"id": result_id, "html": HTML % i}) + "\n")
+
+        self.run_main(records, "-k", "//p", "--output-dir", output_dir, "-q")
+
+        contents = set()
+        for name in os.listdir(output_dir):
+            with open(os.path.join(output_dir, name)) as f:
+                contents.add(f.read())
+
+        self.assertEqual(
+            contents,
+            {"<html><body><div><p>%d</p></div></body></html>" % i for i in range(3)},
+        )
+
+        with open(records, "a") as f:
+            f.write(json.dumps({"id": "a.htm", "html": HTML % 3}) + "\n")
+
+        with self.assertRaises(ValueError):
+            self.run_main(records, "-k", "//p", "--output-dir", output_dir, "-q")
+
+    def test_utf8_pages(self):
+        """
+        Tests pages read from paths are decoded as UTF-8 by default
+        """
+        with open(os.path.join(self.pages, "page0.html"), "w", encoding="utf-8") as f:
+            f.write(HTML % "café")
+
+        status, out, _ = self.run_main(
+            os.path.join(self.pages, "page0.html"), "-k", "//p", "-q"
+        )
+        self.assertEqual(
+            json.loads(out)["html"],
+            "<html><body><div><p>caf&#233;</p></div></body></html>",
+        )
+
+    def test_workers_with_workdir(self):
+        """
+        Tests worker processes are refused for resumable batch jobs
+        """
+        with self.assertRaises(SystemExit):
+            with redirect_stderr(StringIO()):
+                main([self.pages, "-k", "//p", "--workdir", self.dir, "-w", "2"])
+
+    def test_keep_required(self):
+        """
+        Tests extraction without keep rules is refused
+        """
+        with self.assertRaises(SystemExit):
+            with redirect_stderr(StringIO()):
+                main([self.pages])
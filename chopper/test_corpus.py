@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import json
+from unittest import TestCase
+
+from .corpus import Corpus, ranges_from_ids, rebuild_css
+from .css.optimizer import CSSOptimizer
+from .extractor import Extractor
+
+TEST_CSS = """
+a { color: red; }
+p, span { margin: 0; }
+.x { background: url(img.png); }
+@media print { p { color: black; } }
+b { font-weight: bold; }
+.y { color: blue; }
+"""
+
+TEST_PAGES = [
+    """<div><p class="x">A</p></div>""",
+    """<div><span class="y">B</span><b>C</b></div>""",
+    """<div><p>D</p><a href="e.html">E</a></div>""",
+    """<span>Nothing</span>""",
+]
+
+
+class CorpusTestCase(TestCase):
+    def test_ranges_from_ids(self):
+        """
+        Tests consecutive ids are grouped in ranges
+        """
+        self.assertEqual(ranges_from_ids([]), [])
+        self.assertEqual(ranges_from_ids([0, 1, 2, 5, 3, 4]), [[0, 3], [5, 6], [3, 5]])
+
+    def test_corpus(self):
+        """
+        Tests pages reference shared rules and their CSS can be rebuilt
+        """
+        extractor = Extractor.keep("//div")
+        corpus = Corpus(extractor, TEST_CSS, css_base_url="http://test.com/")
+        results = [corpus.add(page, base_url="http://test.com/") for page in TEST_PAGES]
+
+        self.assertEqual(
+            [refs for _, refs in results],
+            [[[0, 3]], [[3, 4], [2, 3], [4, 6]], [[6, 7], [0, 1], [2, 3]], []],
+        )
+        self.assertEqual(results[3], (None, []))
+
+        # Rebuilt CSS is the CSS of the page
+        for page, (html, refs) in zip(TEST_PAGES[:3], results):
+            expected_html, expected_css = extractor.extract(
+                page, TEST_CSS, base_url="http://test.com/"
+            )
+            self.assertEqual(html, expected_html)
+            self.assertEqual(corpus.rebuild(refs), expected_css)
+
+        # Stored rules are enough to rebuild pages CSS
+        rules = json.loads(json.dumps(corpus.rules))
+        self.assertEqual(
+            rebuild_css(rules, results[1][1]), corpus.rebuild(results[1][1])
+        )
+
+        # Shared rules are in source order with every kept selector
+        self.assertEqual(
+            corpus.to_string(),
+            "a{color:red;}\n"
+            "p,span{margin:0;}\n"
+            ".x{background:url('http://test.com/img.png');}\n"
+            "@media print{p{color:black;}}\n"
+            "b{font-weight:bold;}\n"
+            ".y{color:blue;}",
+        )
+
+    def test_corpus_optimizer(self):
+        """
+        Tests pages CSS is rebuilt as extracted with a CSS optimizer
+        """
+        css = (
+            "p { color: red; }\np { color: blue; }\np { margin: 0; }\na { color: red; }"
+        )
+        pages = ["<div><p>A</p></div>", "<div><a>B</a><p>C</p></div>"]
+
+        extractor = Extractor(css_optimizer=CSSOptimizer()).keep("//div")
+        corpus = Corpus(extractor, css)
+
+        for page in pages:
+            _, refs = corpus.add(page)
+            self.assertEqual(corpus.rebuild(refs), extractor.extract(page, css)[1])
+
+        self.assertEqual(corpus.rules, ["p{color:blue;margin:0;}", "a{color:red;}"])
+        self.assertEqual(corpus.to_string(), "p{color:blue;margin:0;}\na{color:red;}")
@@ -1,7 +1,17 @@
 # -*- coding: utf-8 -*-
-from unittest import TestCase
+import codecs
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from unittest import TestCase, mock
 
-from .extractor import Extractor
+from lxml import etree, html as lxml_html
+
+from .exceptions import DocumentTooLarge
+from .extractor import Extractor, MultiExtractor
+from .html.parser import HTMLParserOptions
+from .limits import Deadline, Limits
+from .profiler import Profiler
 
 TEST_HTML = """
 <html>
@@ -152,6 +162,29 @@ class ExtractorTestCase(TestCase):
 
         self.assertEqual(self.format_output(html), expected_html)
 
+    def test_css_rules(self):
+        """
+        Tests keep and discard rules written as CSS selectors
+        """
+        extractor = Extractor.keep_css("div#main > a, footer").discard_css("em, span")
+        expected = (
+            Extractor()
+            .keep('//div[@id="main"]/a')
+            .keep("//footer")
+            .discard("//em")
+            .discard("//span")
+            .extract(TEST_HTML, TEST_CSS)
+        )
+
+        self.assertEqual(extractor.extract(TEST_HTML, TEST_CSS), expected)
+
+        # Plain id and class lookups
+        html = Extractor().keep_css("#main").discard_css(".cls1").extract(TEST_HTML)
+        self.assertEqual(
+            self.format_output(html),
+            """<html><body><div id="main"><a href="test">Test <em>Link</em></a></div></body></html>""",
+        )
+
     def test_rel_to_abs(self):
         """
         Tests the rel_to_abs feature
@@ -499,3 +532,408 @@ class ExtractorTestCase(TestCase):
         expected_css = """.need{color:blue;background-color:red !important;}"""
 
         self.assertEqual(self.format_output(css), expected_css)
+
+    def test_extract_fragments(self):
+        """
+        Tests fragments are extracted in document order without ancestors
+        """
+        extractor = Extractor.keep("//footer").keep("//a").discard("//em")
+        fragments = extractor.extract_fragments(TEST_HTML)
+
+        self.assertEqual(
+            fragments,
+            [
+                """<a href="test">Test Link</a>""",
+                """<a href="test">Test </a>""",
+                """<footer>I am the <span>footer</span></footer>""",
+            ],
+        )
+
+    def test_extract_fragments_nested_keep(self):
+        """
+        Tests keep matches nested in another fragment are not duplicated
+        """
+        extractor = Extractor.keep('//div[@id="main"]').keep("//em")
+        fragments = extractor.extract_fragments(
+            TEST_HTML, base_url="http://test.com/dir/"
+        )
+
+        self.assertEqual(
+            fragments,
+            [
+                """<div id="main">\n            <a href="http://test.com/dir/test">Test <em>Link</em></a>\n        </div>"""
+            ],
+        )
+
+    def test_extract_fragments_no_matches(self):
+        """
+        Tests fragments extraction without keep matches
+        """
+        extractor = Extractor.keep("//section")
+
+        self.assertEqual(extractor.extract_fragments(TEST_HTML), [])
+
+    def test_extract_fragments_discarded_ancestor(self):
+        """
+        Tests keep matches inside a discarded element are dropped
+        """
+        extractor = Extractor.keep("//strong").keep("//footer").discard("//p")
+
+        self.assertEqual(
+            extractor.extract_fragments(TEST_HTML),
+            ["""<footer>I am the <span>footer</span></footer>"""],
+        )
+
+    def test_multi_extractor(self):
+        """
+        Tests several extractors applied to one parsed document
+        """
+        extractors = [
+            Extractor.keep("//footer").discard("//span"),
+            Extractor.keep("//strong"),
+            Extractor.keep("//section"),
+            Extractor.keep("//footer").discard("//span"),
+        ]
+        results = MultiExtractor(extractors).extract(TEST_HTML, TEST_CSS)
+
+        self.assertEqual(len(results), 4)
+        for extractor, result in zip(extractors, results):
+            self.assertEqual(result, extractor.extract(TEST_HTML, TEST_CSS))
+
+        self.assertEqual(results[2], (None, None))
+
+        # Precompiled stylesheets are not parsed again
+        stylesheet = Extractor.css_extractor.compile(TEST_CSS)
+        self.assertEqual(
+            MultiExtractor(extractors).extract(TEST_HTML, stylesheet), results
+        )
+
+    def test_multi_extractor_limits(self):
+        """
+        Tests cleaned CSS is only shared by extractors with the same limits
+        """
+        extractors = [
+            Extractor(limits=Limits(timeout=-1, degrade=True)).keep("//footer"),
+            Extractor.keep("//footer"),
+        ]
+
+        # Only the CSS cleaning of the first extractor is out of time
+        with mock.patch.object(Deadline, "check"):
+            results = MultiExtractor(extractors).extract(TEST_HTML, TEST_CSS)
+
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertNotEqual(results[0][1], results[1][1])
+        self.assertEqual(results[1], extractors[1].extract(TEST_HTML, TEST_CSS))
+
+    def test_multi_extractor_html_only(self):
+        """
+        Tests several extractors applied to HTML contents only
+        """
+        results = MultiExtractor(
+            [Extractor.keep("//em"), Extractor.keep("//footer")]
+        ).extract(TEST_HTML, base_url="http://test.com/")
+
+        self.assertEqual(
+            [self.format_output(html) for html in results],
+            [
+                """<html><body><div id="main"><a href="http://test.com/test">Test <em>Link</em></a></div></body></html>""",
+                """<html><body><footer>I am the <span>footer</span></footer></body></html>""",
+            ],
+        )
+
+    def test_compiled_stylesheet_is_not_altered(self):
+        """
+        Tests a compiled stylesheet can be cleaned against several documents
+        """
+        stylesheet = Extractor.css_extractor.compile("a, footer { color: red; }")
+
+        _, css = Extractor.keep("//footer").extract(TEST_HTML, stylesheet)
+        self.assertEqual(css, "footer{color:red;}")
+
+        _, css = Extractor.keep("//a").extract(TEST_HTML, stylesheet)
+        self.assertEqual(css, "a{color:red;}")
+
+    def test_sanitize(self):
+        """
+        Tests discard only sanitizing
+        """
+        extractor = Extractor.discard("//head").discard("//div").discard("//p")
+        html, css = extractor.sanitize(TEST_HTML, TEST_CSS)
+
+        expected_html = """<html><body><footer>I am the <span>footer</span></footer></body></html>"""
+        expected_css = """footer{color:blue;}span{color:red;}"""
+
+        self.assertEqual(self.format_output(html), expected_html)
+        self.assertEqual(self.format_output(css), expected_css)
+
+    def test_sanitize_ignores_keep(self):
+        """
+        Tests sanitizing doesn't use keep rules
+        """
+        extractor = Extractor.keep("//section").discard("//footer//span")
+        html = extractor.sanitize(
+            "<html><body><p><a href='a'>A</a></p><footer><span>B</span></footer></body></html>",
+            base_url="http://test.com/",
+        )
+
+        expected_html = """<html><body><p><a href="http://test.com/a">A</a></p><footer></footer></body></html>"""
+        self.assertEqual(html, expected_html)
+
+    def test_sanitize_discarded_root(self):
+        """
+        Tests sanitizing when the root element is discarded
+        """
+        self.assertIsNone(Extractor.discard("//html").sanitize(TEST_HTML))
+        self.assertEqual(
+            Extractor.discard("//html").sanitize(TEST_HTML, TEST_CSS), (None, None)
+        )
+
+    def test_parser_options(self):
+        """
+        Tests configured HTML parsers
+        """
+        input_html = (
+            """<html><body><!-- comment --><?php echo 1 ?><p>Text</p></body></html>"""
+        )
+        options = HTMLParserOptions(remove_comments=True, remove_pis=True)
+
+        html = Extractor(parser_options=options).keep("//p").extract(input_html)
+        self.assertEqual(html, """<html><body><p>Text</p></body></html>""")
+
+        # Parsers are pooled per thread
+        self.assertIs(
+            options.get_parser(),
+            HTMLParserOptions(remove_pis=True, remove_comments=True).get_parser(),
+        )
+        self.assertIsNot(options.get_parser(), HTMLParserOptions().get_parser())
+
+    def test_parser_modes(self):
+        """
+        Tests document and fragment parsing modes
+        """
+        document = HTMLParserOptions(mode="document")
+        html = Extractor(parser_options=document).keep("//p").extract("<p>Text</p>")
+        self.assertEqual(html, "<html><body><p>Text</p></body></html>")
+
+        fragment = HTMLParserOptions(mode="fragment")
+        html = Extractor(parser_options=fragment).keep("//p").extract("<p>Text</p>")
+        self.assertEqual(html, "<p>Text</p>")
+
+        html = (
+            Extractor(parser_options=fragment)
+            .keep("//p")
+            .extract("<p>A</p><span>B</span>")
+        )
+        self.assertEqual(html, "<div><p>A</p></div>")
+
+        # Fragments are parsed once
+        with mock.patch.object(
+            lxml_html, "document_fromstring", wraps=lxml_html.document_fromstring
+        ) as document_fromstring:
+            tree = fragment.build_tree("<p>A</p>text<span>B</span>")
+
+        self.assertEqual(document_fromstring.call_count, 1)
+        self.assertEqual(etree.tostring(tree), b"<div><p>A</p>text<span>B</span></div>")
+
+        results = MultiExtractor(
+            [Extractor.keep("//p")], parser_options=document
+        ).extract("<p>A</p>")
+        self.assertEqual(results, ["<html><body><p>A</p></body></html>"])
+
+    def test_file_inputs(self):
+        """
+        Tests HTML read from file paths and binary file objects
+        """
+        extractor = Extractor.keep('//div[@id="main"]')
+        expected = extractor.extract(TEST_HTML, TEST_CSS, base_url="http://test.com/")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "page.html"
+            path.write_bytes(TEST_HTML.encode("utf-8"))
+
+            with open(path, "rb") as f:
+                for html_file in (path, f, BytesIO(TEST_HTML.encode("utf-8"))):
+                    self.assertEqual(
+                        extractor.extract(
+                            html_file, TEST_CSS, base_url="http://test.com/"
+                        ),
+                        expected,
+                    )
+
+            # Files parse to the same trees as their contents, in every mode,
+            # decoded as UTF-8 unless a byte order mark says otherwise
+            for contents in ("<p>Café</p>", "<p>A</p><span>é</span>", "A <b>ü</b>"):
+                for data in (
+                    contents.encode("utf-8"),
+                    codecs.BOM_UTF8 + contents.encode("utf-8"),
+                    codecs.BOM_UTF16_LE + contents.encode("utf-16-le"),
+                ):
+                    path.write_bytes(data)
+
+                    for mode in HTMLParserOptions.modes:
+                        options = HTMLParserOptions(mode=mode)
+                        expected_tree = etree.tostring(options.build_tree(contents))
+
+                        for html_file in (path, BytesIO(data)):
+                            self.assertEqual(
+                                etree.tostring(options.build_tree(html_file)),
+                                expected_tree,
+                            )
+
+            # Declared charsets are honoured
+            path.write_bytes("<meta charset='latin-1'><p>Café</p>".encode("latin-1"))
+            self.assertEqual(
+                Extractor.keep("//p").extract(path),
+                Extractor.keep("//p").extract("<meta charset='latin-1'><p>Café</p>"),
+            )
+
+            path.write_bytes(b"")
+            self.assertRaises(etree.ParserError, extractor.extract, path)
+
+            path.write_text(TEST_HTML)
+            self.assertRaises(
+                DocumentTooLarge, Extractor(limits=Limits(max_bytes=100)).extract, path
+            )
+
+    def test_output_sinks(self):
+        """
+        Tests cleaned contents are written to binary sinks
+        """
+        extractor = Extractor.keep('//div[@id="main"]')
+        expected_html, expected_css = extractor.extract(
+            TEST_HTML, TEST_CSS, base_url="http://test.com/"
+        )
+
+        html_sink, css_sink = BytesIO(), BytesIO()
+        result = extractor.extract(
+            TEST_HTML,
+            TEST_CSS,
+            base_url="http://test.com/",
+            html_sink=html_sink,
+            css_sink=css_sink,
+        )
+
+        self.assertEqual(result, (None, None))
+        self.assertEqual(html_sink.getvalue().decode("utf-8"), expected_html)
+        self.assertEqual(css_sink.getvalue().decode("utf-8"), expected_css)
+
+        # Only HTML is written to a sink
+        html_sink = BytesIO()
+        result = extractor.extract(TEST_HTML, TEST_CSS, html_sink=html_sink)
+        self.assertEqual(result, (None, extractor.extract(TEST_HTML, TEST_CSS)[1]))
+
+        # Sanitized contents are written as UTF-8
+        html_sink = BytesIO()
+        result = Extractor.discard("//span").sanitize(
+            "<p>Café<span>x</span></p>", html_sink=html_sink
+        )
+        self.assertIsNone(result)
+        self.assertEqual(html_sink.getvalue(), "<p>Café</p>".encode("utf-8"))
+
+        # Nothing is written without matches
+        html_sink = BytesIO()
+        extractor = Extractor.keep("//nothing")
+        self.assertIsNone(extractor.extract(TEST_HTML, html_sink=html_sink))
+        self.assertEqual(html_sink.getvalue(), b"")
+
+    def test_extract_inline(self):
+        """
+        Tests matched CSS declarations are applied as inline styles
+        """
+        input_html = (
+            """<html><body><div id="main"><p class="x" style="color: green; margin: 1px">"""
+            """A <a href="#">B</a></p><p>C</p></div><footer>D</footer></body></html>"""
+        )
+        input_css = """
+        p { color: red; margin: 0; padding: 0; }
+        .x { color: blue !important; background: url(img.png); }
+        #main p { padding: 5px; }
+        p { padding-left: 2px; }
+        a:hover { color: pink; }
+        a::before { content: 'x'; }
+        @media print { p { color: black; } }
+        footer { display: none; }
+        """
+        html = Extractor.keep('//div[@id="main"]').extract_inline(
+            input_html, input_css, base_url="http://test.com/"
+        )
+
+        self.assertEqual(
+            html,
+            """<html><body><div id="main">"""
+            """<p class="x" style="padding-left:2px;background:url('http://test.com/img.png');"""
+            """padding:5px;margin:1px;color:blue !important;">A <a href="#">B</a></p>"""
+            """<p style="color:red;margin:0;padding-left:2px;padding:5px;">C</p>"""
+            """</div></body></html>""",
+        )
+
+        # Same results with a compiled stylesheet and the tinycss2 backend
+        extractor = Extractor(css_backend="tinycss2").keep('//div[@id="main"]')
+        stylesheet = extractor.css_extractor.compile(input_css, "tinycss2")
+        self.assertEqual(
+            extractor.extract_inline(
+                input_html, stylesheet, base_url="http://test.com/"
+            ),
+            html,
+        )
+
+        self.assertIsNone(
+            Extractor.keep("//nothing").extract_inline(input_html, input_css)
+        )
+
+    def test_parallel_css(self):
+        """
+        Tests CSS contents parsed on a helper thread give the same results
+        """
+        extractor = Extractor.keep('//div[@id="main"]')
+        expected = extractor.extract(TEST_HTML, TEST_CSS, base_url="http://test.com/")
+
+        profiler = Profiler()
+        extractor = Extractor(parallel_css=True, profiler=profiler)
+        extractor.keep('//div[@id="main"]')
+
+        self.assertEqual(
+            extractor.extract(TEST_HTML, TEST_CSS, base_url="http://test.com/"),
+            expected,
+        )
+        self.assertEqual(profiler.report(kind="stage")[0]["calls"], 1)
+        self.assertIn("css.wait", [r["expression"] for r in profiler.report()])
+
+        # Without matches and with too large contents
+        self.assertEqual(
+            Extractor(parallel_css=True).keep("//nothing").extract(TEST_HTML, TEST_CSS),
+            (None, None),
+        )
+        extractor = Extractor(
+            parallel_css=True, limits=Limits(max_bytes=len(TEST_HTML), degrade=True)
+        )
+        self.assertEqual(
+            extractor.keep('//div[@id="main"]').extract(TEST_HTML, TEST_CSS * 10)[1],
+            TEST_CSS * 10,
+        )
+
+    def test_css_workers(self):
+        """
+        Tests rules cleaned by several threads are kept in source order
+        """
+
+        class CSSExtractor(Extractor.css_extractor):
+            min_chunk_size = 2
+
+        class ChunkedExtractor(Extractor):
+            css_extractor = CSSExtractor
+
+        css = "\n".join(
+            "%s { z-index: %d; }" % (selector, i)
+            for i, selector in enumerate(
+                ["a", "p", "nothing", "div#main", "footer"] * 5
+            )
+        )
+
+        expected = Extractor.keep('//div[@id="main"]').extract(TEST_HTML, css)
+
+        for workers in (2, 3, 20):
+            extractor = ChunkedExtractor(css_workers=workers)
+            self.assertEqual(
+                extractor.keep('//div[@id="main"]').extract(TEST_HTML, css), expected
+            )
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase, mock
+
+from .exceptions import (
+    DeadlineExceeded,
+    DocumentTooLarge,
+    LimitExceeded,
+    TooManyNodes,
+    TreeTooDeep,
+)
+from .extractor import Extractor
+from .limits import Deadline, Limits
+
+HTML = "<html><body><div><p><span>Text</span></p></div><footer>Footer</footer></body></html>"
+CSS = "span { color: red; } footer { color: blue; } p { margin: 0; }"
+
+
+class LimitsTestCase(TestCase):
+    def test_no_limits(self):
+        """
+        Tests default limits don't change anything
+        """
+        html = Extractor(limits=Limits()).keep("//span").extract(HTML)
+        self.assertEqual(html, Extractor.keep("//span").extract(HTML))
+
+    def test_max_bytes(self):
+        """
+        Tests too large HTML contents are refused
+        """
+        extractor = Extractor(limits=Limits(max_bytes=20)).keep("//span")
+
+        with self.assertRaises(DocumentTooLarge):
+            extractor.extract(HTML)
+
+    def test_max_bytes_css_degrade(self):
+        """
+        Tests too large CSS contents are kept as is when degrading
+        """
+        limits = Limits(max_bytes=len(HTML), degrade=True)
+        _, css = Extractor(limits=limits).keep("//span").extract(HTML, CSS * 2)
+
+        self.assertEqual(css, CSS * 2)
+
+        with self.assertRaises(DocumentTooLarge):
+            Extractor(limits=Limits(max_bytes=len(HTML))).keep("//span").extract(
+                HTML, CSS * 2
+            )
+
+    def test_max_nodes(self):
+        """
+        Tests trees with too many elements are refused
+        """
+        self.assertIsNotNone(
+            Extractor(limits=Limits(max_nodes=6)).keep("//span").extract(HTML)
+        )
+
+        with self.assertRaises(TooManyNodes):
+            Extractor(limits=Limits(max_nodes=5)).keep("//span").extract(HTML)
+
+    def test_max_depth(self):
+        """
+        Tests too deep trees are refused
+        """
+        self.assertIsNotNone(
+            Extractor(limits=Limits(max_depth=5)).keep("//span").extract(HTML)
+        )
+
+        with self.assertRaises(TreeTooDeep):
+            Extractor(limits=Limits(max_depth=4)).keep("//span").sanitize(HTML)
+
+    def test_deadline(self):
+        """
+        Tests documents exceeding their time budget
+        """
+        extractor = Extractor(limits=Limits(timeout=10)).keep("//span")
+
+        with mock.patch.object(Deadline, "expired", return_value=True):
+            with self.assertRaises(DeadlineExceeded):
+                extractor.extract(HTML, CSS)
+
+    def test_deadline_css_degrade(self):
+        """
+        Tests CSS rules are kept as is when the deadline expires while degrading
+        """
+        extractor = Extractor(limits=Limits(timeout=10, degrade=True)).keep("//span")
+
+        # Expire after the HTML stages and the first rule
+        with mock.patch.object(
+            Deadline, "expired", side_effect=[False, False, False, True, True]
+        ):
+            _, css = extractor.extract(HTML, CSS)
+
+        self.assertEqual(css, "span{color:red;}\nfooter{color:blue;}\np{margin:0;}")
+
+    def test_limit_exceeded_base_class(self):
+        """
+        Tests every limit error is a LimitExceeded
+        """
+        for error in (DocumentTooLarge, TooManyNodes, TreeTooDeep, DeadlineExceeded):
+            self.assertTrue(issubclass(error, LimitExceeded))
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import pickle
+from unittest import TestCase
+
+from .cache import TemplateCache
+from .extractor import Extractor
+from .metrics import Metrics
+from .profiler import Profiler
+
+HTML = "<html><body><div><p><span>Text</span></p></div><footer>Footer</footer></body></html>"
+CSS = "span { color: red; } footer { color: blue; } p, a:nth-child(x) { margin: 0; }"
+
+
+class MetricsTestCase(TestCase):
+    def test_extractor_metrics(self):
+        """
+        Tests documents, sizes, stages, rules and cache lookups are counted
+        """
+        metrics = Metrics()
+        profiler = Profiler()
+        extractor = Extractor(
+            template_cache=TemplateCache(), metrics=metrics, profiler=profiler
+        ).keep("//span")
+
+        for _ in range(3):
+            html, css = extractor.extract(HTML, CSS)
+
+        extractor.sanitize(HTML)
+        extractor.extract_fragments("<p>None</p>")
+
+        values = {
+            (name, tuple(sorted(s["labels"].items()))): s.get("value", s.get("count"))
+            for name, samples in metrics.to_dict().items()
+            for s in samples
+        }
+
+        self.assertEqual(values[("chopper_documents_total", (("mode", "extract"),))], 3)
+        self.assertEqual(
+            values[("chopper_documents_total", (("mode", "sanitize"),))], 1
+        )
+        self.assertEqual(
+            values[("chopper_documents_total", (("mode", "fragments"),))], 1
+        )
+        self.assertEqual(
+            values[("chopper_input_bytes_total", (("kind", "css"),))], 3 * len(CSS)
+        )
+        self.assertEqual(
+            values[("chopper_output_bytes_total", (("kind", "css"),))], 3 * len(css)
+        )
+        self.assertEqual(values[("chopper_css_rules_total", (("result", "kept"),))], 6)
+        self.assertEqual(
+            values[("chopper_css_rules_total", (("result", "dropped"),))], 3
+        )
+        self.assertEqual(
+            values[
+                ("chopper_css_assumed_matches_total", (("reason", "untranslatable"),))
+            ],
+            1,
+        )
+        self.assertEqual(
+            values[("chopper_selector_cache_requests_total", (("result", "hit"),))], 8
+        )
+        self.assertEqual(
+            values[("chopper_template_cache_requests_total", (("result", "miss"),))], 3
+        )
+        self.assertEqual(
+            values[("chopper_stage_duration_seconds", (("stage", "css.clean"),))], 3
+        )
+
+        # The profiler still records stages
+        stages = {r["expression"]: r["calls"] for r in profiler.report(kind="stage")}
+        self.assertEqual(stages["html.clean"], 4)
+
+        # Pickled extractors keep their metrics values and template cache
+        loaded = pickle.loads(pickle.dumps(extractor))
+        self.assertEqual(loaded.metrics.to_dict(), metrics.to_dict())
+
+    def test_prometheus(self):
+        """
+        Tests the Prometheus text exposition format
+        """
+        metrics = Metrics(buckets=[0.1, 0.01])
+        metrics.inc("chopper_documents_total", (("mode", "extract"),), 2)
+        metrics.inc("custom_total", (("label", 'a "b"\n'),))
+        metrics.observe("chopper_stage_duration_seconds", 0.05, (("stage", "html"),))
+        metrics.observe("chopper_stage_duration_seconds", 0.5, (("stage", "html"),))
+
+        self.assertEqual(
+            metrics.to_prometheus(),
+            "# HELP chopper_documents_total Documents processed, by mode\n"
+            "# TYPE chopper_documents_total counter\n"
+            'chopper_documents_total{mode="extract"} 2\n'
+            "# HELP chopper_stage_duration_seconds Duration of the extraction stages\n"
+            "# TYPE chopper_stage_duration_seconds histogram\n"
+            'chopper_stage_duration_seconds_bucket{stage="html",le="0.01"} 0\n'
+            'chopper_stage_duration_seconds_bucket{stage="html",le="0.1"} 1\n'
+            'chopper_stage_duration_seconds_bucket{stage="html",le="+Inf"} 2\n'
+            'chopper_stage_duration_seconds_sum{stage="html"} 0.55\n'
+            'chopper_stage_duration_seconds_count{stage="html"} 2\n'
+            "# HELP custom_total custom_total\n"
+            "# TYPE custom_total untyped\n"
+            'custom_total{label="a \\"b\\"\\n"} 1\n',
+        )
+
+        metrics.reset()
+        self.assertEqual(metrics.to_dict(), {})
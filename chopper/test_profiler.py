@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from .extractor import Extractor
+from .profiler import Profiler
+
+HTML = "<html><body><div><p><span>Text</span></p></div><footer>Footer</footer></body></html>"
+CSS = "span { color: red; } footer { color: blue; } p, a { margin: 0; }"
+
+
+class ProfilerTestCase(TestCase):
+    def test_rules_and_stages(self):
+        """
+        Tests rules, selectors and stages are profiled across documents
+        """
+        profiler = Profiler()
+        extractor = Extractor(profiler=profiler).keep("//span").discard("//a")
+
+        for _ in range(3):
+            extractor.extract(HTML, CSS, base_url="http://test.com/")
+
+        rows = {(r["kind"], r["expression"]): r for r in profiler.report()}
+
+        self.assertEqual(rows[("keep", "//span")]["calls"], 3)
+        self.assertEqual(rows[("keep", "//span")]["match_rate"], 1)
+        self.assertEqual(rows[("discard", "//a")]["matches"], 0)
+        self.assertEqual(rows[("selector", "footer")]["match_rate"], 0)
+        self.assertEqual(rows[("selector", "p")]["calls"], 3)
+        self.assertEqual(
+            sorted(e for k, e in rows if k == "stage"),
+            [
+                "css.clean",
+                "css.rel_to_abs",
+                "html.clean",
+                "html.rel_to_abs",
+                "html.serialize",
+            ],
+        )
+
+    def test_stages_only(self):
+        """
+        Tests profilers can time stages without timing every rule
+        """
+        profiler = Profiler(rules=False)
+        Extractor(profiler=profiler).keep("//span").extract(
+            HTML, CSS, base_url="http://test.com/"
+        )
+
+        self.assertEqual({r["kind"] for r in profiler.report()}, {"stage"})
+        self.assertEqual(len(profiler.report()), 5)
+
+    def test_report(self):
+        """
+        Tests report sorting, filtering and formatting
+        """
+        profiler = Profiler()
+        profiler.record("selector", "a", 0.5, True)
+        profiler.record("selector", "b", 0.1, False)
+        profiler.record("selector", "b", 0.1, True)
+        profiler.record("keep", "//a", 0.3, True)
+
+        self.assertEqual(
+            [r["expression"] for r in profiler.report()], ["a", "//a", "b"]
+        )
+        self.assertEqual(
+            [r["expression"] for r in profiler.report(sort="calls", limit=1)], ["b"]
+        )
+        self.assertEqual(
+            [r["expression"] for r in profiler.report(kind="keep")], ["//a"]
+        )
+        self.assertEqual(profiler.report(kind="keep")[0]["mean"], 0.3)
+
+        text = profiler.format_report().splitlines()
+        self.assertEqual(len(text), 4)
+        self.assertTrue(text[0].startswith("kind"))
+        self.assertTrue(text[1].endswith("  a"))
+        self.assertIn(" 50.0 ", text[3])
+
+    def test_merge_and_reset(self):
+        """
+        Tests profilers from several workers can be aggregated
+        """
+        first, second = Profiler(), Profiler()
+        first.record("keep", "//a", 1.0, True)
+        second.record("keep", "//a", 2.0, False)
+
+        first.merge(second)
+        first.merge(second.report())
+
+        self.assertEqual(
+            first.report(),
+            [
+                {
+                    "kind": "keep",
+                    "expression": "//a",
+                    "time": 5.0,
+                    "calls": 3,
+                    "matches": 1,
+                    "mean": 5.0 / 3,
+                    "match_rate": 1 / 3,
+                }
+            ],
+        )
+
+        first.reset()
+        self.assertEqual(first.report(), [])
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from .extractor import Extractor
+from .registry import ExtractorRegistry
+
+
+class ExtractorRegistryTestCase(TestCase):
+    def test_route(self):
+        """
+        Tests URLs are routed to the most specific host and path prefix
+        """
+        registry = ExtractorRegistry()
+
+        for pattern in (
+            "example.com",
+            "example.com/blog/",
+            "*.example.com",
+            "*.example.com/news",
+            "https://Shop.Example.com:8080/cart",
+            "other.org/a/b",
+            "*/amp",
+        ):
+            registry.register(pattern, Extractor)
+
+        self.assertEqual(len(registry), 7)
+
+        routes = {
+            "http://example.com/": "example.com",
+            "http://EXAMPLE.com.:80/blog/post?page=2": "example.com/blog",
+            "http://example.com/blogs": "example.com",
+            "http://www.example.com/news/1": "*.example.com/news",
+            "https://a.b.example.com/": "*.example.com",
+            "http://shop.example.com/cart/1": "shop.example.com/cart",
+            "http://shop.example.com/": "*.example.com",
+            "other.org/a/b/c": "other.org/a/b",
+            "other.org/a": None,
+            "http://foo.net/amp/x": "*/amp",
+            "http://foo.net/": None,
+        }
+
+        for url, route in routes.items():
+            self.assertEqual(registry.route(url), route, url)
+
+        # Any host
+        registry.register("*", Extractor)
+        self.assertEqual(registry.route("http://foo.net/"), "*")
+        self.assertEqual(registry.route("other.org/a"), "*")
+
+    def test_resolve(self):
+        """
+        Tests extractors are compiled on first use and least recently
+        used ones are evicted
+        """
+        calls = []
+
+        def factory(xpath):
+            def build():
+                calls.append(xpath)
+                return Extractor.keep(xpath)
+
+            return build
+
+        registry = ExtractorRegistry(maxsize=2)
+        registry.register("a.com", factory("//a"))
+        registry.register("b.com", factory("//b"))
+        registry.register("c.com", factory("//c"))
+
+        extractor = Extractor.keep("//p")
+        registry.register("p.com", extractor)
+
+        self.assertEqual(calls, [])
+        self.assertIsNone(registry.resolve("http://d.com/"))
+
+        a = registry.resolve("http://a.com/")
+        self.assertEqual(a._xpaths_to_keep, ["//a"])
+        self.assertIs(registry.resolve("http://a.com/page"), a)
+        registry.resolve("http://b.com/")
+        registry.resolve("http://c.com/")
+
+        # a.com was evicted
+        self.assertIsNot(registry.resolve("http://a.com/"), a)
+        self.assertEqual(calls, ["//a", "//b", "//c", "//a"])
+        self.assertEqual((registry.hits, registry.misses), (1, 4))
+
+        self.assertIs(registry.resolve("http://p.com/"), extractor)
+
+        # Registering a pattern again replaces its compiled extractor
+        registry.register("p.com/", factory("//q"))
+        self.assertEqual(registry.resolve("http://p.com/")._xpaths_to_keep, ["//q"])
+
+        registry.clear()
+        registry.resolve("http://p.com/")
+        self.assertEqual(calls[-2:], ["//q", "//q"])
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+from lxml import html
+
+from .exceptions import TooManyNodes
+from .extractor import Extractor
+from .limits import Limits
+from .profiler import Profiler
+from .slowlog import SlowLog, load_capture, replay_capture
+
+HTML = "<html><body><div><p><span>Text</span></p></div><footer>Footer</footer></body></html>"
+CSS = "span { color: red; } footer { color: blue; } p, a { margin: 0; }"
+
+
+class SlowLogTestCase(TestCase):
+    def test_entries(self):
+        """
+        Tests slow documents entries and the shared profiler
+        """
+        profiler = Profiler()
+        slow_log = SlowLog(threshold=0, max_rules=2)
+        extractor = Extractor(profiler=profiler, slow_log=slow_log).keep("//span")
+
+        extractor.extract(HTML, CSS, base_url="http://test.com/")
+        extractor.sanitize(HTML)
+
+        entry = slow_log.entries[0]
+        self.assertEqual(entry["mode"], "extract")
+        self.assertEqual(entry["html_size"], len(HTML))
+        self.assertEqual(entry["css_size"], len(CSS))
+        self.assertEqual(entry["nodes"], 6)
+        self.assertEqual(len(entry["digest"]), 64)
+        self.assertEqual(
+            sorted(entry["stages"]),
+            [
+                "css.clean",
+                "css.rel_to_abs",
+                "html.clean",
+                "html.rel_to_abs",
+                "html.serialize",
+            ],
+        )
+        self.assertEqual(len(entry["slowest_rules"]), 2)
+        self.assertIsNone(entry["error"])
+        self.assertIsNone(entry["capture"])
+        self.assertEqual(slow_log.entries[1]["mode"], "sanitize")
+
+        # Every document is still profiled by the extractor profiler
+        stages = {r["expression"]: r["calls"] for r in profiler.report(kind="stage")}
+        self.assertEqual(stages["html.clean"], 2)
+
+        # Only stages are timed by default
+        slow_log = SlowLog(threshold=0)
+        Extractor(slow_log=slow_log).keep("//span").extract(HTML, CSS)
+        self.assertIn("html.clean", slow_log.entries[0]["stages"])
+        self.assertEqual(slow_log.entries[0]["slowest_rules"], [])
+
+        slow_log = SlowLog(threshold=0, profile_rules=True)
+        Extractor(slow_log=slow_log).keep("//span").extract(HTML, CSS)
+        self.assertEqual(
+            {row["kind"] for row in slow_log.entries[0]["slowest_rules"]},
+            {"keep", "selector"},
+        )
+
+        # Fast documents are not recorded
+        slow_log = SlowLog(threshold=60)
+        Extractor(slow_log=slow_log).keep("//span").extract(HTML, CSS)
+        self.assertEqual(len(slow_log.entries), 0)
+
+    def test_errors(self):
+        """
+        Tests failed documents are recorded with their error
+        """
+        slow_log = SlowLog(threshold=0)
+        extractor = Extractor(limits=Limits(max_nodes=2), slow_log=slow_log)
+
+        with self.assertRaises(TooManyNodes):
+            extractor.keep("//span").extract(HTML)
+
+        self.assertTrue(slow_log.entries[0]["error"].startswith("TooManyNodes: "))
+
+    def test_captures(self):
+        """
+        Tests captures rotation and replay
+        """
+        with tempfile.TemporaryDirectory() as capture_dir:
+            slow_log = SlowLog(threshold=0, capture_dir=capture_dir, max_captures=2)
+            extractor = Extractor(slow_log=slow_log, css_backend="tinycss2")
+            extractor.keep("//span").discard("//a")
+
+            for i in range(3):
+                expected = extractor.extract(HTML.replace("Text", str(i)), CSS)
+
+            captures = sorted(os.listdir(capture_dir))
+            self.assertEqual(len(captures), 2)
+
+            capture = load_capture(os.path.join(capture_dir, captures[-1]))
+            self.assertEqual(capture["keep"], ["//span"])
+            self.assertEqual(capture["discard"], ["//a"])
+            self.assertEqual(capture["css_backend"], "tinycss2")
+            self.assertEqual(capture["css"], CSS)
+
+            # Replay the capture
+            self.assertEqual(replay_capture(capture), expected)
+
+    def test_consumed_inputs(self):
+        """
+        Tests trees and file objects are recorded as they were before their extraction
+        """
+        with tempfile.TemporaryDirectory() as capture_dir:
+            slow_log = SlowLog(threshold=0, capture_dir=capture_dir)
+            extractor = Extractor(slow_log=slow_log).keep("//span")
+            expected = extractor.extract(HTML)
+            extractor.extract(HTML.encode("utf-8"))
+            entry = slow_log.entries[1]
+
+            # Trees are cleaned in place
+            tree = html.document_fromstring(HTML)
+            extractor._extract(tree, None, None, "extract")
+            self.assertEqual(slow_log.entries[2]["nodes"], entry["nodes"])
+            self.assertEqual(slow_log.entries[2]["nodes"], 6)
+            capture = load_capture(slow_log.entries[2]["capture"])
+            self.assertIn(b"<footer>Footer</footer>", capture["html"])
+            self.assertEqual(replay_capture(capture), expected)
+
+            # Trees are only copied when captured
+            tree_log = SlowLog(threshold=0)
+            tree = html.document_fromstring(HTML)
+            Extractor(slow_log=tree_log).keep("//span")._extract(tree, None, None)
+            self.assertEqual(tree_log.entries[0]["nodes"], 6)
+            self.assertIsNone(tree_log.entries[0]["digest"])
+
+            # Seekable files are read again from their initial position
+            f = io.BytesIO(b"ignored" + HTML.encode("utf-8"))
+            f.seek(7)
+            extractor.extract(f)
+            for key in ("digest", "html_size", "nodes"):
+                self.assertEqual(slow_log.entries[3][key], entry[key])
+            capture = load_capture(slow_log.entries[3]["capture"])
+            self.assertEqual(capture["html"], HTML.encode("utf-8"))
+
+            # Other files can't be read again
+            f = io.BytesIO(HTML.encode("utf-8"))
+            f.seekable = lambda: False
+            self.assertEqual(extractor.extract(f), expected)
+            self.assertIsNone(slow_log.entries[4]["digest"])
+            self.assertIsNone(slow_log.entries[4]["html_size"])
+            self.assertIsNone(slow_log.entries[4]["nodes"])
+            self.assertIsNone(load_capture(slow_log.entries[4]["capture"])["html"])
@@ -0,0 +1,38 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+# The helper threads of the process, see get_executor
+_executor = None
+_lock = Lock()
+
+
+def get_executor():
+    """
+    Returns the thread pool running helper tasks of every extractor,
+    created on first use
+
+    :rtype: concurrent.futures.ThreadPoolExecutor
+    """
+    global _executor
+
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(thread_name_prefix="chopper")
+
+    return _executor
+
+
+def _reset_executor():
+    """
+    Forked processes don't inherit the parent threads, they get their own pool
+    """
+    global _executor, _lock
+
+    _executor = None
+    _lock = Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_executor)
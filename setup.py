@@ -25,6 +25,9 @@ setup(
         "tinycss==0.4",
         "lxml>=4.9.1",
     ],
+    extras_require={
+        "tinycss2": ["tinycss2>=1.2.0"],
+    },
     classifiers=[
         "Development Status :: 5 - Production/Stable",
         "License :: OSI Approved :: MIT License",
@@ -35,5 +38,10 @@ setup(
         "Programming Language :: Python :: 3.10",
         "Programming Language :: Python :: 3.11",
     ],
+    entry_points={
+        "console_scripts": [
+            "chopper = chopper.cli:main",
+        ],
+    },
     test_suite="chopper.tests",
 )